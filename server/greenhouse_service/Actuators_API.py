@@ -1,17 +1,61 @@
-from flask import Blueprint, jsonify, request
-from models import ActuatorStatus
-from database import db 
+from flask import Blueprint, jsonify, request, current_app
+from models import ActuatorStatus, ACTUATOR_FIELDS, encode_state, decode_state
+from database import db, bulk_insert
+from pagination import history_page, is_greenhouse_id
+from encoding import history_response
+from queries import latest_rows
+from latest_state import latest_state
+from change_feed import change_feed
+from stream_hub import stream_hub
+from target_cache import target_cache
+import datetime
 
 
 actuator_status_bp = Blueprint('actuator_status_bp', __name__, url_prefix = '/api/v1/actuator_status')
 
+
+def parse_status(data, greenhouse_id):
+    """
+    Validates one actuator status payload and returns it as a row dict for the actuator_status table.
+    
+    Raises:
+        ValueError: If an actuator state is not "ON" or "OFF".
+    """
+    for field in ACTUATOR_FIELDS:
+        if data.get(field) not in ("ON", "OFF"):
+            raise ValueError(f"'{field}' must be \"ON\" or \"OFF\"")
+    return {'greenhouse_id': greenhouse_id, 'timestamp': datetime.datetime.now(), 'state': encode_state(data)}
+
+
+def load_latest_status(greenhouse_id):
+    return ActuatorStatus.query.filter_by(greenhouse_id = greenhouse_id).order_by(ActuatorStatus.timestamp.desc(), ActuatorStatus.id.desc()).first()
+
+
 @actuator_status_bp.route('/<int:greenhouse_id>', methods = ['POST'])
 def add_actuator_status(greenhouse_id):
+    """
+    Stores a status only if it differs from the greenhouse's last known state.
+    
+    A repeated state is not inserted; the stored latest status is returned with 200 instead
+    of 201, straight from the /latest snapshot.
+    """
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error":"No data provided"}), 400 
         
+        try:
+            state = parse_status(data, greenhouse_id)['state']
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if not target_cache.get(greenhouse_id):
+            return jsonify({"error": "Greenhouse not found"}), 404
+        
+        snapshot = latest_state.get('actuator_status', greenhouse_id, lambda: load_latest_status(greenhouse_id))
+        if snapshot and encode_state(snapshot.data) == state:
+            return current_app.response_class(snapshot.body, status = 200, mimetype = 'application/json')
+        
         new_status = ActuatorStatus(
             greenhouse_id=greenhouse_id,
             vents=data.get('vents_on'),
@@ -24,10 +68,98 @@ def add_actuator_status(greenhouse_id):
         ) 
         
         db.session.add(new_status)
+        db.session.flush()
+        snapshot = latest_state.update('actuator_status', new_status)
         db.session.commit()
+        change_feed.changed('actuator_status', [greenhouse_id], [(greenhouse_id, snapshot.data)])
+        stream_hub.publish('actuator_status', greenhouse_id, snapshot.body)
+        
+        return jsonify(snapshot.data), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        # The snapshot may already hold the rolled-back row
+        latest_state.invalidate(greenhouse_id, 'actuator_status')
+        return jsonify({"error": str(e)}), 500
+    
+    
+@actuator_status_bp.route('/batch', methods = ['POST'])
+def add_actuator_statuses_batch():
+    """
+    Accepts an array of actuator statuses, each with its own 'greenhouse_id', and stores them in one transaction.
+    
+    Answers with per-item status like the readings batch endpoint. Statuses that repeat the
+    greenhouse's previous state (stored, or earlier in the batch) are not inserted and are
+    reported as "unchanged".
+    """
+    try:
+        data = request.get_json()
+        if isinstance(data, dict):
+            data = data.get('statuses')
+        if not data or not isinstance(data, list):
+            return jsonify({"error":"No statuses provided"}), 400
+        
+        max_batch_size = current_app.config['MAX_BATCH_SIZE']
+        if len(data) > max_batch_size:
+            return jsonify({"error": f"Batch exceeds the maximum of {max_batch_size} statuses"}), 413
         
-        return jsonify(new_status.serialize()), 201
+        greenhouse_ids = {item.get('greenhouse_id') for item in data if isinstance(item, dict) and is_greenhouse_id(item.get('greenhouse_id'))}
+        greenhouses = target_cache.get_many(greenhouse_ids)
         
+        rows = []
+        results = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                results.append({"index": index, "status": "rejected", "error": "Status must be an object"})
+                continue
+            
+            greenhouse_id = item.get('greenhouse_id')
+            if not is_greenhouse_id(greenhouse_id):
+                results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "rejected", "error": "'greenhouse_id' must be an integer"})
+                continue
+            if greenhouse_id not in greenhouses:
+                results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "rejected", "error": "Greenhouse not found"})
+                continue
+            
+            try:
+                rows.append(parse_status(item, greenhouse_id))
+            except ValueError as e:
+                results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "rejected", "error": str(e)})
+                continue
+            
+            results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "accepted"})
+            
+        if not rows:
+            return jsonify({"accepted": 0, "unchanged": 0, "rejected": len(results), "results": results}), 400
+        
+        last_states = {greenhouse_id: row.state for greenhouse_id, row in latest_rows(ActuatorStatus, {row['greenhouse_id'] for row in rows}).items()}
+        changed = []
+        accepted = [result for result in results if result["status"] == "accepted"]
+        for row, result in zip(rows, accepted):
+            if last_states.get(row['greenhouse_id']) == row['state']:
+                result["status"] = "unchanged"
+                continue
+            last_states[row['greenhouse_id']] = row['state']
+            changed.append(row)
+        
+        if changed:
+            bulk_insert(ActuatorStatus, changed)
+            db.session.commit()
+            changed_ids = {row['greenhouse_id'] for row in changed}
+            for greenhouse_id in changed_ids:
+                latest_state.invalidate(greenhouse_id, 'actuator_status')
+            events = [
+                (row['greenhouse_id'], dict(id = None, greenhouse_id = row['greenhouse_id'], timestamp = row['timestamp'], **decode_state(row['state'])))
+                for row in changed
+            ]
+            change_feed.changed('actuator_status', changed_ids, events)
+            for greenhouse_id, data in events:
+                stream_hub.publish_data('actuator_status', greenhouse_id, data)
+        
+        rejected = len(results) - len(rows)
+        status_code = 207 if rejected else 201 if changed else 200
+        return jsonify({"accepted": len(changed), "unchanged": len(rows) - len(changed), "rejected": rejected, "results": results}), status_code
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -35,11 +167,12 @@ def add_actuator_status(greenhouse_id):
     
 @actuator_status_bp.route('/<int:greenhouse_id>/all', methods = ['GET'])
 def get_all_actuator_statuses(greenhouse_id):
+    """Returns a page of actuator statuses; see pagination.history_page and encoding.history_response for the supported query arguments."""
     try:
-        all_statuses = ActuatorStatus.query.filter_by(greenhouse_id = greenhouse_id).order_by(ActuatorStatus.timestamp.desc()).all()
-        status_list = [status.serialize() for status in all_statuses]
-        
-        return jsonify(status_list), 200
+        return history_response(ActuatorStatus, history_page(ActuatorStatus, greenhouse_id, request.args), request.args)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -47,14 +180,13 @@ def get_all_actuator_statuses(greenhouse_id):
     
 @actuator_status_bp.route('/<int:greenhouse_id>/latest', methods = ['GET'])
 def get_latest_status(greenhouse_id):
+    """Serves the newest status from the in-memory snapshot; supports If-None-Match / If-Modified-Since."""
     try:
-        latest_status = ActuatorStatus.query.filter_by(greenhouse_id = greenhouse_id).order_by(ActuatorStatus.timestamp.desc()).first()
-        if not latest_status:
+        snapshot = latest_state.get('actuator_status', greenhouse_id, lambda: load_latest_status(greenhouse_id))
+        if not snapshot:
             return jsonify({"error":"latest status not found"}), 404
         
-        return jsonify(latest_status.serialize()), 200
-        
-     
+        return latest_state.response(snapshot)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
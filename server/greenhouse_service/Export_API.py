@@ -0,0 +1,26 @@
+from flask import Blueprint, jsonify, request, stream_with_context
+from export import EXPORT_FORMATS, prepare_export, export_stream
+import datetime
+
+export_bp = Blueprint('export_bp', __name__, url_prefix = '/api/v1/export')
+
+
+@export_bp.route('/<table>', methods = ['GET'])
+def export_table(table):
+    """
+    Streams readings or actuator_status rows as a CSV or Parquet download; see export.py.
+    
+    Query arguments: 'format' (csv or parquet, default csv), 'greenhouse_ids' (comma
+    separated, default all), 'since' and 'until' (ISO 8601, inclusive) and 'fields'.
+    """
+    try:
+        export_format, columns, query = prepare_export(table, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    filename = f"{table}-{datetime.datetime.now():%Y%m%dT%H%M%S}.{export_format}"
+    return stream_with_context(export_stream(export_format, columns, query)), 200, {
+        'Content-Type': EXPORT_FORMATS[export_format],
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    }
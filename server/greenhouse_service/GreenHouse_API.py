@@ -1,9 +1,53 @@
 from flask import Blueprint, jsonify, request 
-from models import Greenhouse
+from models import Greenhouse, Readings, ActuatorStatus
 from database import db 
+from pagination import history_page, parse_timestamp, parse_greenhouse_ids
+from queries import latest_rows, fleet_overview
+from target_cache import target_cache
+from latest_state import latest_state
+from change_feed import change_feed
+from command_state import command_state
+from rules import validate_rules
+from replay import replay
 
 greenhouse_bp = Blueprint('greenhouse_bp', __name__, url_prefix='/api/v1/greenhouse')
 
+# include= name -> (response key, child model)
+INCLUDES = {
+    'readings': ('Readings', Readings),
+    'actuator_status': ('Actuator Statuses', ActuatorStatus)
+}
+
+
+def serialize_greenhouses(greenhouses, args):
+    """
+    Serializes greenhouses as summaries, loading the newest reading and status for all of them in two queries.
+    
+    'include=readings,actuator_status' adds a bounded page of each child history, paginated
+    with the same arguments as the /all endpoints (limit, cursor, since, until, fields).
+    
+    Raises:
+        ValueError: If 'include' names an unknown child or a pagination argument is invalid.
+    """
+    includes = [name.strip() for name in args.get('include', '').split(',') if name.strip()]
+    for name in includes:
+        if name not in INCLUDES:
+            raise ValueError(f"Unknown include '{name}'")
+    
+    greenhouse_ids = [greenhouse.id for greenhouse in greenhouses]
+    latest_readings = latest_rows(Readings, greenhouse_ids)
+    latest_statuses = latest_rows(ActuatorStatus, greenhouse_ids)
+    
+    serialized = []
+    for greenhouse in greenhouses:
+        item = greenhouse.serialize(latest_readings.get(greenhouse.id), latest_statuses.get(greenhouse.id))
+        for name in includes:
+            key, model = INCLUDES[name]
+            item[key] = history_page(model, greenhouse.id, args)
+        serialized.append(item)
+        
+    return serialized
+
 
 @greenhouse_bp.route('/', methods = ['POST'])
 def create_greenhouse():
@@ -12,6 +56,12 @@ def create_greenhouse():
          if not data:
              return jsonify({"error": "No data provided"}), 400
          
+         if data.get('control_rules') is not None:
+             try:
+                 validate_rules(data['control_rules'])
+             except ValueError as e:
+                 return jsonify({"error": str(e)}), 400
+         
          new_greenhouse = Greenhouse(
              name = data.get('name'),
              location = data.get('location'),
@@ -20,7 +70,8 @@ def create_greenhouse():
              target_soil_moisture_pct =  data.get('target_soil_moisture_pct'),
              target_light = data.get('target_light'),
              target_co_two = data.get('target_CO2'),
-             target_wind_speed = data.get('target_wind_speed')
+             target_wind_speed = data.get('target_wind_speed'),
+             control_rules = data.get('control_rules')
          )
          
          db.session.add(new_greenhouse)
@@ -36,20 +87,40 @@ def create_greenhouse():
 def get_all_greenhouses():
     try:
         all_greenhouses = Greenhouse.query.all() 
-        greenhouse_list = [greenhouse.serialize() for greenhouse in all_greenhouses]
+        greenhouse_list = serialize_greenhouses(all_greenhouses, request.args)
         return jsonify(greenhouse_list), 200
     
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     except Exception as e:
         return jsonify({"error":str(e)}), 500
     
     
+@greenhouse_bp.route('/overview', methods = ['GET'])
+def get_fleet_overview():
+    """Targets, newest reading and status and deviation from target of every greenhouse, or of 'greenhouse_ids', in one query."""
+    try:
+        return jsonify(fleet_overview(parse_greenhouse_ids(request.args.get('greenhouse_ids')))), 200
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    
 @greenhouse_bp.route('/<int:greenhouse_id>', methods = ['GET'])
 def get_greenhouses(greenhouse_id):
     greenhouse = Greenhouse.query.get(greenhouse_id)
     if not greenhouse:
         return jsonify({"error":"Greenhouse not found"}), 404
     
-    return jsonify(greenhouse.serialize()), 200
+    try:
+        return jsonify(serialize_greenhouses([greenhouse], request.args)[0]), 200
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @greenhouse_bp.route('/<int:greenhouse_id>', methods = ['PUT'])
@@ -63,6 +134,12 @@ def update_greenhouse(greenhouse_id):
         if not data:
             return jsonify({"error": "No data provided"}), 400
         
+        if data.get('control_rules') is not None:
+            try:
+                validate_rules(data['control_rules'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        
         greenhouse.name = data.get('name', greenhouse.name)
         greenhouse.location = data.get('location', greenhouse.location)
         greenhouse.target_temp = data.get('target_temp', greenhouse.target_temp)
@@ -71,9 +148,12 @@ def update_greenhouse(greenhouse_id):
         greenhouse.target_light = data.get('target_light', greenhouse.target_light)
         greenhouse.target_co_two = data.get('target_co_two', greenhouse.target_co_two)
         greenhouse.target_wind_speed = data.get('target_wind_speed', greenhouse.target_wind_speed)
+        greenhouse.control_rules = data.get('control_rules', greenhouse.control_rules)
         
         db.session.commit()
-        return jsonify(greenhouse.serialize()), 200
+        target_cache.invalidate(greenhouse_id)
+        change_feed.changed('targets', [greenhouse_id])
+        return jsonify(serialize_greenhouses([greenhouse], {})[0]), 200
         
     except Exception as e:
         db.session.rollback()
@@ -89,6 +169,10 @@ def delete_greenhouse(greenhouse_id):
         
         db.session.delete(greenhouse)
         db.session.commit() 
+        target_cache.invalidate(greenhouse_id)
+        latest_state.invalidate(greenhouse_id)
+        change_feed.changed(None, [greenhouse_id])
+        command_state.forget(greenhouse_id)
         return jsonify({"message": "Greenhouse deleted successfully"}), 200
     
     except Exception as e:
@@ -96,7 +180,31 @@ def delete_greenhouse(greenhouse_id):
         return jsonify({"error": str(e)}), 500
 
 
-    
-    
-    
-    
\ No newline at end of file
+@greenhouse_bp.route('/<int:greenhouse_id>/replay', methods = ['POST'])
+def replay_greenhouse(greenhouse_id):
+    """
+    What-if replay of the stored readings with candidate setpoints: takes 'since' and 'until'
+    (ISO 8601, default the last 30 days), any of the target_* fields (named as when creating a
+    greenhouse, target_CO2, or as stored, target_co_two), 'control_rules' and 'dwell' (default
+    true). Nothing is published or stored.
+    """
+    try:
+        data = request.get_json(silent = True) or {}
+        result = replay(
+            greenhouse_id,
+            parse_timestamp(data.get('since'), 'since'),
+            parse_timestamp(data.get('until'), 'until'),
+            {field: value for field, value in data.items() if field.startswith('target_')},
+            data.get('control_rules'),
+            bool(data.get('dwell', True))
+        )
+        if result is None:
+            return jsonify({"error": "Greenhouse not found"}), 404
+        result['since'] = result['since'].isoformat()
+        result['until'] = result['until'].isoformat()
+        return jsonify(result), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,91 +1,62 @@
 from flask import Blueprint, jsonify, request, current_app 
-from models import Greenhouse, Readings
+from models import Readings, READING_FIELDS
 from database import db
+from pagination import history_page, parse_timestamp, is_greenhouse_id
+from encoding import history_response
+from rollups import BUCKETS, aggregate, record_readings
+from ingest import parse_reading, newest_per_greenhouse, store_readings
+from target_cache import target_cache
+from dispatcher import control_dispatcher
+from latest_state import latest_state
+from change_feed import change_feed
+from stream_hub import stream_hub
+from mqtt_bridge import mqtt_bridge
+from command_state import command_state
+from write_behind import write_behind
+from metrics import mqtt_publish_seconds, mqtt_publish_failures, ingest_rows
+from rules import decide_held, command_message
+import paho.mqtt.client as mqtt
 import json 
 import datetime
+import time
 
 readings_bp = Blueprint('readings_bp', __name__, url_prefix='/api/v1/readings')
 
 
-def mqtt_messaging(greenhouse_id, reading):
-    
-    from app import mqtt_client 
-    
-    temp_margin = 2.0  # Celsius
-    humidity_margin = 5.0 # Percentage
-    soil_moisture_margin = 5.0 # Percentage
-    light_margin = 100.0 # Lux
-    co2_margin = 50.0 # ppm
-    wind_speed_margin = 0.5 # m/s
-    
-    
-    greenhouse = Greenhouse.query.get(greenhouse_id)
-    if not greenhouse:
-        print(f"Greenhouse with ID {greenhouse_id} not found.")
-        return 
-    
-    message = {
-        "greenhouse_id": greenhouse_id,
-        "vents_on": "OFF", 
-        "fan_on": "OFF",
-        "lights_on": "OFF",
-        "curtains_on": "OFF",
-        "irrigation_pump_on": "OFF",
-        "humidifier_pump_on": "OFF",
-        "heater_on": "OFF"
-    }
-    
-    # Temperature Control
-    if reading.temp_celsius > greenhouse.target_temp + temp_margin:
-        message['heater_on'] = "OFF"
-        message['vents_on'] = "ON"
-        message['humidifier_pump_on'] = "ON"
-        message['fan_on'] = "ON"
-    elif reading.temp_celsius < greenhouse.target_temp - temp_margin:
-        message['heater_on'] = "ON"
-        message['vents_on'] = "OFF"
-        message['humidifier_pump_on'] = "OFF"
-        message['fan_on'] = "OFF"
-
-    # Humidity Control 
-    if reading.humidity_pct < greenhouse.target_humidity - humidity_margin:
-        message['humidifier_pump_on'] = "ON"
-        message['fan_on'] = "OFF"
-        message['vents_on'] = "OFF"
-    elif reading.humidity_pct > greenhouse.target_humidity + humidity_margin:
-        message['humidifier_pump_on'] = "OFF"
-        message['fan_on'] = "ON"
-        message['vents_on'] = "ON"
-        
-    # Soil Moisture Control
-    if reading.soil_moisture_pct < greenhouse.target_soil_moisture_pct - soil_moisture_margin:
-        message['irrigation_pump_on'] = "ON"
-    elif reading.soil_moisture_pct > greenhouse.target_soil_moisture_pct + soil_moisture_margin:
-        message['irrigation_pump_on'] = "OFF"
-        
-    # Light Control
-    if reading.light_lux < greenhouse.target_light - light_margin:
-        message['lights_on'] = "ON"
-    elif reading.light_lux > greenhouse.target_light + light_margin:
-        message['lights_on'] = "OFF"
-        
-    # CO2 Control
-    if reading.co_two > greenhouse.target_co_two + co2_margin:
-        message['vents_on'] = "ON" 
-        message['fan_on'] = "ON" 
-        message['lights_on'] = "OFF"
-    elif reading.co_two < greenhouse.target_co_two - co2_margin:
-        message['vents_on'] = "OFF" 
-        message['fan_on'] = "OFF"
-        message['lights_on'] = "ON"
-        
-    # Wind Speed Control
-    if reading.wind_speed > greenhouse.target_wind_speed + wind_speed_margin:
-        message['fan_on'] = "ON"
-    elif reading.wind_speed < greenhouse.target_wind_speed - wind_speed_margin:
-        message['fan_on'] = "OFF"
-        
-    mqtt_client.publish(f"greenhouse/{greenhouse_id}/readings", json.dumps(message), retain=True)
+def mqtt_messaging_many(items):
+    """
+    Decides and publishes actuator commands for many greenhouses in one vectorized rule pass.
+    Only commands that differ from the last one published (or are due for a heartbeat) go
+    out; see command_state.
+    
+    items is a list of (greenhouse_id, reading row dict, Targets or None) tuples; missing
+    targets are loaded from the target cache in one go. Returns how many items were skipped
+    because their greenhouse no longer exists.
+    """
+    missing = [greenhouse_id for greenhouse_id, _, targets in items if targets is None]
+    cached = target_cache.get_many(missing) if missing else {}
+    
+    evaluated = []
+    for greenhouse_id, reading, targets in items:
+        targets = targets or cached.get(greenhouse_id)
+        if targets:
+            evaluated.append((greenhouse_id, reading, targets))
+            
+    if not evaluated:
+        return len(items)
+    
+    greenhouse_ids = [greenhouse_id for greenhouse_id, _, _ in evaluated]
+    states, fired = decide_held([(reading, targets) for _, reading, targets in evaluated], command_state.held(greenhouse_ids))
+    for greenhouse_id, row in command_state.plan(greenhouse_ids, states, fired):
+        message = command_message(greenhouse_id, row)
+        started = time.perf_counter()
+        info = mqtt_bridge.publish(f"greenhouse/{greenhouse_id}/readings", json.dumps(message), retain=True)
+        mqtt_publish_seconds.observe(time.perf_counter() - started)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            mqtt_publish_failures.inc()
+            continue
+        command_state.published(greenhouse_id, row)
+    return len(items) - len(evaluated)
 
 
 
@@ -96,47 +67,182 @@ def add_reading(greenhouse_id):
         if not data:
             return jsonify({"error":"No data is provided"}), 400 
         
-        new_reading = Readings(
-            greenhouse_id = greenhouse_id,
-            temp_celsius = data.get('temp_celsius'),
-            humidity_pct=data.get('humidity_pct'),
-            soil_moisture_pct=data.get('soil_moisture_pct'),
-            light_lux=data.get('light_lux'),
-            co_two=data.get('co_two'),
-            wind_speed=data.get('wind_speed')
-        )
+        try:
+            row = parse_reading(data, greenhouse_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        targets = target_cache.get(greenhouse_id)
+        if not targets:
+            return jsonify({"error": "Greenhouse not found"}), 404
+        
+        if not control_dispatcher.has_capacity([greenhouse_id]):
+            return jsonify({"error": "Control queue is full, retry later"}), 503
+        
+        if write_behind.enabled:
+            return add_reading_write_behind(greenhouse_id, row)
+        
+        new_reading = Readings(**{field: row[field] for field in READING_FIELDS}, greenhouse_id = greenhouse_id)
+        new_reading.timestamp = row['timestamp']
         
         db.session.add(new_reading)
-        mqtt_messaging(greenhouse_id, new_reading)
+        record_readings([row])
+        db.session.flush()
+        snapshot = latest_state.update('readings', new_reading)
         db.session.commit()
+        change_feed.changed('readings', [greenhouse_id], [(greenhouse_id, snapshot.data)])
+        ingest_rows.inc(1, ('http',))
+        stream_hub.publish('readings', greenhouse_id, snapshot.body)
+        control_dispatcher.submit(greenhouse_id, row, targets)
         
         return jsonify({"message":"Reading added and processed successfully"}), 201
     
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)})
+        # The snapshot may already hold the rolled-back row
+        latest_state.invalidate(greenhouse_id, 'readings')
+        return jsonify({"error": str(e)}), 500
+    
+    
+def add_reading_write_behind(greenhouse_id, row):
+    """Hands the reading to the write-behind buffer and answers as WRITE_BEHIND_DURABILITY says; see write_behind."""
+    batch = write_behind.submit(row)
+    if batch is None:
+        return jsonify({"error": "Write buffer is full, retry later"}), 503
+    if write_behind.durability == 'enqueue':
+        return jsonify({"message": "Reading accepted for storage"}), 202
+    
+    if not batch.done.wait(write_behind.ack_timeout):
+        return jsonify({"message": "Reading accepted, not stored yet"}), 202
+    result = batch.result(row)
+    if result is not None:
+        status, error = result
+        return jsonify({"error": error}), status
+    return jsonify({"message": "Reading added and processed successfully"}), 201
+    
+    
+@readings_bp.route('/batch', methods = ['POST'])
+def add_readings_batch():
+    """
+    Accepts an array of readings for one or many greenhouses and stores them in a single transaction.
+    
+    The body is either a JSON array or an object with a 'readings' array; every item carries its
+    own 'greenhouse_id' and an optional ISO 8601 'timestamp'. Control decisions are evaluated once
+    per greenhouse, using its newest accepted sample, after the batch has been committed.
+    """
+    try:
+        data = request.get_json()
+        if isinstance(data, dict):
+            data = data.get('readings')
+        if not data or not isinstance(data, list):
+            return jsonify({"error":"No readings provided"}), 400
+        
+        max_batch_size = current_app.config['MAX_BATCH_SIZE']
+        if len(data) > max_batch_size:
+            return jsonify({"error": f"Batch exceeds the maximum of {max_batch_size} readings"}), 413
+        
+        greenhouse_ids = {item.get('greenhouse_id') for item in data if isinstance(item, dict) and is_greenhouse_id(item.get('greenhouse_id'))}
+        greenhouses = target_cache.get_many(greenhouse_ids)
+        
+        rows = []
+        results = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                results.append({"index": index, "status": "rejected", "error": "Reading must be an object"})
+                continue
+            
+            greenhouse_id = item.get('greenhouse_id')
+            if not is_greenhouse_id(greenhouse_id):
+                results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "rejected", "error": "'greenhouse_id' must be an integer"})
+                continue
+            if greenhouse_id not in greenhouses:
+                results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "rejected", "error": "Greenhouse not found"})
+                continue
+            
+            try:
+                row = parse_reading(item, greenhouse_id)
+            except ValueError as e:
+                results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "rejected", "error": str(e)})
+                continue
+            
+            rows.append(row)
+            results.append({"index": index, "greenhouse_id": greenhouse_id, "status": "accepted"})
+            
+        if not rows:
+            return jsonify({"accepted": 0, "rejected": len(results), "results": results}), 400
+        
+        if not control_dispatcher.has_capacity(newest_per_greenhouse(rows).keys()):
+            return jsonify({"error": "Control queue is full, retry later"}), 503
+        
+        store_readings(rows, greenhouses)
+        
+        status_code = 201 if len(rows) == len(results) else 207
+        return jsonify({"accepted": len(rows), "rejected": len(results) - len(rows), "results": results}), status_code
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
     
     
 @readings_bp.route('/<int:greenhouse_id>/all', methods = ['GET'])
 def get_all_readings(greenhouse_id):
+    """Returns a page of readings; see pagination.history_page and encoding.history_response for the supported query arguments."""
     try:
-        all_readings = Readings.query.filter_by(greenhouse_id = greenhouse_id).order_by(Readings.timestamp.desc()).all()
-        all_readings_list = [reading.serialize() for reading in all_readings]
-        return jsonify(all_readings_list), 200
+        return history_response(Readings, history_page(Readings, greenhouse_id, request.args), request.args)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500 
-        pass
     
     
 @readings_bp.route('/<int:greenhouse_id>/latest', methods = ['GET'])
 def get_latest_reading(greenhouse_id):
+    """Serves the newest reading from the in-memory snapshot; supports If-None-Match / If-Modified-Since."""
     try:
-        latest_reading = Readings.query.filter_by(greenhouse_id = greenhouse_id).order_by(Readings.timestamp.desc()).first()
-        return jsonify(latest_reading.serialize()), 200
+        snapshot = latest_state.get('readings', greenhouse_id, lambda: (
+            Readings.query.filter_by(greenhouse_id = greenhouse_id).order_by(Readings.timestamp.desc(), Readings.id.desc()).first()
+        ))
+        if not snapshot:
+            return jsonify({"error":"latest reading not found"}), 404
         
+        return latest_state.response(snapshot)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
-
+    
+@readings_bp.route('/<int:greenhouse_id>/aggregate', methods = ['GET'])
+def get_aggregated_readings(greenhouse_id):
+    """
+    Returns min/max/avg per time bucket from the rollup tables.
+    
+    Query arguments: 'bucket' (1m, 1h or 1d, default 1h), 'since' and 'until' (ISO 8601;
+    default: the last DEFAULT_PAGE_SIZE buckets) and 'fields' (comma separated sensor columns).
+    A range may span at most MAX_AGGREGATE_BUCKETS buckets.
+    """
+    try:
+        bucket = request.args.get('bucket', '1h')
+        if bucket not in BUCKETS:
+            return jsonify({"error": f"'bucket' must be one of {', '.join(BUCKETS)}"}), 400
+        
+        until = parse_timestamp(request.args.get('until'), 'until') or datetime.datetime.now()
+        since = parse_timestamp(request.args.get('since'), 'since') or until - BUCKETS[bucket] * current_app.config['DEFAULT_PAGE_SIZE']
+        if (until - since) / BUCKETS[bucket] > current_app.config['MAX_AGGREGATE_BUCKETS']:
+            return jsonify({"error": f"Range spans more than {current_app.config['MAX_AGGREGATE_BUCKETS']} buckets, use a larger bucket"}), 400
+        
+        metrics = READING_FIELDS
+        if request.args.get('fields'):
+            metrics = [field.strip() for field in request.args['fields'].split(',')]
+            unknown = [field for field in metrics if field not in READING_FIELDS]
+            if unknown:
+                return jsonify({"error": f"Unknown field '{unknown[0]}'"}), 400
+            
+        return jsonify({"bucket": bucket, "data": aggregate(greenhouse_id, bucket, since, until, metrics)}), 200
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,50 @@
+from flask import Blueprint, jsonify, request
+from pagination import parse_greenhouse_ids
+from stream_hub import stream_hub
+
+stream_bp = Blueprint('stream_bp', __name__, url_prefix = '/api/v1/stream')
+
+# Event kinds a client can ask for
+STREAM_KINDS = ('readings', 'actuator_status', 'command')
+
+
+@stream_bp.route('/', methods = ['GET'])
+def stream():
+    """
+    Server-Sent Events stream of new readings, actuator statuses and control commands.
+    
+    'greenhouse_ids' (comma separated, default: all greenhouses) and 'kinds' (readings,
+    actuator_status, command; default: all) select what is sent. Event data has the same
+    shape as the matching /latest response, or the MQTT command message; readings stored in
+    bulk carry a null 'id'. Clients that fall behind receive a 'lagged' event with the number
+    of events they missed and should re-read /latest.
+    
+    Events written through other worker processes are relayed over the broker. Every client
+    holds a request thread, so at most STREAM_MAX_SUBSCRIBERS are served per process.
+    """
+    try:
+        greenhouse_ids = parse_greenhouse_ids(request.args.get('greenhouse_ids'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    kinds = None
+    if request.args.get('kinds'):
+        kinds = {kind.strip() for kind in request.args['kinds'].split(',')}
+        unknown = kinds - set(STREAM_KINDS)
+        if unknown:
+            return jsonify({"error": f"Unknown kind '{sorted(unknown)[0]}'"}), 400
+        
+    subscription = stream_hub.subscribe(greenhouse_ids, kinds)
+    if subscription is None:
+        return jsonify({"error": "Too many stream clients, retry later"}), 503
+    
+    return stream_hub.events(subscription), 200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }
+
+
+@stream_bp.route('/stats', methods = ['GET'])
+def stream_stats():
+    return jsonify(stream_hub.stats()), 200
@@ -1,53 +1,108 @@
-from flask import Flask, jsonify, request, Response
+"""
+Application factory.
+
+create_app() builds the Flask app and starts its background workers. It never blocks on the
+MQTT broker (see mqtt_bridge) and does not touch the schema: run python migrations.py, or let
+gunicorn.conf.py do it once in the master before the workers start. For development:
+
+    python app.py
+
+and in production, with several worker processes:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
-from database import db, init_db 
-import paho.mqtt.client as mqtt 
-from datetime import datetime
-import os 
-import threading 
+from database import init_db
+from target_cache import target_cache
+from dispatcher import control_dispatcher, start_control_sweep
+from latest_state import latest_state
+from change_feed import change_feed
+from stream_hub import stream_hub
+from metrics import init_metrics
+from retention import start_retention_worker
+from mqtt_bridge import mqtt_bridge
+from command_state import command_state
+from mqtt_ingest import ingest_subscriber
+from write_behind import write_behind
+from GreenHouse_API import greenhouse_bp
+from Readings_API import readings_bp
+from Actuators_API import actuator_status_bp
+from Stream_API import stream_bp
+from Export_API import export_bp
 
-app = Flask(__name__)
 
-app.config.from_object(Config)
+def create_app(config = Config):
+    """Builds the app from config; FLASK_<KEY> environment variables override single settings (e.g. FLASK_BACKGROUND_JOBS=false)."""
+    app = Flask(__name__)
 
-init_db(app)
+    app.config.from_object(config)
+    app.config.from_prefixed_env()
 
-CORS(app, resources={r"/*": {"origins": Config.CORS_ORIGINS}})
+    init_db(app)
+    target_cache.init_app(app)
+    latest_state.init_app(app)
+    stream_hub.init_app(app)
+    init_metrics(app)
 
-mqtt_client = mqtt.Client(client_id="FlaskAPI") 
+    CORS(app, resources={r"/*": {"origins": app.config['CORS_ORIGINS']}})
 
+    change_feed.init_app(app)
+    command_state.init_app(app)
+    mqtt_bridge.init_app(app)
+    control_dispatcher.init_app(app)
+    write_behind.init_app(app)
+    if app.config['BACKGROUND_JOBS']:
+        start_control_sweep(app)
+        start_retention_worker(app)
+        ingest_subscriber.init_app(app)
 
-def on_connect(client, userdata, flags, rc):
-    """Callback for when the client receives a CONNACK response from the broker."""
-    if rc == 0:
-        print("Connected to MQTT Broker!")
-    else:
-        print(f"Failed to connect, return code {rc}\n")
-        
-mqtt_client.on_connect = on_connect
-mqtt_client.connect("localhost", 1883, 60)
-mqtt_client.loop_start()
+    app.register_blueprint(greenhouse_bp, url_prefix='/api/v1/greenhouse')
+    app.register_blueprint(readings_bp, url_prefix='/api/v1/readings')
+    app.register_blueprint(actuator_status_bp, url_prefix = '/api/v1/actuator_status')
+    app.register_blueprint(stream_bp, url_prefix = '/api/v1/stream')
+    app.register_blueprint(export_bp, url_prefix = '/api/v1/export')
 
-from GreenHouse_API import greenhouse_bp
-from Readings_API import readings_bp
-from Actuators_API import actuator_status_bp
 
+    @app.route('/')
+    def index():
+        return jsonify({"message":"it fucking works!!!"})
 
-app.register_blueprint(greenhouse_bp, url_prefix='/api/v1/greenhouse')
-app.register_blueprint(readings_bp, url_prefix='/api/v1/readings')
-app.register_blueprint(actuator_status_bp, url_prefix = '/api/v1/actuator_status')
 
+    @app.route('/api/v1/control/dispatcher', methods = ['GET'])
+    def dispatcher_stats():
+        return jsonify(control_dispatcher.stats()), 200
 
 
-@app.route('/')
-def index():
-    return jsonify({"message":"it fucking works!!!"})
+    @app.route('/api/v1/control/commands', methods = ['GET'])
+    def command_stats():
+        return jsonify(command_state.stats()), 200
+
+
+    @app.route('/api/v1/ingest/mqtt', methods = ['GET'])
+    def mqtt_ingest_stats():
+        return jsonify(ingest_subscriber.stats()), 200
+
+
+    @app.route('/api/v1/ingest/write_behind', methods = ['GET'])
+    def write_behind_stats():
+        return jsonify(write_behind.stats()), 200
+
+
+    @app.route('/api/v1/mqtt', methods = ['GET'])
+    def mqtt_stats():
+        return jsonify(mqtt_bridge.stats()), 200
+
+    return app
 
 
 if __name__ == '__main__':
+    from migrations import prepare_database
+
+    app = create_app()
     with app.app_context():
-        db.create_all()
-        
-    app.run(port = 5002, debug = True)
-    
\ No newline at end of file
+        prepare_database()
+
+    app.run(port = 5002, debug = app.config['DEBUG'])
+
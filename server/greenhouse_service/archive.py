@@ -0,0 +1,105 @@
+"""
+Compressed columnar archive of expired history rows.
+
+Rows are written as gzipped JSON segments holding one array per column, partitioned per
+table, greenhouse and month:
+
+    ARCHIVE_DIR/<table>/<greenhouse_id>/<YYYY-MM>/<first_id>-<last_id>.json.gz
+
+Segments are written atomically before the rows are deleted from the database. If a run is
+interrupted in between, the rows are archived again by the next run; readers drop
+duplicates by id.
+"""
+from flask import current_app
+from models import decode_state
+import datetime
+import gzip
+import json
+import os
+
+
+def _partition_dir(table, greenhouse_id, month = None):
+    path = os.path.join(current_app.config['ARCHIVE_DIR'], table, str(greenhouse_id))
+    return os.path.join(path, month) if month else path
+
+
+def write_segments(table, columns, rows):
+    """Writes row tuples (ordered like columns, which must include id, greenhouse_id and timestamp)."""
+    greenhouse_index = columns.index('greenhouse_id')
+    timestamp_index = columns.index('timestamp')
+    id_index = columns.index('id')
+    
+    partitions = {}
+    for row in rows:
+        month = row[timestamp_index].strftime('%Y-%m')
+        partitions.setdefault((row[greenhouse_index], month), []).append(row)
+        
+    for (greenhouse_id, month), partition in partitions.items():
+        directory = _partition_dir(table, greenhouse_id, month)
+        os.makedirs(directory, exist_ok = True)
+        
+        ids = [row[id_index] for row in partition]
+        data = {
+            column: [row[index].isoformat() if index == timestamp_index else row[index] for row in partition]
+            for index, column in enumerate(columns)
+        }
+        path = os.path.join(directory, f"{min(ids)}-{max(ids)}.json.gz")
+        temporary = path + '.tmp'
+        with gzip.open(temporary, 'wt', encoding = 'utf-8') as segment:
+            json.dump({'table': table, 'columns': data}, segment, separators = (',', ':'))
+        with open(temporary, 'rb') as segment:
+            os.fsync(segment.fileno())
+        os.replace(temporary, path)
+        
+        
+def _read_segment(path):
+    with gzip.open(path, 'rt', encoding = 'utf-8') as segment:
+        columns = json.load(segment)['columns']
+    columns['timestamp'] = [datetime.datetime.fromisoformat(value) for value in columns['timestamp']]
+    names = list(columns)
+    rows = [dict(zip(names, values)) for values in zip(*columns.values())]
+    if 'state' in columns:
+        # Actuator statuses are archived as the packed bitmask
+        for row in rows:
+            row.update(decode_state(row['state']))
+    return rows
+
+
+def read_rows(table, greenhouse_id, since = None, until = None, before = None, limit = None):
+    """
+    Returns archived rows of one greenhouse as dicts, newest first by (timestamp, id).
+    
+    'before' is an exclusive (timestamp, id) keyset bound. Months are read newest first and
+    reading stops once 'limit' rows have been collected from complete months.
+    """
+    root = _partition_dir(table, greenhouse_id)
+    if not os.path.isdir(root):
+        return []
+    
+    months = sorted(os.listdir(root), reverse = True)
+    if since is not None:
+        months = [month for month in months if month >= since.strftime('%Y-%m')]
+    if until is not None:
+        months = [month for month in months if month <= until.strftime('%Y-%m')]
+    if before is not None:
+        months = [month for month in months if month <= before[0].strftime('%Y-%m')]
+        
+    rows = {}
+    for month in months:
+        directory = os.path.join(root, month)
+        for name in os.listdir(directory):
+            if not name.endswith('.json.gz'):
+                continue
+            for row in _read_segment(os.path.join(directory, name)):
+                if since is not None and row['timestamp'] < since:
+                    continue
+                if until is not None and row['timestamp'] > until:
+                    continue
+                if before is not None and (row['timestamp'], row['id']) >= before:
+                    continue
+                rows[row['id']] = row
+        if limit is not None and len(rows) >= limit:
+            break
+        
+    ordered = sorted(rows.values(), key = lambda row: (row['timestamp'], row['id']), reverse = True)
+    return ordered[:limit] if limit is not None else ordered
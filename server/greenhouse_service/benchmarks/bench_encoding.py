@@ -0,0 +1,88 @@
+"""
+Benchmarks the history encodings against the jsonify path they replace.
+
+Builds a page of N reading dicts as pagination.history_page returns them and reports, per
+encoding, the time to encode it and the payload size, raw and compressed:
+
+    jsonify        Flask's default provider, as /all used before
+    rows_json      the same rows with pre-formatted timestamps (orjson when installed)
+    columnar_json  one array per column
+    rows_msgpack / columnar_msgpack, when msgpack is installed
+
+    python benchmarks/bench_encoding.py --rows 100000
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from models import Readings
+import encoding
+import argparse
+import datetime
+import gzip
+import json
+import random
+import time
+
+
+def make_page(row_count):
+    start = datetime.datetime(2025, 1, 1)
+    data = [
+        {'id': row_count - i, 'greenhouse id': 1, 'timestamp': start - datetime.timedelta(seconds = 5 * i),
+         'temp_celsius': round(random.uniform(10, 25), 2), 'humidity_pct': round(random.uniform(40, 85), 2),
+         'soil_moisture_pct': round(random.uniform(20, 70), 2), 'light_lux': float(random.randint(0, 100000)),
+         'CO2': float(random.randint(500, 700)), 'wind speed': round(random.uniform(0, 8), 2)}
+        for i in range(row_count)
+    ]
+    return {'data': data, 'next_cursor': None}
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run(row_count, repeat):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    page = make_page(row_count)
+
+    encoders = {
+        'jsonify': lambda: app.json.response(page).get_data(),
+        'rows_json': lambda: encoding.dumps_json(encoding.rows_payload(page)),
+        'columnar_json': lambda: encoding.dumps_json(encoding.columnar_payload(Readings, page))
+    }
+    if encoding.msgpack is not None:
+        encoders['rows_msgpack'] = lambda: encoding.dumps_msgpack(encoding.rows_payload(page))
+        encoders['columnar_msgpack'] = lambda: encoding.dumps_msgpack(encoding.columnar_payload(Readings, page))
+
+    results = {}
+    with app.app_context():
+        for name, encode in encoders.items():
+            body, seconds = timed(encode, repeat)
+            result = {'encode_ms': round(seconds * 1000, 1), 'bytes': len(body)}
+            gzipped, seconds = timed(lambda: gzip.compress(body, compresslevel = Config.RESPONSE_GZIP_LEVEL), 1)
+            result.update(gzip_bytes = len(gzipped), gzip_ms = round(seconds * 1000, 1))
+            if encoding.brotli is not None:
+                compressed, seconds = timed(lambda: encoding.brotli.compress(body, quality = Config.RESPONSE_BROTLI_QUALITY), 1)
+                result.update(brotli_bytes = len(compressed), brotli_ms = round(seconds * 1000, 1))
+            results[name] = result
+
+    return {'rows': row_count, 'orjson': encoding.orjson is not None, 'encodings': results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark history response encodings.")
+    parser.add_argument("--rows", type = int, nargs = "+", default = [100000])
+    parser.add_argument("--repeat", type = int, default = 3, help = "Best of this many encodes")
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(json.dumps([run(row_count, args.repeat) for row_count in args.rows], indent = 2))
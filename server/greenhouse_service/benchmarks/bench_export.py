@@ -0,0 +1,111 @@
+"""
+Benchmarks the streaming export: rows per second and memory against export size.
+
+Seeds a throw-away SQLite database with N readings and downloads GET /api/v1/export/readings
+through the Flask test client, consuming the body chunk by chunk like a real client. Each
+format is run twice: once timed, once under tracemalloc for the peak Python heap (plus
+pyarrow's own pool for Parquet). The peak should stay flat as N grows; the old /all path
+held every row, as ORM objects and dicts, at once.
+
+    python benchmarks/bench_export.py --sizes 100000 1000000
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from database import db
+from models import Greenhouse, Readings
+import export
+import argparse
+import datetime
+import json
+import tempfile
+import time
+import tracemalloc
+
+
+def seed(row_count, greenhouse_count, chunk_size = 50000):
+    db.session.execute(db.insert(Greenhouse), [
+        {"name": f"greenhouse_{i}", "location": "bench", "target_temp": 25.0, "target_humidity": 60.0,
+         "target_soil_moisture_pct": 40.0, "target_light": 500.0, "target_co_two": 400.0, "target_wind_speed": 1.0}
+        for i in range(greenhouse_count)
+    ])
+
+    start = datetime.datetime(2025, 1, 1)
+    for offset in range(0, row_count, chunk_size):
+        db.session.execute(db.insert(Readings), [
+            {"greenhouse_id": i % greenhouse_count + 1, "timestamp": start + datetime.timedelta(seconds = 5 * (i // greenhouse_count)),
+             "temp_celsius": 20.0 + i % 7, "humidity_pct": 50.0, "soil_moisture_pct": 40.0 - i % 5, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+            for i in range(offset, min(offset + chunk_size, row_count))
+        ])
+        db.session.commit()
+
+
+def download(client, export_format):
+    response = client.get(f"/api/v1/export/readings?format={export_format}")
+    assert response.status_code == 200, response.get_data()
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    return size
+
+
+def run(row_count, greenhouse_count, formats):
+    from Export_API import export_bp
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(directory, "bench.db")
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+        db.init_app(app)
+        app.register_blueprint(export_bp)
+
+        with app.app_context():
+            db.create_all()
+            seed(row_count, greenhouse_count)
+
+        client = app.test_client()
+        for export_format in formats:
+            started = time.perf_counter()
+            size = download(client, export_format)
+            seconds = time.perf_counter() - started
+
+            pool = export.pyarrow.default_memory_pool() if export_format == 'parquet' else None
+            tracemalloc.start()
+            download(client, export_format)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            result = {
+                "rows": row_count,
+                "format": export_format,
+                "bytes": size,
+                "seconds": round(seconds, 2),
+                "rows_per_second": round(row_count / seconds),
+                "peak_python_mb": round(peak / 2 ** 20, 1)
+            }
+            if pool is not None:
+                result["arrow_pool_peak_mb"] = round(pool.max_memory() / 2 ** 20, 1)
+            results.append(result)
+
+        with app.app_context():
+            db.engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the streaming export.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [100000, 1000000])
+    parser.add_argument("--greenhouses", type = int, default = 100)
+    args = parser.parse_args()
+
+    formats = ['csv'] + (['parquet'] if export.pyarrow is not None else [])
+    results = []
+    for size in args.sizes:
+        results += run(size, args.greenhouses, formats)
+    print(json.dumps(results, indent = 2))
@@ -0,0 +1,101 @@
+"""
+Benchmarks GET /api/v1/readings/<id>/latest as the readings table grows.
+
+Seeds a throw-away SQLite database with N rows spread over a number of greenhouses and
+times /latest through the Flask test client, with and without the composite
+(greenhouse_id, timestamp) index. With the index the latency should stay flat from 10k
+to 10M rows; without it every call is a scan plus a sort. The /latest snapshots are dropped
+before every request, so each one times the query rather than a snapshot hit.
+
+    python benchmarks/bench_latest.py --sizes 10000 100000 1000000 10000000
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from database import db
+from models import Greenhouse, Readings
+from latest_state import latest_state
+import argparse
+import datetime
+import json
+import statistics
+import tempfile
+import time
+
+
+def seed(row_count, greenhouse_count, chunk_size = 50000):
+    db.session.execute(db.insert(Greenhouse), [
+        {"name": f"greenhouse_{i}", "location": "bench", "target_temp": 25.0, "target_humidity": 60.0,
+         "target_soil_moisture_pct": 40.0, "target_light": 500.0, "target_co_two": 400.0, "target_wind_speed": 1.0}
+        for i in range(greenhouse_count)
+    ])
+    
+    start = datetime.datetime(2025, 1, 1)
+    for offset in range(0, row_count, chunk_size):
+        db.session.execute(db.insert(Readings), [
+            {"greenhouse_id": i % greenhouse_count + 1, "timestamp": start + datetime.timedelta(seconds = 5 * (i // greenhouse_count)),
+             "temp_celsius": 20.0, "humidity_pct": 50.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+            for i in range(offset, min(offset + chunk_size, row_count))
+        ])
+        db.session.commit()
+
+
+def run(row_count, greenhouse_count, requests, with_index):
+    from Readings_API import readings_bp
+    
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(directory, "bench.db")
+        db.init_app(app)
+        app.register_blueprint(readings_bp)
+        
+        with app.app_context():
+            db.create_all()
+            if not with_index:
+                db.session.execute(db.text("DROP INDEX ix_readings_greenhouse_id_timestamp"))
+            seed(row_count, greenhouse_count)
+            
+        client = app.test_client()
+        client.get("/api/v1/readings/1/latest")
+        
+        timings = []
+        for i in range(requests):
+            latest_state.clear()
+            started = time.perf_counter()
+            response = client.get(f"/api/v1/readings/{i % greenhouse_count + 1}/latest")
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_json()
+            
+        with app.app_context():
+            db.engine.dispose()
+            
+    timings.sort()
+    return {
+        "rows": row_count,
+        "indexed": with_index,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.fmean(timings), 3)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark /latest latency against table size.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10000, 100000, 1000000])
+    parser.add_argument("--greenhouses", type = int, default = 100)
+    parser.add_argument("--requests", type = int, default = 200)
+    parser.add_argument("--no-baseline", action = "store_true", help = "Skip the unindexed runs")
+    parser.add_argument("--json", action = "store_true", help = "Print results as JSON")
+    args = parser.parse_args()
+    
+    results = []
+    for size in args.sizes:
+        for with_index in ([True] if args.no_baseline else [True, False]):
+            results.append(run(size, args.greenhouses, args.requests, with_index))
+            if not args.json:
+                print(results[-1])
+                
+    if args.json:
+        print(json.dumps(results, indent = 2))
@@ -0,0 +1,113 @@
+"""
+Benchmarks the fleet overview against the per-greenhouse requests a dashboard made before.
+
+Seeds a throw-away SQLite database with N greenhouses and H readings and actuator statuses
+each, then times, through the Flask test client, GET /api/v1/greenhouse/ followed by
+/readings/<id>/latest and /actuator_status/<id>/latest for every greenhouse (2N+1 requests),
+and GET /api/v1/greenhouse/overview, counting the SQL statements each one runs. The
+overview should stay at one statement and its time should not move with H.
+
+    python benchmarks/bench_overview.py --greenhouses 100 1000 --history 100 1000
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from database import db
+from models import Greenhouse, Readings, ActuatorStatus
+from sqlalchemy import event
+import argparse
+import datetime
+import json
+import tempfile
+import time
+
+
+def seed(greenhouse_count, history, chunk_size = 50000):
+    db.session.execute(db.insert(Greenhouse), [
+        {"name": f"greenhouse_{i}", "location": "bench", "target_temp": 25.0, "target_humidity": 60.0,
+         "target_soil_moisture_pct": 40.0, "target_light": 500.0, "target_co_two": 400.0, "target_wind_speed": 1.0}
+        for i in range(greenhouse_count)
+    ])
+
+    start = datetime.datetime(2025, 1, 1)
+    total = greenhouse_count * history
+    for offset in range(0, total, chunk_size):
+        rows = range(offset, min(offset + chunk_size, total))
+        db.session.execute(db.insert(Readings), [
+            {"greenhouse_id": i % greenhouse_count + 1, "timestamp": start + datetime.timedelta(seconds = 5 * (i // greenhouse_count)),
+             "temp_celsius": 20.0 + i % 7, "humidity_pct": 50.0, "soil_moisture_pct": 40.0 - i % 5, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+            for i in rows
+        ])
+        db.session.execute(db.insert(ActuatorStatus), [
+            {"greenhouse_id": i % greenhouse_count + 1, "timestamp": start + datetime.timedelta(seconds = 5 * (i // greenhouse_count)), "state": i % 128}
+            for i in rows
+        ])
+        db.session.commit()
+
+
+def timed(client, engine, paths, runs = 3):
+    """Fastest of runs passes over paths, with the SQL statements one pass runs."""
+    statements = []
+    def count(*args):
+        statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', count)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for path in paths:
+            response = client.get(path)
+            assert response.status_code == 200, response.get_data()
+        times.append(time.perf_counter() - started)
+    event.remove(engine, 'before_cursor_execute', count)
+    return {"requests": len(paths), "statements": len(statements) // runs, "ms": round(min(times) * 1000, 1)}
+
+
+def run(greenhouse_count, history):
+    from GreenHouse_API import greenhouse_bp
+    from Readings_API import readings_bp
+    from Actuators_API import actuator_status_bp
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(directory, "bench.db")
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+        db.init_app(app)
+        for blueprint in (greenhouse_bp, readings_bp, actuator_status_bp):
+            app.register_blueprint(blueprint)
+
+        with app.app_context():
+            db.create_all()
+            seed(greenhouse_count, history)
+            engine = db.engine
+
+        client = app.test_client()
+        per_greenhouse = ["/api/v1/greenhouse/"]
+        for greenhouse_id in range(1, greenhouse_count + 1):
+            per_greenhouse += [f"/api/v1/readings/{greenhouse_id}/latest", f"/api/v1/actuator_status/{greenhouse_id}/latest"]
+        result = {
+            "greenhouses": greenhouse_count,
+            "history": history,
+            "per_greenhouse": timed(client, engine, per_greenhouse),
+            "overview": timed(client, engine, ["/api/v1/greenhouse/overview"])
+        }
+
+        with app.app_context():
+            db.engine.dispose()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the fleet overview endpoint.")
+    parser.add_argument("--greenhouses", type = int, nargs = "+", default = [100, 1000])
+    parser.add_argument("--history", type = int, nargs = "+", default = [100, 1000], help = "Readings and statuses per greenhouse")
+    args = parser.parse_args()
+
+    results = []
+    for greenhouse_count in args.greenhouses:
+        for history in args.history:
+            results.append(run(greenhouse_count, history))
+    print(json.dumps(results, indent = 2))
@@ -0,0 +1,101 @@
+"""
+Benchmarks the what-if replay on a month of 5 second readings for one greenhouse.
+
+Seeds a throw-away SQLite database with --days of readings (a daily temperature and light
+cycle, slowly drying soil and sensor noise) and times replay.load_history and the two
+vectorized simulations (stored and candidate setpoints, with minimum dwell) separately.
+
+    python benchmarks/bench_replay.py --days 30 --interval 5
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from database import db
+from models import Greenhouse, Readings
+import replay
+import argparse
+import datetime
+import json
+import tempfile
+import time
+import numpy as np
+
+
+def seed(days, interval, chunk_size = 50000):
+    db.session.execute(db.insert(Greenhouse), [
+        {"name": "greenhouse_replay", "location": "bench", "target_temp": 25.0, "target_humidity": 60.0,
+         "target_soil_moisture_pct": 40.0, "target_light": 500.0, "target_co_two": 400.0, "target_wind_speed": 1.0}
+    ])
+
+    rng = np.random.default_rng(0)
+    count = int(days * 86400 / interval)
+    seconds = np.arange(count) * interval
+    day = np.sin(2 * np.pi * seconds / 86400)
+    columns = {
+        "temp_celsius": 25.0 + 4.0 * day + rng.normal(0, 0.5, count),
+        "humidity_pct": 60.0 - 8.0 * day + rng.normal(0, 1.5, count),
+        "soil_moisture_pct": 45.0 - 10.0 * (seconds % (3 * 86400)) / (3 * 86400) + rng.normal(0, 0.5, count),
+        "light_lux": np.clip(500.0 + 600.0 * day, 0, None) + rng.normal(0, 20, count),
+        "co_two": 400.0 + 60.0 * day + rng.normal(0, 15, count),
+        "wind_speed": np.abs(1.0 + rng.normal(0, 0.4, count))
+    }
+    start = datetime.datetime(2025, 1, 1)
+    for offset in range(0, count, chunk_size):
+        stop = min(offset + chunk_size, count)
+        db.session.execute(db.insert(Readings), [
+            dict({field: float(values[i]) for field, values in columns.items()},
+                 greenhouse_id = 1, timestamp = start + datetime.timedelta(seconds = int(seconds[i])))
+            for i in range(offset, stop)
+        ])
+        db.session.commit()
+    return count, start, start + datetime.timedelta(seconds = int(seconds[-1]))
+
+
+def run(days, interval, runs):
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(directory, "bench.db")
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            count, since, until = seed(days, interval)
+            greenhouse = db.session.get(Greenhouse, 1)
+            current = [getattr(greenhouse, field) for field in replay.TARGET_FIELDS]
+            candidate = [23.0] + current[1:]
+            min_dwell = replay.configured_dwell()
+
+            loads, simulations = [], []
+            for _ in range(runs):
+                started = time.perf_counter()
+                times, readings = replay.load_history(1, since, until)
+                loaded = time.perf_counter()
+                result = replay.simulate(times, readings, current, None, min_dwell)
+                replay.simulate(times, readings, candidate, None, min_dwell)
+                loads.append(loaded - started)
+                simulations.append(time.perf_counter() - loaded)
+            db.session.remove()
+            db.engine.dispose()
+
+    return {
+        "readings": count,
+        "load_seconds": round(min(loads), 3),
+        "simulate_seconds": round(min(simulations), 3),
+        "rows_per_second": round(2 * count / min(simulations)),
+        "current": result
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the what-if replay.")
+    parser.add_argument("--days", type = float, default = 30)
+    parser.add_argument("--interval", type = float, default = 5, help = "Seconds between readings")
+    parser.add_argument("--runs", type = int, default = 3)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.days, args.interval, args.runs), indent = 2))
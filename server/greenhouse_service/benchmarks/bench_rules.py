@@ -0,0 +1,127 @@
+"""
+Benchmarks the vectorized rule engine against the original scalar control chain.
+
+The original if-chain from Readings_API.mqtt_messaging is reproduced below (without the
+database lookup and the MQTT publish). Both are run over the same random readings, their
+decisions are checked to be identical, and the time per decision is reported: end to end
+from row dicts (the ingest path) and for the array kernel alone (the replay path, where
+history is already loaded as arrays).
+
+    python benchmarks/bench_rules.py --sizes 1000 100000 1000000
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import READING_FIELDS, ACTUATOR_FIELDS
+from target_cache import Targets
+from rules import TARGET_FIELDS, compile_rules, decide
+import argparse
+import json
+import numpy as np
+import random
+import time
+
+
+def legacy_decision(reading, greenhouse):
+    temp_margin = 2.0
+    humidity_margin = 5.0
+    soil_moisture_margin = 5.0
+    light_margin = 100.0
+    co2_margin = 50.0
+    wind_speed_margin = 0.5
+    
+    message = {actuator: "OFF" for actuator in ACTUATOR_FIELDS}
+    
+    if reading['temp_celsius'] > greenhouse.target_temp + temp_margin:
+        message['heater_on'] = "OFF"
+        message['vents_on'] = "ON"
+        message['humidifier_pump_on'] = "ON"
+        message['fan_on'] = "ON"
+    elif reading['temp_celsius'] < greenhouse.target_temp - temp_margin:
+        message['heater_on'] = "ON"
+        message['vents_on'] = "OFF"
+        message['humidifier_pump_on'] = "OFF"
+        message['fan_on'] = "OFF"
+        
+    if reading['humidity_pct'] < greenhouse.target_humidity - humidity_margin:
+        message['humidifier_pump_on'] = "ON"
+        message['fan_on'] = "OFF"
+        message['vents_on'] = "OFF"
+    elif reading['humidity_pct'] > greenhouse.target_humidity + humidity_margin:
+        message['humidifier_pump_on'] = "OFF"
+        message['fan_on'] = "ON"
+        message['vents_on'] = "ON"
+        
+    if reading['soil_moisture_pct'] < greenhouse.target_soil_moisture_pct - soil_moisture_margin:
+        message['irrigation_pump_on'] = "ON"
+    elif reading['soil_moisture_pct'] > greenhouse.target_soil_moisture_pct + soil_moisture_margin:
+        message['irrigation_pump_on'] = "OFF"
+        
+    if reading['light_lux'] < greenhouse.target_light - light_margin:
+        message['lights_on'] = "ON"
+    elif reading['light_lux'] > greenhouse.target_light + light_margin:
+        message['lights_on'] = "OFF"
+        
+    if reading['co_two'] > greenhouse.target_co_two + co2_margin:
+        message['vents_on'] = "ON"
+        message['fan_on'] = "ON"
+        message['lights_on'] = "OFF"
+    elif reading['co_two'] < greenhouse.target_co_two - co2_margin:
+        message['vents_on'] = "OFF"
+        message['fan_on'] = "OFF"
+        message['lights_on'] = "ON"
+        
+    if reading['wind_speed'] > greenhouse.target_wind_speed + wind_speed_margin:
+        message['fan_on'] = "ON"
+    elif reading['wind_speed'] < greenhouse.target_wind_speed - wind_speed_margin:
+        message['fan_on'] = "OFF"
+        
+    return message
+
+
+def random_items(count, seed = 1):
+    generator = random.Random(seed)
+    targets = Targets(1, 25.0, 60.0, 40.0, 500.0, 400.0, 1.0, None)
+    ranges = {'temp_celsius': (15, 35), 'humidity_pct': (40, 80), 'soil_moisture_pct': (20, 60),
+              'light_lux': (200, 800), 'co_two': (300, 500), 'wind_speed': (0, 2)}
+    return [({field: generator.uniform(*ranges[field]) for field in READING_FIELDS}, targets) for _ in range(count)]
+
+
+def run(count):
+    items = random_items(count)
+    
+    started = time.perf_counter()
+    legacy = [legacy_decision(reading, targets) for reading, targets in items]
+    legacy_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    states = decide(items)
+    vectorized_seconds = time.perf_counter() - started
+    
+    readings = np.array([[reading[field] for field in READING_FIELDS] for reading, _ in items])
+    targets = np.array([[getattr(target, field) for field in TARGET_FIELDS] for _, target in items])
+    compiled = compile_rules(None)
+    started = time.perf_counter()
+    compiled.evaluate(readings, targets)
+    kernel_seconds = time.perf_counter() - started
+    
+    for message, row in zip(legacy, states):
+        assert [message[actuator] == "ON" for actuator in ACTUATOR_FIELDS] == row.tolist()
+        
+    return {
+        "decisions": count,
+        "legacy_us_per_decision": round(legacy_seconds / count * 1e6, 3),
+        "vectorized_us_per_decision": round(vectorized_seconds / count * 1e6, 3),
+        "kernel_us_per_decision": round(kernel_seconds / count * 1e6, 3),
+        "speedup": round(legacy_seconds / vectorized_seconds, 1),
+        "kernel_speedup": round(legacy_seconds / kernel_seconds, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the rule engine against the scalar control chain.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 100000, 1000000])
+    args = parser.parse_args()
+    
+    print(json.dumps([run(size) for size in args.sizes], indent = 2))
@@ -0,0 +1,124 @@
+"""
+Measures how fast the service comes up, with the MQTT broker unreachable.
+
+In fresh interpreters it times importing app (what a process pays cold) and create_app()
+(what a gunicorn worker pays, since the master already imported the modules), and lists the
+modules that cost the most to import. With --gunicorn it also starts gunicorn.conf.py with
+N workers on a copy of the database and reports the time to the first answered request and
+each worker's own "ready in" time from the log.
+
+    python benchmarks/bench_startup.py --runs 5 --gunicorn 4
+"""
+import os
+import sys
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+
+PROBE = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def environment(database):
+    env = dict(os.environ, DATABASE_URL = f"sqlite:///{database}", MQTT_BROKER_HOST = '127.0.0.1')
+    env.update(MQTT_BROKER_PORT = str(closed_port()), MQTT_INGEST_ENABLED = 'false', PYTHONWARNINGS = 'ignore')
+    return env
+
+
+def import_profile(env, top):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd = BASEDIR, env = env,
+                            capture_output = True, text = True, check = True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", line)
+        # Only the modules app imports itself, with everything they pull in
+        if match and len(match.group(2)) == 3:
+            modules[match.group(3)] = int(match.group(1)) / 1000
+    return dict(sorted(modules.items(), key = lambda item: -item[1])[:top])
+
+
+def time_process(env, runs):
+    imports, factories = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd = BASEDIR, env = env,
+                                capture_output = True, text = True, check = True).stdout
+        imported, created = map(float, output.split()[-2:])
+        imports.append(imported)
+        factories.append(created)
+    return {
+        'import_app_ms': round(statistics.median(imports) * 1000, 1),
+        'create_app_ms': round(statistics.median(factories) * 1000, 1)
+    }
+
+
+def time_gunicorn(env, workers, timeout = 60.0):
+    port = closed_port()
+    env = dict(env, WEB_CONCURRENCY = str(workers), GUNICORN_BIND = f"127.0.0.1:{port}")
+    log = tempfile.TemporaryFile(mode = 'w+')
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              cwd = BASEDIR, env = env, stdout = log, stderr = subprocess.STDOUT)
+    try:
+        first_response = None
+        ready = []
+        while time.perf_counter() - started < timeout and len(ready) < workers:
+            if first_response is None:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout = 1).read()
+                    first_response = time.perf_counter() - started
+                except OSError:
+                    pass
+            log.seek(0)
+            ready = [float(seconds) for seconds in re.findall(r"ready in ([\d.]+)s", log.read())]
+            time.sleep(0.02)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+
+    return {
+        'workers': workers,
+        'first_response_ms': round(first_response * 1000, 1) if first_response is not None else None,
+        'worker_ready_ms': [round(seconds * 1000, 1) for seconds in ready]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark service startup.")
+    parser.add_argument("--runs", type = int, default = 5, help = "Fresh interpreters to take the median over")
+    parser.add_argument("--top", type = int, default = 10, help = "Most expensive imports to list")
+    parser.add_argument("--gunicorn", type = int, default = 0, metavar = "WORKERS", help = "Also start gunicorn with this many workers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'greenhouse.db')
+        shutil.copy(os.path.join(BASEDIR, 'greenhouse.db'), database)
+        env = environment(database)
+
+        report = time_process(env, args.runs)
+        report['top_imports_ms'] = import_profile(env, args.top)
+        if args.gunicorn:
+            report['gunicorn'] = time_gunicorn(env, args.gunicorn)
+    print(json.dumps(report, indent = 2))
@@ -0,0 +1,135 @@
+"""
+Benchmarks single-reading POST throughput with and without the write-behind buffer.
+
+For each mode (per-request commit, write-behind with durability 'flush' and with 'enqueue')
+a fresh interpreter builds the app with create_app() on a throw-away SQLite database, with
+the MQTT broker unreachable, and --threads client threads POST --readings readings each to
+/api/v1/readings/<id> through the Flask test client. Reported are readings per second,
+latency percentiles, the group commits made and, after stop() has flushed the buffer,
+whether every accepted reading reached the table.
+
+    python benchmarks/bench_write_behind.py --threads 32 --readings 200
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+
+MODES = {
+    'commit': {'WRITE_BEHIND_ENABLED': False},
+    'flush': {'WRITE_BEHIND_ENABLED': True, 'WRITE_BEHIND_DURABILITY': 'flush'},
+    'enqueue': {'WRITE_BEHIND_ENABLED': True, 'WRITE_BEHIND_DURABILITY': 'enqueue'}
+}
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(mode, thread_count, per_thread, greenhouse_count, directory):
+    from config import Config
+    from app import create_app
+    from database import db
+    from models import Greenhouse, Readings
+    from write_behind import write_behind
+
+    settings = dict(MODES[mode], SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(directory, f"{mode}.db"),
+                    SQLALCHEMY_ENGINE_OPTIONS = {}, BACKGROUND_JOBS = False, METRICS_ENABLED = False,
+                    MQTT_BROKER_HOST = '127.0.0.1', MQTT_BROKER_PORT = closed_port())
+    app = create_app(type('BenchConfig', (Config,), settings))
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Greenhouse), [
+            {"name": f"greenhouse_{i}", "location": "bench", "target_temp": 25.0, "target_humidity": 60.0,
+             "target_soil_moisture_pct": 40.0, "target_light": 500.0, "target_co_two": 400.0, "target_wind_speed": 1.0}
+            for i in range(greenhouse_count)
+        ])
+        db.session.commit()
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    start = threading.Barrier(thread_count + 1)
+
+    def client(index):
+        test_client = app.test_client()
+        own_latencies = []
+        own_statuses = {}
+        start.wait()
+        for n in range(per_thread):
+            greenhouse_id = (index * per_thread + n) % greenhouse_count + 1
+            reading = {"temp_celsius": 20.0 + n % 10, "humidity_pct": 55.0, "soil_moisture_pct": 40.0,
+                       "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+            started = time.perf_counter()
+            response = test_client.post(f"/api/v1/readings/{greenhouse_id}", json = reading)
+            own_latencies.append(time.perf_counter() - started)
+            own_statuses[response.status_code] = own_statuses.get(response.status_code, 0) + 1
+        with lock:
+            latencies.extend(own_latencies)
+            for status, count in own_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target = client, args = (index,)) for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    write_behind.stop()
+    stats = write_behind.stats()
+    with app.app_context():
+        stored = db.session.execute(db.select(db.func.count(Readings.id))).scalar()
+        db.engine.dispose()
+
+    latencies.sort()
+    accepted = sum(count for status, count in statuses.items() if status in (201, 202))
+    return {
+        "mode": mode,
+        "readings": len(latencies),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "seconds": round(seconds, 2),
+        "readings_per_second": round(len(latencies) / seconds),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        "group_commits": stats['flushes'] if MODES[mode]['WRITE_BEHIND_ENABLED'] else None,
+        "all_stored": stored == accepted
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark single-reading ingest with and without write-behind.")
+    parser.add_argument("--threads", type = int, default = 32)
+    parser.add_argument("--readings", type = int, default = 200, help = "Readings posted per thread")
+    parser.add_argument("--greenhouses", type = int, default = 100)
+    parser.add_argument("--modes", nargs = "+", choices = list(MODES), default = list(MODES))
+    parser.add_argument("--mode", choices = list(MODES), help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        with tempfile.TemporaryDirectory() as directory:
+            print(json.dumps(run(args.mode, args.threads, args.readings, args.greenhouses, directory)))
+        sys.exit(0)
+
+    # One interpreter per mode: the app's background workers are process-wide singletons
+    results = []
+    for mode in args.modes:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode, '--threads', str(args.threads),
+                                 '--readings', str(args.readings), '--greenhouses', str(args.greenhouses)],
+                                capture_output = True, text = True, check = True,
+                                env = dict(os.environ, PYTHONWARNINGS = 'ignore')).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent = 2))
@@ -0,0 +1,137 @@
+"""
+Cross-process notices of committed writes, over the service's MQTT connection.
+
+Every worker process keeps its own /latest snapshots (latest_state), but a write may be
+served by any worker or by the MQTT ingest subscriber, and stream clients (stream_hub) are
+connected to any worker too. After its commit the writer calls changed(); the notice goes
+out on CHANGE_TOPIC and every other process hands it to its listeners, which drop the
+snapshots it names and pass the rows it carries on to their stream clients. Notices carry the sender's client id and a
+sequence number: a process ignores its own, and a gap (a notice that could not be sent, or
+was lost) makes the receiver drop everything it holds.
+
+A process trusts the feed once a probe it published on the current connection has come
+back, which proves its subscription is in place; live_since() returns when that happened,
+or None while the broker is unreachable. Caches fall back to a short TTL for data loaded
+before that moment, so a broker outage costs freshness, not correctness.
+"""
+from mqtt_bridge import mqtt_bridge
+import json
+import threading
+import time
+
+
+CHANGE_TOPIC = 'greenhouse/changes'
+
+
+class ChangeFeed:
+
+    def __init__(self):
+        self.json = None
+        self._listeners = set()
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._seen = {}
+        self._probed = None
+        self._live = (None, None)
+        self._counters = {'sent': 0, 'failed': 0, 'received': 0, 'gaps': 0}
+
+
+    def init_app(self, app):
+        self.json = app.json
+        mqtt_bridge.subscribe(CHANGE_TOPIC, self.on_message)
+
+
+    def listen(self, callback):
+        """
+        Calls callback(kind, greenhouse_ids, events) for every change made by another process, on
+        paho's network thread. events are the (greenhouse_id, data) pairs announced with it;
+        greenhouse_ids is None when changes may have been missed.
+        """
+        self._listeners.add(callback)
+
+
+    def live_since(self):
+        """The monotonic time from which every notice has been received, None while that is unknown."""
+        if not mqtt_bridge.connected:
+            return None
+        connection = mqtt_bridge.connected_at
+        live_connection, since = self._live
+        if live_connection == connection:
+            return since
+        if self._probed != connection:
+            self._probed = connection
+            self._send({'probe': connection})
+        return None
+
+
+    def changed(self, kind, greenhouse_ids, events = ()):
+        """
+        Announces committed rows of kind ('readings', 'actuator_status', 'targets', or None for
+        anything) for greenhouse_ids. events are (greenhouse_id, data) pairs for the stream
+        clients of other processes, data shaped like the matching /latest response.
+        """
+        greenhouse_ids = sorted(set(greenhouse_ids))
+        if greenhouse_ids:
+            self._send({'kind': kind, 'greenhouse_ids': greenhouse_ids, 'events': list(events)})
+
+
+    def _send(self, message):
+        client = mqtt_bridge.get_client()
+        with self._lock:
+            self._sequence += 1
+            # paho would queue a QoS 1 message in memory for as long as the broker is away;
+            # the skipped sequence number shows up as a gap at the receivers instead
+            if not mqtt_bridge.connected:
+                self._counters['failed'] += 1
+                return
+            payload = self.json.dumps(dict(message, origin = mqtt_bridge.client_id, sequence = self._sequence))
+        info = client.publish(CHANGE_TOPIC, payload, qos = 1)
+        with self._lock:
+            self._counters['sent' if info.rc == 0 else 'failed'] += 1
+
+
+    def on_message(self, client, userdata, msg):
+        """paho callback for CHANGE_TOPIC."""
+        try:
+            message = json.loads(msg.payload)
+            origin, sequence = message['origin'], message['sequence']
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring change notice: {e}")
+            return
+
+        if origin == mqtt_bridge.client_id:
+            if message.get('probe') is not None and message['probe'] == mqtt_bridge.connected_at:
+                self._live = (message['probe'], time.monotonic())
+            return
+
+        with self._lock:
+            last = self._seen.get(origin)
+            if last is not None and sequence <= last:
+                return
+            self._seen[origin] = sequence
+            self._counters['received'] += 1
+            gap = last is not None and sequence != last + 1
+            if gap:
+                self._counters['gaps'] += 1
+
+        if gap:
+            self._notify(None, None, [])
+        if 'greenhouse_ids' in message:
+            self._notify(message.get('kind'), message['greenhouse_ids'], message.get('events', []))
+
+
+    def _notify(self, kind, greenhouse_ids, events):
+        for callback in list(self._listeners):
+            try:
+                callback(kind, greenhouse_ids, events)
+            except Exception as e:
+                print(f"Change listener failed: {e}")
+
+
+    def stats(self):
+        live = self.live_since() is not None
+        with self._lock:
+            return dict(self._counters, live = live)
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,153 @@
+"""
+The last actuator command published per greenhouse, so commands go out only when they change.
+
+For every decision the control path asks plan() what to publish:
+
+    - the rules' fired masks from the previous decision are handed back (held()), so rules
+      with a hysteresis band do not flap around their margin;
+    - an actuator that switched less than its minimum dwell time ago (CONTROL_MIN_DWELL,
+      overridden per actuator by CONTROL_ACTUATOR_DWELL) keeps its state;
+    - the command is published when it differs from the last one, when none was published
+      yet, or when CONTROL_HEARTBEAT seconds have passed; otherwise it is suppressed.
+
+The state lives in the process, so a restart publishes every greenhouse's next decision
+once. Several processes stay consistent through the broker: every command published on
+greenhouse/+/readings, by any process, is fed back through observe() (commands are
+retained, so a new process also learns the current ones when it connects).
+"""
+from models import ACTUATOR_FIELDS
+from mqtt_bridge import mqtt_bridge
+from stream_hub import stream_hub
+import json
+import numpy as np
+import threading
+import time
+
+
+COMMAND_TOPIC = 'greenhouse/+/readings'
+
+
+class _Entry:
+    __slots__ = ('states', 'changed_at', 'published_at', 'fired')
+
+    def __init__(self):
+        self.states = None
+        self.changed_at = np.full(len(ACTUATOR_FIELDS), -np.inf)
+        self.published_at = None
+        self.fired = None
+
+
+class CommandState:
+
+    def __init__(self, heartbeat = 300.0, min_dwell = 0.0, publish_on_change = True):
+        self.heartbeat = heartbeat
+        self.min_dwell = np.full(len(ACTUATOR_FIELDS), min_dwell)
+        self.publish_on_change = publish_on_change
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._counters = {'decisions': 0, 'published': 0, 'heartbeats': 0, 'suppressed': 0, 'dwell_held': 0, 'observed': 0}
+
+
+    def init_app(self, app):
+        config = app.config
+        self.heartbeat = config['CONTROL_HEARTBEAT']
+        self.publish_on_change = config['CONTROL_PUBLISH_ON_CHANGE']
+        dwell = config['CONTROL_ACTUATOR_DWELL']
+        self.min_dwell = np.array([dwell.get(actuator, config['CONTROL_MIN_DWELL']) for actuator in ACTUATOR_FIELDS], dtype = float)
+        mqtt_bridge.subscribe(COMMAND_TOPIC, self.on_message)
+
+
+    def held(self, greenhouse_ids):
+        """The rules.Fired of each greenhouse's previous decision (None when unknown), for rules.decide_held."""
+        with self._lock:
+            return [self._entries[greenhouse_id].fired if greenhouse_id in self._entries else None for greenhouse_id in greenhouse_ids]
+
+
+    def plan(self, greenhouse_ids, states, fired, now = None):
+        """
+        Records the decisions (one row of states and one rules.Fired per greenhouse) and
+        returns the (greenhouse_id, states row) commands to publish, with minimum dwell applied.
+        Call published() for each command the broker accepted.
+        """
+        now = time.monotonic() if now is None else now
+        commands = []
+        with self._lock:
+            self._counters['decisions'] += len(greenhouse_ids)
+            for greenhouse_id, row, rule_fired in zip(greenhouse_ids, states, fired):
+                entry = self._entries.get(greenhouse_id)
+                if entry is None:
+                    entry = self._entries[greenhouse_id] = _Entry()
+                entry.fired = rule_fired
+
+                if entry.states is None:
+                    commands.append((greenhouse_id, row))
+                    continue
+
+                switching = row != entry.states
+                early = switching & (now - entry.changed_at < self.min_dwell)
+                if early.any():
+                    self._counters['dwell_held'] += 1
+                    row = np.where(early, entry.states, row)
+
+                if not self.publish_on_change or (row != entry.states).any():
+                    commands.append((greenhouse_id, row))
+                elif self.heartbeat > 0 and now - entry.published_at >= self.heartbeat:
+                    self._counters['heartbeats'] += 1
+                    commands.append((greenhouse_id, row))
+                else:
+                    self._counters['suppressed'] += 1
+        return commands
+
+
+    def published(self, greenhouse_id, states, now = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._counters['published'] += 1
+            self._record(greenhouse_id, states, now)
+
+
+    def observe(self, greenhouse_id, message, now = None):
+        """Takes note of a command message seen on the broker, published by this or another process."""
+        states = np.array([message[actuator] == 'ON' for actuator in ACTUATOR_FIELDS])
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._counters['observed'] += 1
+            entry = self._entries.get(greenhouse_id)
+            if entry is None or entry.states is None or (states != entry.states).any():
+                self._record(greenhouse_id, states, now)
+
+
+    def on_message(self, client, userdata, msg):
+        """paho callback for COMMAND_TOPIC. New commands, from any process, also go to stream clients."""
+        try:
+            greenhouse_id = int(msg.topic.split('/')[1])
+            message = json.loads(msg.payload)
+            self.observe(greenhouse_id, message)
+            # Retained copies are replayed on subscribe; they are not new
+            if not msg.retain:
+                stream_hub.publish_data('command', greenhouse_id, message)
+        except (ValueError, IndexError, KeyError, TypeError) as e:
+            print(f"Ignoring command on '{msg.topic}': {e}")
+
+
+    def _record(self, greenhouse_id, states, now):
+        entry = self._entries.get(greenhouse_id)
+        if entry is None:
+            entry = self._entries[greenhouse_id] = _Entry()
+        if entry.states is not None:
+            entry.changed_at = np.where(states != entry.states, now, entry.changed_at)
+        entry.states = np.array(states, dtype = bool)
+        entry.published_at = now
+
+
+    def forget(self, greenhouse_id):
+        with self._lock:
+            self._entries.pop(greenhouse_id, None)
+
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, greenhouses = len(self._entries), heartbeat = self.heartbeat)
+
+
+command_state = CommandState()
@@ -1,9 +1,103 @@
+from dotenv import load_dotenv
 import os
 
+load_dotenv(os.path.join(os.path.abspath(os.path.dirname(__file__)), '.env'))
+
+
+def database_uri(basedir):
+    """DATABASE_URL when set (postgres:// is accepted for postgresql://), else the local SQLite file."""
+    uri = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'greenhouse.db')
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """Connection pool settings for Postgres; SQLite keeps SQLAlchemy's defaults and gets its pragmas in database.py."""
+    if not uri.startswith('postgresql'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)), # Seconds to wait for a free connection
+        'pool_recycle': 1800, # Seconds, stays below typical server and proxy idle timeouts
+        'pool_pre_ping': True,
+        'connect_args': {
+            'application_name': 'greenhouse_service',
+            'options': f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))}"
+        }
+    }
+
+
 class Config:
     BASEDIR = os.path.abspath(os.path.dirname(__file__))
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASEDIR, 'greenhouse.db')
-    #SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_DATABASE_URI = database_uri(BASEDIR)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL', # Readers no longer block the writer
+        'synchronous': 'NORMAL', # Safe with WAL, fsync at checkpoints only
+        'busy_timeout': 5000, # Milliseconds a writer waits for the lock
+        'foreign_keys': 'ON',
+        'cache_size': -65536, # 64 MiB page cache
+        'temp_store': 'MEMORY'
+    }
+    COPY_MIN_ROWS = int(os.environ.get('COPY_MIN_ROWS', 200)) # Postgres batches this large are written with COPY
+    PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3)) # Monthly Postgres partitions created in advance
     SECRET_KEY = os.environ.get('SECRET_KEY')
-    CORS_ORIGINS = ["http://localhost:3000"]
\ No newline at end of file
+    DEBUG = os.environ.get('FLASK_DEBUG', 'false').lower() == 'true' # Development server only
+    BACKGROUND_JOBS = os.environ.get('BACKGROUND_JOBS', 'true').lower() == 'true' # Control sweep, retention and MQTT ingest; gunicorn runs them in one worker
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    CORS_ORIGINS = ["http://localhost:3000"]
+    MQTT_BROKER_HOST = os.environ.get('MQTT_BROKER_HOST', 'localhost')
+    MQTT_BROKER_PORT = int(os.environ.get('MQTT_BROKER_PORT', 1883))
+    MQTT_CLIENT_ID_PREFIX = os.environ.get('MQTT_CLIENT_ID_PREFIX', 'FlaskAPI') # Host, pid and a random suffix are appended per process
+    MQTT_KEEPALIVE = 60 # Seconds
+    MQTT_RECONNECT_MIN_DELAY = int(os.environ.get('MQTT_RECONNECT_MIN_DELAY', 1)) # Seconds, doubled after every failed attempt
+    MQTT_RECONNECT_MAX_DELAY = int(os.environ.get('MQTT_RECONNECT_MAX_DELAY', 60)) # Seconds
+    MQTT_INGEST_ENABLED = os.environ.get('MQTT_INGEST_ENABLED', 'false').lower() == 'true'
+    MQTT_INGEST_TOPIC = 'greenhouse/+/sensors'
+    MQTT_INGEST_SHARE_GROUP = os.environ.get('MQTT_INGEST_SHARE_GROUP', '') # Shared subscription group, empty for none
+    MQTT_INGEST_CLIENT_ID = os.environ.get('MQTT_INGEST_CLIENT_ID', 'GreenhouseIngest') # Stable, so the broker keeps the session
+    MQTT_INGEST_INSTANCE = os.environ.get('MQTT_INGEST_INSTANCE', '') # Client id suffix per process in a share group, <host>-<pid> when empty
+    MQTT_INGEST_QOS = 1
+    MQTT_INGEST_BATCH_SIZE = int(os.environ.get('MQTT_INGEST_BATCH_SIZE', 500))
+    MQTT_INGEST_FLUSH_INTERVAL = float(os.environ.get('MQTT_INGEST_FLUSH_INTERVAL', 1.0)) # Seconds
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true' # Group commit for single-reading POSTs
+    WRITE_BEHIND_DURABILITY = os.environ.get('WRITE_BEHIND_DURABILITY', 'flush') # flush: answer after the commit; enqueue: answer once buffered
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500)) # Buffered readings that trigger a commit
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.02)) # Seconds
+    WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 50000)) # Buffered readings before POSTs get 503
+    WRITE_BEHIND_ACK_TIMEOUT = float(os.environ.get('WRITE_BEHIND_ACK_TIMEOUT', 5.0)) # Seconds a POST waits for its commit before answering 202
+    MAX_BATCH_SIZE = 5000
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    MAX_AGGREGATE_BUCKETS = 5000
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 10000)) # Rows fetched, encoded and sent at a time; one Parquet row group
+    REPLAY_MAX_ROWS = int(os.environ.get('REPLAY_MAX_ROWS', 2000000)) # Readings one replay may load, about 100 MB of arrays
+    RESPONSE_COMPRESS_MIN_SIZE = 1024 # Bytes; smaller history responses are sent uncompressed
+    RESPONSE_GZIP_LEVEL = 5
+    RESPONSE_BROTLI_QUALITY = 4
+    TARGET_CACHE_SIZE = int(os.environ.get('TARGET_CACHE_SIZE', 1024))
+    TARGET_CACHE_TTL = float(os.environ.get('TARGET_CACHE_TTL', 5.0)) # Seconds
+    LATEST_SNAPSHOT_TTL = float(os.environ.get('LATEST_SNAPSHOT_TTL', 1.0)) # Seconds, only while the change feed is not live
+    STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 256)) # Events buffered per stream client before the oldest are dropped
+    STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', 15.0)) # Seconds between keep-alive comments
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', max(1, int(os.environ.get('GUNICORN_THREADS', 8)) // 2))) # Per process; every client holds a request thread
+    CONTROL_WORKERS = int(os.environ.get('CONTROL_WORKERS', 2)) # 0 evaluates control inline
+    CONTROL_QUEUE_SIZE = int(os.environ.get('CONTROL_QUEUE_SIZE', 10000)) # Pending greenhouses
+    CONTROL_BACKPRESSURE = os.environ.get('CONTROL_BACKPRESSURE', 'block') # block, drop_oldest or reject
+    CONTROL_BLOCK_TIMEOUT = float(os.environ.get('CONTROL_BLOCK_TIMEOUT', 1.0)) # Seconds
+    CONTROL_DRAIN_SIZE = 256 # Greenhouses decided per vectorized pass
+    CONTROL_PUBLISH_ON_CHANGE = os.environ.get('CONTROL_PUBLISH_ON_CHANGE', 'true').lower() == 'true' # Suppress commands identical to the last one
+    CONTROL_HEARTBEAT = float(os.environ.get('CONTROL_HEARTBEAT', 300)) # Seconds after which an unchanged command is published again, 0 never
+    CONTROL_MIN_DWELL = float(os.environ.get('CONTROL_MIN_DWELL', 30)) # Seconds an actuator keeps a state before it may switch again
+    CONTROL_ACTUATOR_DWELL = {'heater_on': 120.0, 'irrigation_pump_on': 60.0, 'humidifier_pump_on': 60.0} # Actuators not listed use CONTROL_MIN_DWELL
+    CONTROL_SWEEP_INTERVAL = int(os.environ.get('CONTROL_SWEEP_INTERVAL', 0)) # Seconds, 0 disables re-evaluation sweeps
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(BASEDIR, 'archive'))
+    RETENTION_RAW_DAYS = int(os.environ.get('RETENTION_RAW_DAYS', 7))
+    RETENTION_ROLLUP_DAYS = {'1m': int(os.environ.get('RETENTION_MINUTE_ROLLUP_DAYS', 7))} # Buckets not listed are kept
+    RETENTION_CHUNK_SIZE = 5000 # Rows archived and deleted per transaction
+    RETENTION_CHUNK_PAUSE = 0.05 # Seconds between chunks
+    RETENTION_VACUUM = True
+    RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 0)) # Seconds, 0 disables the background job
\ No newline at end of file
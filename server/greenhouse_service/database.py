@@ -1,11 +1,56 @@
 from flask_sqlalchemy import SQLAlchemy 
+from flask import current_app
+from sqlalchemy import event
+import csv
+import io
 import os 
 import sys 
 
 db = SQLAlchemy()
 
 def init_db(app):
+    """Binds db to app. SQLite connections get the SQLITE_PRAGMAS (WAL, relaxed sync, busy timeout) on connect."""
     db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _sqlite_pragmas(app.config.get('SQLITE_PRAGMAS', {})))
+            
+            
+def _sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    return on_connect
+
+
+def bulk_insert(model, rows):
+    """
+    Inserts row dicts (all with the same keys) into model's table in the current transaction.
+    
+    On Postgres, batches of COPY_MIN_ROWS or more are streamed with COPY ... FROM STDIN,
+    which avoids the per-row statement overhead of an INSERT; otherwise an executemany
+    INSERT is used.
+    """
+    if db.session.get_bind().dialect.name != 'postgresql' or len(rows) < current_app.config['COPY_MIN_ROWS']:
+        db.session.execute(db.insert(model), rows)
+        return
+    
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Unquoted empty fields are NULL in COPY's CSV format
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+    
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+        
     
     
 def create_db_tables(app):
@@ -0,0 +1,221 @@
+from collections import deque
+from models import Readings, READING_FIELDS
+from queries import latest_rows
+import threading
+import time
+
+
+class ControlDispatcher:
+    """
+    Runs control evaluation and MQTT publishing on background worker threads, after commit.
+    
+    Pending work is keyed by greenhouse: a reading submitted while an older one for the same
+    greenhouse is still queued replaces it, so a backlog costs one decision per greenhouse.
+    At most CONTROL_QUEUE_SIZE greenhouses can be pending; when the queue is full the
+    CONTROL_BACKPRESSURE mode decides what happens:
+    
+        block        wait for space, then drop the decision; one submit_many call waits at
+                     most CONTROL_BLOCK_TIMEOUT seconds in all, however many greenhouses it has
+        drop_oldest  discard the oldest pending greenhouse of the busiest worker to make room
+        reject       refuse new readings; the API checks has_capacity() and answers 503
+                     before storing anything
+    
+    Each greenhouse belongs to one worker (greenhouse_id % CONTROL_WORKERS), so two workers
+    never decide the same greenhouse at once and its hysteresis and dwell state in
+    command_state is updated in order. Workers take up to CONTROL_DRAIN_SIZE of their pending
+    greenhouses at a time and decide them in one vectorized rule pass. With
+    CONTROL_WORKERS = 0 readings are evaluated inline, one calling thread at a time.
+    """
+    
+    BACKPRESSURE_MODES = ('block', 'drop_oldest', 'reject')
+    
+    def __init__(self, max_pending = 10000, workers = 0, backpressure = 'block', block_timeout = 1.0, drain_size = 256):
+        self.max_pending = max_pending
+        self.drain_size = drain_size
+        self.workers = workers
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.app = None
+        self._pending = {}
+        self._orders = [deque()]
+        self._condition = threading.Condition()
+        self._inline = threading.Lock()
+        self._threads = []
+        self._running = False
+        self._counters = {'submitted': 0, 'coalesced': 0, 'dropped': 0, 'rejected': 0, 'processed': 0, 'failed': 0, 'unknown_greenhouse': 0}
+        
+        
+    def init_app(self, app):
+        backpressure = app.config['CONTROL_BACKPRESSURE']
+        if backpressure not in self.BACKPRESSURE_MODES:
+            raise ValueError(f"CONTROL_BACKPRESSURE must be one of {', '.join(self.BACKPRESSURE_MODES)}")
+        
+        self.app = app
+        self.max_pending = app.config['CONTROL_QUEUE_SIZE']
+        self.workers = app.config['CONTROL_WORKERS']
+        self.backpressure = backpressure
+        self.block_timeout = app.config['CONTROL_BLOCK_TIMEOUT']
+        self.drain_size = app.config['CONTROL_DRAIN_SIZE']
+        self.start()
+        
+        
+    def start(self):
+        if self._running or self.workers <= 0:
+            return
+        self._running = True
+        self._orders = [deque() for _ in range(self.workers)]
+        for greenhouse_id in self._pending:
+            self._orders[greenhouse_id % self.workers].append(greenhouse_id)
+        for number in range(self.workers):
+            thread = threading.Thread(target = self._run, args = (number,), name = f"control-dispatcher-{number}", daemon = True)
+            thread.start()
+            self._threads.append(thread)
+            
+            
+    def stop(self, timeout = 5.0):
+        """Stops the workers once the queue has drained or the timeout has passed."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._pending and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            self._running = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        
+        
+    def has_capacity(self, greenhouse_ids):
+        """In 'reject' mode, tells whether readings for these greenhouses would be accepted right now."""
+        if self.backpressure != 'reject' or not self._running:
+            return True
+        with self._condition:
+            new = sum(1 for greenhouse_id in set(greenhouse_ids) if greenhouse_id not in self._pending)
+            return len(self._pending) + new <= self.max_pending
+        
+        
+    def submit(self, greenhouse_id, reading, targets = None):
+        """
+        Queues a committed reading (a row dict) for control evaluation.
+        
+        Returns False if the decision was dropped or rejected because the queue is full.
+        """
+        return self.submit_many([(greenhouse_id, reading, targets)]) == 1
+    
+    
+    def submit_many(self, items):
+        """Queues (greenhouse_id, reading, targets) tuples. Returns how many were accepted."""
+        if not self._running:
+            with self._inline:
+                self._process(items)
+            return len(items)
+        
+        deadline = time.monotonic() + self.block_timeout
+        with self._condition:
+            accepted = sum(1 for greenhouse_id, reading, targets in items if self._enqueue(greenhouse_id, reading, targets, deadline))
+            self._condition.notify_all()
+            return accepted
+        
+        
+    def _enqueue(self, greenhouse_id, reading, targets, deadline):
+        self._counters['submitted'] += 1
+        pending = self._pending.get(greenhouse_id)
+        if pending is not None:
+            self._counters['coalesced'] += 1
+            if reading['timestamp'] >= pending[0]['timestamp']:
+                self._pending[greenhouse_id] = (reading, targets)
+            return True
+        
+        if len(self._pending) >= self.max_pending:
+            if self.backpressure == 'reject':
+                self._counters['rejected'] += 1
+                return False
+            
+            if self.backpressure == 'block':
+                self._condition.notify_all()
+                while len(self._pending) >= self.max_pending and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                if len(self._pending) >= self.max_pending:
+                    self._counters['dropped'] += 1
+                    return False
+            else:
+                del self._pending[max(self._orders, key = len).popleft()]
+                self._counters['dropped'] += 1
+                
+        self._pending[greenhouse_id] = (reading, targets)
+        self._orders[greenhouse_id % len(self._orders)].append(greenhouse_id)
+        return True
+    
+    
+    def stats(self):
+        with self._condition:
+            return dict(self._counters, queue_depth = len(self._pending), max_pending = self.max_pending,
+                        workers = len(self._threads), backpressure = self.backpressure)
+        
+        
+    def _run(self, number):
+        order = self._orders[number]
+        while True:
+            with self._condition:
+                while self._running and not order:
+                    self._condition.wait()
+                if not order:
+                    return
+                items = []
+                while order and len(items) < self.drain_size:
+                    greenhouse_id = order.popleft()
+                    reading, targets = self._pending.pop(greenhouse_id)
+                    items.append((greenhouse_id, reading, targets))
+                self._condition.notify_all()
+                
+            with self.app.app_context():
+                self._process(items)
+                
+                
+    def _process(self, items):
+        from Readings_API import mqtt_messaging_many
+        
+        unknown = 0
+        try:
+            # Greenhouses deleted since their reading was submitted are skipped and counted apart
+            unknown = mqtt_messaging_many(items)
+            outcome = 'processed'
+        except Exception as e:
+            print(f"Control evaluation failed for greenhouses {[item[0] for item in items]}: {e}")
+            outcome = 'failed'
+            
+        with self._condition:
+            self._counters[outcome] += len(items) - unknown
+            self._counters['unknown_greenhouse'] += unknown
+
+
+control_dispatcher = ControlDispatcher()
+
+
+def start_control_sweep(app):
+    """
+    Re-evaluates every greenhouse's newest reading every CONTROL_SWEEP_INTERVAL seconds (0 disables it).
+    
+    Picks up target and rule changes for greenhouses whose sensors are quiet; the sweep goes
+    through the dispatcher, so it is decided in vectorized batches.
+    """
+    interval = app.config['CONTROL_SWEEP_INTERVAL']
+    if interval <= 0:
+        return None
+    
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    latest = latest_rows(Readings)
+                    control_dispatcher.submit_many([
+                        (greenhouse_id, {field: getattr(row, field) for field in ('timestamp',) + READING_FIELDS}, None)
+                        for greenhouse_id, row in latest.items()
+                    ])
+            except Exception as e:
+                print(f"Control sweep failed: {e}")
+                
+    thread = threading.Thread(target = run, name = "control-sweep", daemon = True)
+    thread.start()
+    return thread
@@ -0,0 +1,120 @@
+"""
+Fast encoding of history responses.
+
+A history page can be returned in two layouts, selected with 'format':
+
+    rows      (default) one object per row, with the keys and HTTP date timestamps of serialize()
+    columnar  one array per column, keyed by column name, with ISO 8601 timestamps:
+              {"columns": {"timestamp": [...], "temp_celsius": [...]}, "next_cursor": ...}
+
+The body is MessagePack when the client prefers application/msgpack, JSON otherwise, and
+is compressed with brotli or gzip according to Accept-Encoding once it is larger than
+RESPONSE_COMPRESS_MIN_SIZE bytes. orjson, msgpack and brotli are used when installed; without
+them the JSON falls back to the standard library encoder, and MessagePack and brotli are not
+offered.
+"""
+from flask import current_app, request
+from pagination import parse_fields
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+FORMATS = ('rows', 'columnar')
+
+
+def http_date(value):
+    # Same text as Flask's default encoder produces for naive datetimes, about 3x faster
+    return value.strftime('%a, %d %b %Y %H:%M:%S GMT') if value is not None else None
+
+
+def iso_date(value):
+    return value.isoformat() if value is not None else None
+
+
+def rows_payload(page):
+    """The page as returned by pagination.history_page, with timestamps pre-formatted for encoding."""
+    data = page['data']
+    if data and 'timestamp' in data[0]:
+        data = [dict(item, timestamp = http_date(item['timestamp'])) for item in data]
+    return {'data': data, 'next_cursor': page['next_cursor']}
+
+
+def columnar_payload(model, page, fields = None):
+    """Transposes a history page into one array per column, keyed by column name."""
+    data = page['data']
+    columns = {column: [item[key] for item in data] for key, column in parse_fields(model, fields)}
+    if 'timestamp' in columns:
+        columns['timestamp'] = [iso_date(value) for value in columns['timestamp']]
+    return {'columns': columns, 'next_cursor': page['next_cursor']}
+
+
+def dumps_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators = (',', ':')).encode()
+
+
+def dumps_msgpack(payload):
+    return msgpack.packb(payload, use_bin_type = True)
+
+
+def compress(body, encoding):
+    config = current_app.config
+    if encoding == 'br':
+        return brotli.compress(body, quality = config['RESPONSE_BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel = config['RESPONSE_GZIP_LEVEL'])
+
+
+def negotiate():
+    """Returns (mimetype, content encoding or None) for the current request."""
+    mimetypes = [JSON_MIMETYPE] + ([MSGPACK_MIMETYPE] if msgpack is not None else [])
+    mimetype = request.accept_mimetypes.best_match(mimetypes, default = JSON_MIMETYPE)
+
+    encodings = (['br'] if brotli is not None else []) + ['gzip']
+    encoding = None
+    for candidate in encodings:
+        quality = request.accept_encodings[candidate]
+        if quality and (encoding is None or quality > request.accept_encodings[encoding]):
+            encoding = candidate
+    return mimetype, encoding
+
+
+def history_response(model, page, args):
+    """
+    Builds the response for a history page in the layout, content type and compression the client asked for.
+
+    Raises:
+        ValueError: If 'format' is unknown.
+    """
+    layout = args.get('format', 'rows')
+    if layout not in FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(FORMATS)}")
+    payload = rows_payload(page) if layout == 'rows' else columnar_payload(model, page, args.get('fields'))
+
+    mimetype, encoding = negotiate()
+    body = dumps_msgpack(payload) if mimetype == MSGPACK_MIMETYPE else dumps_json(payload)
+
+    response = current_app.response_class(mimetype = mimetype)
+    if encoding and len(body) >= current_app.config['RESPONSE_COMPRESS_MIN_SIZE']:
+        body = compress(body, encoding)
+        response.headers['Content-Encoding'] = encoding
+    response.set_data(body)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
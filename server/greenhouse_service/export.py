@@ -0,0 +1,196 @@
+"""
+Streaming export of the history tables as CSV or Parquet.
+
+Rows are read with yield_per (a server-side cursor on Postgres, chunked fetches on SQLite)
+EXPORT_CHUNK_SIZE at a time and every chunk is encoded and handed on before the next one
+is fetched, so memory use does not depend on the size of the export. CSV has a header row
+and ISO 8601 timestamps (2025-01-01 12:00:00.000000); Parquet (needs pyarrow) gets one row group per chunk. Columns are
+named after the table columns, actuator states are "ON"/"OFF". Rows are ordered by
+greenhouse, then time. Rows the retention job moved to the archive are not exported.
+
+Served by GET /api/v1/export/<table>, or from the command line:
+
+    python export.py readings --greenhouse-ids 1,2 --since 2025-01-01 --format parquet -o readings.parquet
+"""
+from flask import current_app
+from models import Readings, ActuatorStatus
+from database import db, init_db
+from pagination import parse_fields, parse_timestamp, parse_greenhouse_ids
+import csv
+import datetime
+import io
+import sys
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+EXPORT_TABLES = {'readings': Readings, 'actuator_status': ActuatorStatus}
+EXPORT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def export_query(model, greenhouse_ids = None, since = None, until = None, fields = None):
+    """Returns (column names, select) for the export of model; fields is a comma separated column list."""
+    columns = [column for _, column in parse_fields(model, fields)]
+    query = db.select(*[getattr(model, column) for column in columns])
+    if greenhouse_ids is not None:
+        query = query.where(model.greenhouse_id.in_(greenhouse_ids))
+    if since is not None:
+        query = query.where(model.timestamp >= since)
+    if until is not None:
+        query = query.where(model.timestamp <= until)
+    return columns, query.order_by(model.greenhouse_id, model.timestamp, model.id)
+
+
+def prepare_export(table, args):
+    """
+    Validates the export arguments: 'format' (csv or parquet), 'greenhouse_ids', 'since', 'until'
+    and 'fields'. Returns (format, column names, query).
+
+    Raises:
+        ValueError: If the table or an argument is invalid.
+    """
+    model = EXPORT_TABLES.get(table)
+    if model is None:
+        raise ValueError(f"Table must be one of {', '.join(EXPORT_TABLES)}")
+    export_format = args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'parquet' and pyarrow is None:
+        raise ValueError("Parquet export needs pyarrow installed, use format=csv")
+
+    columns, query = export_query(
+        model,
+        parse_greenhouse_ids(args.get('greenhouse_ids')),
+        parse_timestamp(args.get('since'), 'since'),
+        parse_timestamp(args.get('until'), 'until'),
+        args.get('fields')
+    )
+    return export_format, columns, query
+
+
+def iter_chunks(query, chunk_size = None):
+    """Yields lists of row tuples, chunk_size (default EXPORT_CHUNK_SIZE) at a time, from a streaming cursor."""
+    chunk_size = chunk_size or current_app.config['EXPORT_CHUNK_SIZE']
+    # Core execution: the ORM's per-row loading adds nothing for plain column tuples
+    result = db.session.connection().execute(query.execution_options(yield_per = chunk_size))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def csv_stream(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator = '\n')
+    writer.writerow(columns)
+    for rows in chunks:
+        # Timestamps are written as str() gives them, ISO 8601 with a space as separator
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """File-like target that hands out what pyarrow wrote since the last take()."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        self.closed = True
+
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _arrow_schema(columns, query):
+    types = {int: pyarrow.int64(), float: pyarrow.float64(), str: pyarrow.string(), datetime.datetime: pyarrow.timestamp('us')}
+    return pyarrow.schema([(name, types[column.type.python_type]) for name, column in zip(columns, query.selected_columns)])
+
+
+def parquet_stream(columns, chunks, query):
+    schema = _arrow_schema(columns, query)
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression = 'zstd')
+    try:
+        for rows in chunks:
+            arrays = [pyarrow.array(values, type = field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema = schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def export_stream(export_format, columns, query, chunk_size = None):
+    """Yields the export as byte chunks."""
+    chunks = iter_chunks(query, chunk_size)
+    if export_format == 'parquet':
+        return parquet_stream(columns, chunks, query)
+    return csv_stream(columns, chunks)
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    from config import Config
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description = "Export readings or actuator history as CSV or Parquet.")
+    parser.add_argument("table", choices = list(EXPORT_TABLES))
+    parser.add_argument("--format", choices = list(EXPORT_FORMATS), default = 'csv')
+    parser.add_argument("--greenhouse-ids", help = "Comma separated, default all")
+    parser.add_argument("--since", help = "ISO 8601, inclusive")
+    parser.add_argument("--until", help = "ISO 8601, inclusive")
+    parser.add_argument("--fields", help = "Comma separated columns, default all")
+    parser.add_argument("-o", "--output", help = "File to write, default stdout")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+
+    try:
+        with app.app_context():
+            export_format, columns, query = prepare_export(args.table, {
+                'format': args.format, 'greenhouse_ids': args.greenhouse_ids, 'since': args.since,
+                'until': args.until, 'fields': args.fields
+            })
+            started = time.perf_counter()
+            written = 0
+            output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+            try:
+                for data in export_stream(export_format, columns, query):
+                    output.write(data)
+                    written += len(data)
+            finally:
+                if args.output:
+                    output.close()
+            print(f"Exported {written} bytes in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print(f"Error exporting {args.table}: {e}", file=sys.stderr)
+        sys.exit(1)
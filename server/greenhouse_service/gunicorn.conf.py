@@ -0,0 +1,83 @@
+"""
+Gunicorn settings for running the service with several worker processes:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The master imports the application's modules and migrates the schema once, before forking;
+workers inherit the imported modules, so a new worker only runs create_app(). The app itself
+is not preloaded: its background threads and MQTT connection would not survive the fork.
+
+Every worker has its own database pool (DB_POOL_SIZE + DB_MAX_OVERFLOW connections), control
+dispatcher and MQTT client, but the control sweep, retention and MQTT ingest only run in
+worker slot 0. Stream clients get the events of every worker over the broker (change_feed),
+but each holds one of its worker's threads: STREAM_MAX_SUBSCRIBERS, half of the threads by
+default, are served per worker. /metrics describes the worker that answered the scrape.
+"""
+import multiprocessing
+import os
+import socket
+import time
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5002')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads, because event streams hold their request open
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 30
+graceful_timeout = 15
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') # e.g. '-' for stdout, unset for none
+migrate_on_start = os.environ.get('MIGRATE_ON_START', 'true').lower() == 'true'
+
+
+def on_starting(server):
+    """Imports the app's modules into the master and brings the schema up to date."""
+    from flask import Flask
+    from config import Config
+    from database import db, init_db
+    from migrations import prepare_database
+    import app
+
+    if not migrate_on_start:
+        return
+    migrator = Flask(__name__)
+    migrator.config.from_object(Config)
+    init_db(migrator)
+    with migrator.app_context():
+        prepare_database()
+        # No connection may be inherited by the workers
+        db.engine.dispose()
+
+
+def pre_fork(server, worker):
+    # Lowest slot not held by a running worker, so a replacement worker takes over its predecessor's role
+    used = {getattr(running, 'slot', None) for running in server.WORKERS.values()}
+    worker.slot = min(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+    server.log.info("Worker %s has slot %s", worker.pid, worker.slot)
+    if worker.slot != 0:
+        os.environ['FLASK_BACKGROUND_JOBS'] = 'false'
+    # Stable across worker restarts, so an MQTT ingest subscriber in a share group keeps its session
+    if not os.environ.get('MQTT_INGEST_INSTANCE'):
+        os.environ.setdefault('FLASK_MQTT_INGEST_INSTANCE', f"{socket.gethostname()}-{worker.slot}")
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s ready in %.3fs", worker.pid, time.perf_counter() - worker.forked_at)
+
+
+def worker_exit(server, worker):
+    """Hands buffered readings and pending commands off before the worker goes away."""
+    from dispatcher import control_dispatcher
+    from mqtt_bridge import mqtt_bridge
+    from mqtt_ingest import ingest_subscriber
+    from write_behind import write_behind
+
+    write_behind.stop()
+    ingest_subscriber.stop()
+    control_dispatcher.stop()
+    mqtt_bridge.stop()
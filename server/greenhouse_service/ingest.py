@@ -0,0 +1,79 @@
+"""
+Shared write path for sensor readings.
+
+Used by the HTTP endpoints in Readings_API and by the MQTT ingestion subscriber, so every
+source stores, rolls up and feeds the control path the same way.
+"""
+from models import Readings, READING_FIELDS
+from database import db, bulk_insert
+from pagination import parse_iso_timestamp
+from rollups import record_readings
+from dispatcher import control_dispatcher
+from latest_state import latest_state
+from change_feed import change_feed
+from stream_hub import stream_hub
+from metrics import ingest_rows
+import datetime
+
+
+def parse_reading(data, greenhouse_id):
+    """
+    Validates one reading payload and returns it as a row dict for the readings table.
+    
+    Raises:
+        ValueError: If a sensor value is not numeric or the timestamp is not ISO 8601.
+        Timestamps with a UTC offset are stored as local time, see pagination.parse_iso_timestamp.
+    """
+    row = {'greenhouse_id': greenhouse_id}
+    for field in READING_FIELDS:
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"'{field}' must be a number")
+        row[field] = float(value) if value is not None else None
+        
+    timestamp = data.get('timestamp')
+    if timestamp is None:
+        row['timestamp'] = datetime.datetime.now()
+    else:
+        try:
+            row['timestamp'] = parse_iso_timestamp(timestamp)
+        except (TypeError, ValueError):
+            raise ValueError("'timestamp' must be an ISO 8601 string")
+        
+    return row
+
+
+def newest_per_greenhouse(rows):
+    newest = {}
+    for row in rows:
+        current = newest.get(row['greenhouse_id'])
+        if current is None or row['timestamp'] >= current['timestamp']:
+            newest[row['greenhouse_id']] = row
+    return newest
+
+
+def store_readings(rows, targets = None, source = 'http'):
+    """
+    Bulk-inserts validated reading rows (with COPY on Postgres, see database.bulk_insert) and
+    their rollups in one transaction, publishes them to stream clients, then hands the newest
+    reading of each greenhouse to the control dispatcher.
+    
+    targets optionally maps greenhouse_id to already loaded Targets; source labels the
+    ingest_rows metric.
+    """
+    bulk_insert(Readings, rows)
+    record_readings(rows)
+    db.session.commit()
+    ingest_rows.inc(len(rows), (source,))
+    
+    events = [(row['greenhouse_id'], {key: row.get(column) for key, column in Readings.SERIALIZE_FIELDS.items()}) for row in rows]
+    for greenhouse_id, data in events:
+        stream_hub.publish_data('readings', greenhouse_id, data)
+    
+    newest = newest_per_greenhouse(rows)
+    for greenhouse_id in newest:
+        latest_state.invalidate(greenhouse_id, 'readings')
+    change_feed.changed('readings', newest, events)
+    control_dispatcher.submit_many([
+        (greenhouse_id, row, (targets or {}).get(greenhouse_id)) for greenhouse_id, row in newest.items()
+    ])
@@ -0,0 +1,119 @@
+from collections import namedtuple
+from flask import current_app, request
+from change_feed import change_feed
+import hashlib
+import threading
+import time
+
+
+# Pre-encoded /latest response body with its validators, plus the serialized row it was built from
+Snapshot = namedtuple('Snapshot', ['body', 'etag', 'last_modified', 'timestamp', 'loaded_at', 'data'])
+
+
+class LatestState:
+    """
+    Per-greenhouse snapshot of the newest reading and actuator status, kept up to date on write.
+    
+    /latest is answered from the snapshot, with an ETag and Last-Modified, so an unchanged poll
+    costs neither a database query nor a JSON body, however rarely it comes. Writes made by
+    other worker processes arrive as change_feed notices and drop the snapshots they touch.
+    While the feed is not live (broker unreachable, or a snapshot loaded before it came up)
+    a snapshot is reloaded once it is older than LATEST_SNAPSHOT_TTL seconds; the ETag only
+    changes if the data did.
+    """
+    
+    def __init__(self, ttl = 1.0):
+        self.ttl = ttl
+        self._snapshots = {}
+        self._versions = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        
+        
+    def init_app(self, app):
+        self.ttl = app.config['LATEST_SNAPSHOT_TTL']
+        change_feed.listen(self.on_change)
+        
+        
+    def on_change(self, kind, greenhouse_ids, events):
+        """change_feed listener: drops the snapshots of greenhouses written by other processes."""
+        if greenhouse_ids is None:
+            self.clear()
+            return
+        for greenhouse_id in greenhouse_ids:
+            self.invalidate(greenhouse_id, kind)
+            
+            
+    def _fresh(self, snapshot):
+        live_since = change_feed.live_since()
+        if live_since is not None and snapshot.loaded_at >= live_since:
+            return True
+        return time.monotonic() - snapshot.loaded_at <= self.ttl
+    
+    
+    def _snapshot(self, row):
+        data = row.serialize()
+        body = current_app.json.dumps(data).encode()
+        etag = hashlib.sha1(body).hexdigest()
+        return Snapshot(body, etag, row.timestamp, row.timestamp, time.monotonic(), data)
+    
+    
+    def update(self, kind, row):
+        """Records row as the newest of its kind unless a newer one is already known. Call after flush; returns row's Snapshot."""
+        snapshot = self._snapshot(row)
+        key = (kind, row.greenhouse_id)
+        with self._lock:
+            current = self._snapshots.get(key)
+            if current is None or snapshot.timestamp >= current.timestamp:
+                self._snapshots[key] = snapshot
+        return snapshot
+                
+                
+    def get(self, kind, greenhouse_id, loader):
+        """Returns the Snapshot for (kind, greenhouse_id), calling loader() for the newest row when stale."""
+        key = (kind, greenhouse_id)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            version = (self._generation, self._versions.get(greenhouse_id, 0))
+        if snapshot is not None and self._fresh(snapshot):
+            return snapshot
+        
+        # Taken before the query, so the snapshot is never newer than the data it holds
+        loaded_at = time.monotonic()
+        row = loader()
+        if row is None:
+            self.invalidate(greenhouse_id, kind)
+            return None
+        
+        snapshot = self._snapshot(row)._replace(loaded_at = loaded_at)
+        with self._lock:
+            # Not kept if a change arrived, or a newer row was written, while it was being loaded
+            current = self._snapshots.get(key)
+            if version == (self._generation, self._versions.get(greenhouse_id, 0)) and (current is None or snapshot.timestamp >= current.timestamp):
+                self._snapshots[key] = snapshot
+        return snapshot
+    
+    
+    def invalidate(self, greenhouse_id, kind = None):
+        with self._lock:
+            self._versions[greenhouse_id] = self._versions.get(greenhouse_id, 0) + 1
+            for key in [key for key in self._snapshots if key[1] == greenhouse_id and kind in (None, key[0])]:
+                del self._snapshots[key]
+                
+                
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+            self._snapshots.clear()
+                
+                
+    def response(self, snapshot):
+        """Builds the /latest response, a 304 when the client's validators still match."""
+        response = current_app.response_class(snapshot.body, mimetype = 'application/json')
+        response.set_etag(snapshot.etag)
+        response.last_modified = snapshot.last_modified
+        return response.make_conditional(request)
+
+
+latest_state = LatestState()
@@ -0,0 +1,330 @@
+"""
+Prometheus metrics for the service, served at /metrics in the text exposition format.
+
+Counters and histograms are sharded per thread: a thread only ever writes its own shard,
+so recording a value takes no lock, and /metrics sums the shards when it is scraped. The
+shard of a thread that has ended is folded into a base total, so threads that come and go
+(one per request under the development server) do not pile up shards.
+Queue depths and the counters the dispatcher, the MQTT ingest subscriber and the stream hub
+already keep are read through callbacks at scrape time.
+
+Recorded automatically once init_metrics(app) has run:
+
+    greenhouse_http_request_duration_seconds{method,endpoint}     histogram
+    greenhouse_http_requests_total{method,endpoint,status}        counter
+    greenhouse_db_queries_per_request{endpoint}                   histogram
+    greenhouse_db_query_duration_seconds                          histogram, every statement
+    greenhouse_db_request_query_seconds{endpoint}                 histogram, total per request
+
+and by the code paths themselves: greenhouse_mqtt_publish_seconds,
+greenhouse_mqtt_publish_failures_total and greenhouse_ingest_rows_total{source} (rate() gives
+rows per second).
+"""
+from flask import request, g
+from sqlalchemy import event
+import bisect
+import itertools
+import threading
+import time
+import weakref
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values, extra = ''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Owner:
+    """Kept in one thread's local storage only; it is collected when the thread ends."""
+    __slots__ = ('__weakref__',)
+
+
+class _Sharded:
+    """Per-thread storage: each thread gets its own dict, registered once under a lock and retired when the thread ends."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._base = {}
+        self._keys = itertools.count()
+        # Reentrant: a finalizer may run on a thread that already holds it
+        self._lock = threading.RLock()
+
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            owner = self._local.owner = _Owner()
+            with self._lock:
+                key = next(self._keys)
+                self._shards[key] = shard
+            weakref.finalize(owner, self._retire, key)
+            self._local.shard = shard
+            return shard
+
+
+    def _retire(self, key):
+        with self._lock:
+            for labels, value in self._shards.pop(key).items():
+                self._base[labels] = self._merge(self._base.get(labels), value)
+
+
+    def _snapshots(self):
+        with self._lock:
+            shards = [self._base] + list(self._shards.values())
+        # dict() copies in one step under the GIL, so a concurrent write cannot break the iteration
+        return [dict(shard) for shard in shards]
+
+
+class Counter(_Sharded):
+
+    def __init__(self, name, documentation, labelnames = ()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+
+    def inc(self, amount = 1, labels = ()):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+    def _merge(self, total, value):
+        return (total or 0) + value
+
+
+    def render(self):
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in sorted(totals.items())]
+        return lines
+
+
+class Histogram(_Sharded):
+
+    def __init__(self, name, documentation, labelnames = (), buckets = LATENCY_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+
+    def observe(self, value, labels = ()):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # One slot per bucket plus +Inf, then sum
+            state = shard[labels] = [0] * (len(self.buckets) + 2)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+
+    def _merge(self, total, state):
+        # A new list: snapshots taken before may still be reading the old one
+        return list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+
+    def render(self):
+        totals = {}
+        for shard in self._snapshots():
+            for labels, state in shard.items():
+                total = totals.setdefault(labels, [0] * (len(self.buckets) + 2))
+                for index, value in enumerate(list(state)):
+                    total[index] += value
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, state in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                le = 'le="{}"'.format(bound if bound == '+Inf' else _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Callback:
+    """A metric read at scrape time: function returns a number or {label values tuple: number}."""
+
+    def __init__(self, name, documentation, kind, function, labelnames = ()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.function = function
+        self.labelnames = tuple(labelnames)
+
+
+    def render(self):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in sorted(values.items())]
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+    def counter(self, name, documentation, labelnames = ()):
+        return self.register(Counter(name, documentation, labelnames))
+
+
+    def histogram(self, name, documentation, labelnames = (), buckets = LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+
+    def callback(self, name, documentation, kind, function, labelnames = ()):
+        return self.register(Callback(name, documentation, kind, function, labelnames))
+
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines += metric.render()
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram('greenhouse_http_request_duration_seconds', "HTTP request latency.", ('method', 'endpoint'))
+requests_total = registry.counter('greenhouse_http_requests_total', "HTTP requests by status code.", ('method', 'endpoint', 'status'))
+request_queries = registry.histogram('greenhouse_db_queries_per_request', "Database statements executed per HTTP request.", ('endpoint',), COUNT_BUCKETS)
+request_query_seconds = registry.histogram('greenhouse_db_request_query_seconds', "Time spent in the database per HTTP request.", ('endpoint',))
+query_duration = registry.histogram('greenhouse_db_query_duration_seconds', "Duration of single database statements.", (), QUERY_BUCKETS)
+mqtt_publish_seconds = registry.histogram('greenhouse_mqtt_publish_seconds', "Time to hand a command to the MQTT client.", (), QUERY_BUCKETS)
+mqtt_publish_failures = registry.counter('greenhouse_mqtt_publish_failures_total', "Command publishes the MQTT client refused.")
+ingest_rows = registry.counter('greenhouse_ingest_rows_total', "Sensor readings stored.", ('source',))
+
+# Per-thread statement count and time of the request being served
+_request_queries = threading.local()
+_components_registered = False
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    query_duration.observe(elapsed)
+    totals = getattr(_request_queries, 'totals', None)
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+def _before_request():
+    g._metrics_started = time.perf_counter()
+    _request_queries.totals = [0, 0.0]
+
+
+def _after_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return response
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_duration.observe(time.perf_counter() - started, (request.method, endpoint))
+    requests_total.inc(1, (request.method, endpoint, response.status_code))
+
+    totals, _request_queries.totals = _request_queries.totals, None
+    request_queries.observe(totals[0], (endpoint,))
+    request_query_seconds.observe(totals[1], (endpoint,))
+    return response
+
+
+def _component_metrics(app):
+    global _components_registered
+    if _components_registered:
+        return
+    _components_registered = True
+    from database import db
+    from dispatcher import control_dispatcher
+    from command_state import command_state
+    from mqtt_ingest import ingest_subscriber
+    from stream_hub import stream_hub
+    from change_feed import change_feed
+    from write_behind import write_behind
+
+    def outcomes(stats, keys):
+        return {(key,): stats[key] for key in keys}
+
+    registry.callback('greenhouse_control_queue_depth', "Greenhouses waiting for a control decision.", 'gauge',
+                      lambda: control_dispatcher.stats()['queue_depth'])
+    registry.callback('greenhouse_control_events_total', "Control dispatcher submissions by outcome.", 'counter',
+                      lambda: outcomes(control_dispatcher.stats(), ('submitted', 'coalesced', 'dropped', 'rejected', 'processed', 'failed', 'unknown_greenhouse')), ('outcome',))
+    registry.callback('greenhouse_control_commands_total', "Control decisions by what happened to the command.", 'counter',
+                      lambda: outcomes(command_state.stats(), ('published', 'heartbeats', 'suppressed', 'dwell_held')), ('outcome',))
+    registry.callback('greenhouse_mqtt_ingest_buffered', "Readings buffered by the MQTT ingest subscriber.", 'gauge',
+                      lambda: ingest_subscriber.stats()['buffered'])
+    registry.callback('greenhouse_mqtt_ingest_messages_total', "MQTT ingest messages and rows by outcome.", 'counter',
+                      lambda: outcomes(ingest_subscriber.stats(), ('messages', 'stored', 'invalid', 'unknown_greenhouse', 'failed_flushes')), ('outcome',))
+    registry.callback('greenhouse_write_behind_buffered', "Readings waiting in the write-behind buffer.", 'gauge',
+                      lambda: write_behind.stats()['buffered'])
+    registry.callback('greenhouse_write_behind_events_total', "Write-behind readings and group commits by outcome.", 'counter',
+                      lambda: outcomes(write_behind.stats(), ('enqueued', 'stored', 'rejected', 'unknown_greenhouse', 'flushes', 'failed_flushes')), ('outcome',))
+    registry.callback('greenhouse_change_notices_total', "Cross-process change notices by outcome.", 'counter',
+                      lambda: outcomes(change_feed.stats(), ('sent', 'failed', 'received', 'gaps')), ('outcome',))
+    registry.callback('greenhouse_stream_subscribers', "Connected stream clients.", 'gauge', lambda: stream_hub.stats()['subscribers'])
+    registry.callback('greenhouse_stream_queued', "Events waiting in stream client queues.", 'gauge', lambda: stream_hub.stats()['queued'])
+    registry.callback('greenhouse_stream_events_total', "Stream events by outcome.", 'counter',
+                      lambda: outcomes(stream_hub.stats(), ('published', 'delivered', 'dropped')), ('outcome',))
+
+    def pool_checked_out():
+        with app.app_context():
+            pool = db.engine.pool
+            return pool.checkedout() if hasattr(pool, 'checkedout') else 0
+
+    registry.callback('greenhouse_db_pool_checked_out', "Database connections in use.", 'gauge', pool_checked_out)
+
+
+def init_metrics(app):
+    """Installs the request and SQLAlchemy hooks and the /metrics endpoint, unless METRICS_ENABLED is off."""
+    if not app.config['METRICS_ENABLED']:
+        return
+    from database import db
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    _component_metrics(app)
+
+    @app.route('/metrics', methods = ['GET'])
+    def metrics():
+        return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
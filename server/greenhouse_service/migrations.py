@@ -0,0 +1,115 @@
+"""
+Versioned schema migrations for existing databases.
+
+db.create_all() only creates missing tables, so changes to existing tables (new indexes,
+columns) are applied here. Each migration runs once, in its own transaction, and is
+recorded in the schema_version table. Run with:
+
+    python migrations.py
+"""
+from database import db, init_db
+from models import ACTUATOR_FIELDS
+from partitions import partition_history_tables, ensure_partitions
+import datetime
+import sys 
+
+
+def _create_history_indexes(connection):
+    # Postgres can build the index without blocking writes, but not inside a transaction
+    concurrently = "CONCURRENTLY " if connection.dialect.name == 'postgresql' else ""
+    for table in ('readings', 'actuator_status'):
+        connection.exec_driver_sql(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS ix_{table}_greenhouse_id_timestamp "
+            f"ON {table} (greenhouse_id, timestamp DESC, id DESC)"
+        )
+
+
+def _has_column(connection, table, column):
+    return any(existing['name'] == column for existing in db.inspect(connection).get_columns(table))
+
+
+def _add_control_rules(connection):
+    if not _has_column(connection, 'greenhouse', 'control_rules'):
+        connection.exec_driver_sql("ALTER TABLE greenhouse ADD COLUMN control_rules JSON")
+
+
+def _pack_actuator_state(connection):
+    # Backfill the bitmask from the "ON"/"OFF" columns, then drop them
+    if not _has_column(connection, 'actuator_status', 'vents_on'):
+        return
+    if not _has_column(connection, 'actuator_status', 'state'):
+        connection.exec_driver_sql("ALTER TABLE actuator_status ADD COLUMN state SMALLINT NOT NULL DEFAULT 0")
+    
+    bits = " + ".join(f"(CASE WHEN {field} = 'ON' THEN {1 << index} ELSE 0 END)" for index, field in enumerate(ACTUATOR_FIELDS))
+    connection.exec_driver_sql(f"UPDATE actuator_status SET state = {bits}")
+    for field in ACTUATOR_FIELDS:
+        connection.exec_driver_sql(f"ALTER TABLE actuator_status DROP COLUMN {field}")
+
+
+# (version, description, function(connection), needs autocommit)
+MIGRATIONS = [
+    (1, "Composite (greenhouse_id, timestamp) indexes on readings and actuator_status", _create_history_indexes, True),
+    (2, "Per-greenhouse control rules", _add_control_rules, False),
+    (3, "Actuator status stored as a bitmask", _pack_actuator_state, False),
+    (4, "Monthly time-range partitions for readings and actuator_status (Postgres only)", partition_history_tables, False),
+]
+
+
+def _ensure_version_table(connection):
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    )
+
+
+def current_version():
+    with db.engine.begin() as connection:
+        _ensure_version_table(connection)
+        return connection.exec_driver_sql("SELECT MAX(version) FROM schema_version").scalar() or 0
+
+
+def upgrade():
+    """Applies all pending migrations in order. Must be called inside an application context."""
+    version = current_version()
+    for migration_version, description, migrate, autocommit in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        
+        print(f"Applying migration {migration_version}: {description}")
+        if autocommit:
+            with db.engine.connect().execution_options(isolation_level = 'AUTOCOMMIT') as connection:
+                migrate(connection)
+        
+        with db.engine.begin() as connection:
+            if not autocommit:
+                migrate(connection)
+            connection.execute(
+                db.text("INSERT INTO schema_version (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+                {"version": migration_version, "description": description, "applied_at": datetime.datetime.now()}
+            )
+            
+            
+def prepare_database():
+    """Creates missing tables, applies pending migrations and adds the coming months' partitions. Must be called inside an application context."""
+    db.create_all()
+    upgrade()
+    with db.engine.begin() as connection:
+        ensure_partitions(connection)
+        
+        
+if __name__ == '__main__':
+    from flask import Flask 
+    from config import Config
+    import models
+    
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+    
+    try:
+        with app.app_context():
+            prepare_database()
+            print(f"Database schema is at version {current_version()}")
+    except Exception as e:
+        print(f"Error migrating database: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -1,6 +1,41 @@
 from database import db 
+from sqlalchemy.ext.hybrid import hybrid_property
 import datetime 
 
+# Sensor value columns shared by Readings and ReadingRollup
+READING_FIELDS = ('temp_celsius', 'humidity_pct', 'soil_moisture_pct', 'light_lux', 'co_two', 'wind_speed')
+
+# Actuator columns, in the order used by command messages
+ACTUATOR_FIELDS = ('vents_on', 'fan_on', 'lights_on', 'curtains_on', 'irrigation_pump_on', 'humidifier_pump_on', 'heater_on')
+
+
+def encode_state(states):
+    """Packs a {field: "ON"/"OFF"} mapping into an ActuatorStatus.state bitmask; bit i is ACTUATOR_FIELDS[i]."""
+    return sum(1 << index for index, field in enumerate(ACTUATOR_FIELDS) if states.get(field) == "ON")
+
+
+def decode_state(state):
+    return {field: "ON" if state & (1 << index) else "OFF" for index, field in enumerate(ACTUATOR_FIELDS)}
+
+
+def _actuator_bit(field):
+    """Exposes one bit of ActuatorStatus.state as "ON"/"OFF", on instances and in queries."""
+    bit = 1 << ACTUATOR_FIELDS.index(field)
+    
+    def getter(self):
+        return "ON" if (self.state or 0) & bit else "OFF"
+    
+    def setter(self, value):
+        if value not in ("ON", "OFF"):
+            raise ValueError(f"'{field}' must be \"ON\" or \"OFF\"")
+        self.state = (self.state or 0) | bit if value == "ON" else (self.state or 0) & ~bit
+        
+    def expression(cls):
+        return db.case((cls.state.op('&')(bit) != 0, "ON"), else_ = "OFF")
+    
+    return hybrid_property(getter, setter, expr = expression)
+
+
 class Greenhouse(db.Model):
     __tablename__ = 'greenhouse'
     
@@ -13,12 +48,15 @@ class Greenhouse(db.Model):
     target_light = db.Column(db.Float, default = 500.0)
     target_co_two = db.Column(db.Float, default = 400.0)
     target_wind_speed = db.Column(db.Float, default = 1.0)
+    control_rules = db.Column(db.JSON, nullable = True) # None uses rules.DEFAULT_RULES
     
-    readings = db.relationship('Readings', backref = 'greenhouse', lazy = True,  cascade="all, delete-orphan")
-    actuator_status = db.relationship('ActuatorStatus', backref = 'greenhouse', lazy = True,  cascade="all, delete-orphan")
+    # Query-style relationships: history is never loaded implicitly, callers page through it
+    readings = db.relationship('Readings', backref = 'greenhouse', lazy = 'dynamic',  cascade="all, delete-orphan")
+    actuator_status = db.relationship('ActuatorStatus', backref = 'greenhouse', lazy = 'dynamic',  cascade="all, delete-orphan")
+    rollups = db.relationship('ReadingRollup', lazy = 'dynamic',  cascade="all, delete-orphan")
     
     
-    def __init__(self, name, location, target_temp, target_humidity, target_soil_moisture_pct, target_light, target_co_two, target_wind_speed):
+    def __init__(self, name, location, target_temp, target_humidity, target_soil_moisture_pct, target_light, target_co_two, target_wind_speed, control_rules = None):
         self.name = name 
         self.location = location 
         self.target_temp = target_temp
@@ -27,9 +65,11 @@ class Greenhouse(db.Model):
         self.target_light = target_light
         self.target_co_two = target_co_two
         self.target_wind_speed = target_wind_speed
+        self.control_rules = control_rules
         
         
-    def serialize(self):
+    def serialize(self, latest_reading = None, latest_status = None):
+        """Summary representation: targets plus the newest reading and actuator status, if any."""
         return {
             'id': self.id,
             'name': self.name,
@@ -40,8 +80,9 @@ class Greenhouse(db.Model):
             'target_light': self.target_light,
             'target_CO2': self.target_co_two, 
             'target_wind_speed': self.target_wind_speed,
-            'Readings': [reading.serialize() for reading in self.readings],
-            'Actuator Statuses': [status.serialize() for status in self.actuator_status]
+            'control_rules': self.control_rules,
+            'latest_reading': latest_reading.serialize() if latest_reading else None,
+            'latest_actuator_status': latest_status.serialize() if latest_status else None
         }
         
         
@@ -54,6 +95,19 @@ class Greenhouse(db.Model):
 class Readings(db.Model):
     __tablename__ = 'readings'
     
+    # Response key -> column name, in the order used by serialize()
+    SERIALIZE_FIELDS = {
+        'id': 'id',
+        'greenhouse id': 'greenhouse_id',
+        'timestamp': 'timestamp',
+        'temp_celsius': 'temp_celsius',
+        'humidity_pct': 'humidity_pct',
+        'soil_moisture_pct': 'soil_moisture_pct',
+        'light_lux': 'light_lux',
+        'CO2': 'co_two',
+        'wind speed': 'wind_speed'
+    }
+    
     id = db.Column(db.Integer, primary_key = True)
     greenhouse_id = db.Column(db.Integer, db.ForeignKey('greenhouse.id'), nullable = False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.now, nullable=False)
@@ -64,6 +118,11 @@ class Readings(db.Model):
     co_two = db.Column(db.Float, nullable = True)
     wind_speed = db.Column(db.Float, nullable = True)
     
+    # Serves /latest and the keyset-paginated history, both ordered by (timestamp, id) descending
+    __table_args__ = (
+        db.Index('ix_readings_greenhouse_id_timestamp', greenhouse_id, timestamp.desc(), id.desc()),
+    )
+    
     def __init__(self, greenhouse_id, temp_celsius, humidity_pct, soil_moisture_pct, light_lux, co_two, wind_speed):
         self.greenhouse_id = greenhouse_id
         self.temp_celsius = temp_celsius
@@ -93,21 +152,47 @@ class Readings(db.Model):
     
     
 class ActuatorStatus(db.Model):
+    """
+    One actuator state change. The seven actuators are packed into the 'state' bitmask (see
+    encode_state); vents_on, fan_on, ... read and write it as "ON"/"OFF" and can be selected
+    in queries like columns.
+    """
     __tablename__ = 'actuator_status'
     
+    # Response key -> column or actuator name, in the order used by serialize()
+    SERIALIZE_FIELDS = {
+        'id': 'id',
+        'greenhouse_id': 'greenhouse_id',
+        'timestamp': 'timestamp',
+        'vents_on': 'vents_on',
+        'fan_on': 'fan_on',
+        'lights_on': 'lights_on',
+        'curtains_on': 'curtains_on',
+        'irrigation_pump_on': 'irrigation_pump_on',
+        'humidifier_pump_on': 'humidifier_pump_on',
+        'heater_on': 'heater_on'
+    }
+    
     id = db.Column(db.Integer, primary_key = True)
     greenhouse_id = db.Column(db.Integer, db.ForeignKey('greenhouse.id'), nullable = False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.now, nullable=False)
-    vents_on = db.Column(db.String, nullable = False, default = "OFF")
-    fan_on = db.Column(db.String, nullable = False, default = "OFF")
-    lights_on = db.Column(db.String, nullable = False, default = "OFF")
-    curtains_on = db.Column(db.String, nullable = False, default = "OFF")
-    irrigation_pump_on = db.Column(db.String, nullable = False, default = "OFF")
-    humidifier_pump_on = db.Column(db.String, nullable = False, default = "OFF")
-    heater_on = db.Column(db.String, nullable = False, default = "OFF")
+    state = db.Column(db.SmallInteger, nullable = False, default = 0)
+    
+    vents_on = _actuator_bit('vents_on')
+    fan_on = _actuator_bit('fan_on')
+    lights_on = _actuator_bit('lights_on')
+    curtains_on = _actuator_bit('curtains_on')
+    irrigation_pump_on = _actuator_bit('irrigation_pump_on')
+    humidifier_pump_on = _actuator_bit('humidifier_pump_on')
+    heater_on = _actuator_bit('heater_on')
+    
+    __table_args__ = (
+        db.Index('ix_actuator_status_greenhouse_id_timestamp', greenhouse_id, timestamp.desc(), id.desc()),
+    )
     
     def __init__(self, greenhouse_id, vents, fan, light, curtains, irrigation_pump, humidifier, heater):
         self.greenhouse_id = greenhouse_id
+        self.state = 0
         self.vents_on = vents 
         self.fan_on = fan 
         self.lights_on = light 
@@ -134,4 +219,23 @@ class ActuatorStatus(db.Model):
     def __repr__(self):
         return f'<ActuatorStatus {self.id}>'
     
-    
\ No newline at end of file
+    
+class ReadingRollup(db.Model):
+    """
+    Per-bucket aggregate of one sensor value, maintained incrementally by rollups.record_readings.
+    
+    One row per (greenhouse, bucket size, bucket start, metric); avg is total / count.
+    """
+    __tablename__ = 'reading_rollups'
+    
+    greenhouse_id = db.Column(db.Integer, db.ForeignKey('greenhouse.id'), primary_key = True)
+    bucket = db.Column(db.String(3), primary_key = True)
+    bucket_start = db.Column(db.DateTime, primary_key = True)
+    metric = db.Column(db.String(32), primary_key = True)
+    count = db.Column(db.Integer, nullable = False)
+    total = db.Column(db.Float, nullable = False)
+    minimum = db.Column(db.Float, nullable = False)
+    maximum = db.Column(db.Float, nullable = False)
+    
+    def __repr__(self):
+        return f'<ReadingRollup {self.greenhouse_id} {self.bucket} {self.bucket_start} {self.metric}>'
@@ -0,0 +1,134 @@
+"""
+The service's MQTT connection for publishing actuator commands.
+
+Every process gets its own client, created the first time it is needed in that process, with
+the client id MQTT_CLIENT_ID_PREFIX-<host>-<pid>-<random>. Brokers disconnect a client when
+another one connects with the same id, so a fixed id made gunicorn workers keep knocking
+each other off; a process forked after the client was created notices the new pid and
+builds its own.
+
+Connecting happens on paho's network thread (connect_async): startup never waits for the
+broker, and while it is down paho retries with a delay that doubles from
+MQTT_RECONNECT_MIN_DELAY up to MQTT_RECONNECT_MAX_DELAY seconds. Commands are published at
+QoS 0, which paho does not queue while disconnected (publish returns MQTT_ERR_NO_CONN); the
+next reading of the greenhouse publishes its state again. QoS 1 and 2 messages would be held
+in memory until the broker is back, so callers using them (change_feed) skip publishing while
+connected is False. Topics registered with subscribe() are subscribed to again after every
+reconnect.
+"""
+import paho.mqtt.client as mqtt
+import os
+import socket
+import threading
+import time
+import uuid
+
+
+class MqttBridge:
+
+    def __init__(self):
+        self.host = 'localhost'
+        self.port = 1883
+        self.keepalive = 60
+        self.client_id_prefix = 'FlaskAPI'
+        self.reconnect_delays = (1, 60)
+        self.client = None
+        self.client_id = None
+        self.connected = False
+        self.connected_at = None
+        self._pid = None
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._counters = {'connects': 0, 'disconnects': 0, 'failed_connects': 0}
+
+
+    def init_app(self, app):
+        """Reads the broker settings and starts connecting in the background."""
+        config = app.config
+        self.host = config['MQTT_BROKER_HOST']
+        self.port = config['MQTT_BROKER_PORT']
+        self.keepalive = config['MQTT_KEEPALIVE']
+        self.client_id_prefix = config['MQTT_CLIENT_ID_PREFIX']
+        self.reconnect_delays = (config['MQTT_RECONNECT_MIN_DELAY'], config['MQTT_RECONNECT_MAX_DELAY'])
+        self.get_client()
+
+
+    def get_client(self):
+        """Returns this process's client, creating it and starting its network thread on first use."""
+        if self.client is None or self._pid != os.getpid():
+            with self._lock:
+                if self.client is None or self._pid != os.getpid():
+                    self._start_client()
+        return self.client
+
+
+    def _start_client(self):
+        # A client inherited through fork has no network thread in this process; it is abandoned, not stopped
+        self.client_id = f"{self.client_id_prefix}-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.connected = False
+        client = mqtt.Client(client_id = self.client_id)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        for topic, callback in self._subscriptions.items():
+            client.message_callback_add(topic, callback)
+        client.reconnect_delay_set(*self.reconnect_delays)
+        client.connect_async(self.host, self.port, self.keepalive)
+        client.loop_start()
+        self.client = client
+        self._pid = os.getpid()
+
+
+    def _on_connect(self, client, userdata, flags, rc):
+        """Callback for when the client receives a CONNACK response from the broker."""
+        if rc == 0:
+            print(f"Connected to MQTT Broker as {self.client_id}!")
+            for topic in self._subscriptions:
+                client.subscribe(topic)
+            self.connected_at = time.monotonic()
+            self.connected = True
+            self._counters['connects'] += 1
+        else:
+            print(f"Failed to connect, return code {rc}\n")
+            self._counters['failed_connects'] += 1
+
+
+    def _on_disconnect(self, client, userdata, rc):
+        if self.connected and rc != mqtt.MQTT_ERR_SUCCESS:
+            print(f"Disconnected from MQTT Broker, return code {rc}; reconnecting")
+            self._counters['disconnects'] += 1
+        self.connected = False
+
+
+    def subscribe(self, topic, callback):
+        """Calls callback(client, userdata, message) for messages on topic; the subscription is renewed on every reconnect."""
+        self._subscriptions[topic] = callback
+        if self.client is not None and self._pid == os.getpid():
+            self.client.message_callback_add(topic, callback)
+            if self.connected:
+                self.client.subscribe(topic)
+
+
+    def publish(self, topic, payload, qos = 0, retain = False):
+        return self.get_client().publish(topic, payload, qos = qos, retain = retain)
+
+
+    def stop(self):
+        with self._lock:
+            if self.client is not None and self._pid == os.getpid():
+                self.connected = False
+                self.client.disconnect()
+                self.client.loop_stop()
+            self.client = None
+            self.connected = False
+
+
+    def stats(self):
+        return dict(
+            self._counters,
+            client_id = self.client_id,
+            broker = f"{self.host}:{self.port}",
+            connected = self.connected
+        )
+
+
+mqtt_bridge = MqttBridge()
@@ -0,0 +1,193 @@
+"""
+Native MQTT ingestion of sensor readings.
+
+Sensors publish JSON readings (one object or an array) to greenhouse/<id>/sensors. The
+subscriber decodes and validates them, buffers them, and stores them through
+ingest.store_readings once MQTT_INGEST_BATCH_SIZE readings are buffered or
+MQTT_INGEST_FLUSH_INTERVAL seconds have passed.
+
+Messages are received with QoS MQTT_INGEST_QOS on a persistent session and acknowledged
+manually, only after the batch holding them has been committed. A crash before the commit
+leaves them unacknowledged, so the broker redelivers them on reconnect (at-least-once; a
+crash between commit and acknowledgement can store a reading twice). Note that the broker
+caps unacknowledged messages per client (mosquitto: max_inflight_messages, default 20),
+which must be raised to at least MQTT_INGEST_BATCH_SIZE for full batches; ../mosquitto.conf
+does.
+
+With MQTT_INGEST_SHARE_GROUP set, several processes subscribe through a shared
+subscription and the broker splits the sensor traffic between them. Each then needs a
+client id of its own, or they would disconnect each other in a loop:
+MQTT_INGEST_CLIENT_ID-<MQTT_INGEST_INSTANCE>, where the instance defaults to <host>-<pid>.
+Give every process a stable MQTT_INGEST_INSTANCE (gunicorn.conf.py uses the host and worker
+slot) so its persistent session, and the readings waiting in it, survive a restart. Run
+standalone with:
+
+    python mqtt_ingest.py
+"""
+from database import db
+from ingest import parse_reading, store_readings
+from target_cache import target_cache
+import paho.mqtt.client as mqtt 
+import json
+import os
+import socket
+import threading
+
+
+def client_id(config):
+    """MQTT_INGEST_CLIENT_ID, suffixed per process when a share group splits the traffic."""
+    if not config['MQTT_INGEST_SHARE_GROUP']:
+        return config['MQTT_INGEST_CLIENT_ID']
+    instance = config['MQTT_INGEST_INSTANCE'] or f"{socket.gethostname()}-{os.getpid()}"
+    return f"{config['MQTT_INGEST_CLIENT_ID']}-{instance}"
+
+
+class IngestSubscriber:
+    
+    def __init__(self):
+        self.app = None
+        self.client = None
+        self._buffer = []
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._counters = {'messages': 0, 'stored': 0, 'invalid': 0, 'unknown_greenhouse': 0, 'failed_flushes': 0}
+        
+        
+    def init_app(self, app):
+        self.app = app
+        if app.config['MQTT_INGEST_ENABLED']:
+            self.start()
+            
+            
+    def start(self):
+        if self._running:
+            return
+        config = self.app.config
+        self.topic = config['MQTT_INGEST_TOPIC']
+        if config['MQTT_INGEST_SHARE_GROUP']:
+            self.topic = f"$share/{config['MQTT_INGEST_SHARE_GROUP']}/{self.topic}"
+        self.qos = config['MQTT_INGEST_QOS']
+        self.batch_size = config['MQTT_INGEST_BATCH_SIZE']
+        self.flush_interval = config['MQTT_INGEST_FLUSH_INTERVAL']
+        
+        self.client = mqtt.Client(client_id = client_id(config), clean_session = False, manual_ack = True)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.connect_async(config['MQTT_BROKER_HOST'], config['MQTT_BROKER_PORT'], 60)
+        self.client.loop_start()
+        
+        self._running = True
+        self._thread = threading.Thread(target = self._flush_loop, name = "mqtt-ingest", daemon = True)
+        self._thread.start()
+        
+        
+    def stop(self):
+        """Flushes what is buffered, acknowledges it and disconnects."""
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.client.disconnect()
+        self.client.loop_stop()
+        
+        
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print(f"Ingest subscriber connected, subscribing to {self.topic}")
+            client.subscribe(self.topic, qos = self.qos)
+        else:
+            print(f"Ingest subscriber failed to connect, return code {rc}")
+            
+            
+    def _on_message(self, client, userdata, msg):
+        with self._lock:
+            self._counters['messages'] += 1
+        try:
+            greenhouse_id = int(msg.topic.split('/')[1])
+            payload = json.loads(msg.payload.decode('utf-8'))
+            items = payload if isinstance(payload, list) else [payload]
+            rows = [parse_reading(item, greenhouse_id) for item in items]
+        except (ValueError, IndexError, AttributeError, UnicodeDecodeError) as e:
+            # Redelivering a malformed message would not help, so it is acknowledged and dropped
+            print(f"Dropping invalid reading on '{msg.topic}': {e}")
+            with self._lock:
+                self._counters['invalid'] += 1
+            client.ack(msg.mid, msg.qos)
+            return
+        
+        with self._lock:
+            self._buffer.append((rows, msg.mid, msg.qos))
+            self._buffered_rows += len(rows)
+            full = self._buffered_rows >= self.batch_size
+        if full:
+            self._wake.set()
+            
+            
+    def _flush_loop(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            
+            
+    def flush(self):
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            self._buffered_rows = 0
+        if not pending:
+            return
+        
+        rows = [row for message_rows, _, _ in pending for row in message_rows]
+        with self.app.app_context():
+            try:
+                targets = target_cache.get_many({row['greenhouse_id'] for row in rows})
+                known = [row for row in rows if row['greenhouse_id'] in targets]
+                if known:
+                    store_readings(known, targets, source = 'mqtt')
+            except Exception as e:
+                db.session.rollback()
+                print(f"Ingest flush failed, retrying with the next batch: {e}")
+                with self._lock:
+                    self._counters['failed_flushes'] += 1
+                    self._buffer[:0] = pending
+                    self._buffered_rows += len(rows)
+                return
+            
+        with self._lock:
+            self._counters['stored'] += len(known)
+            self._counters['unknown_greenhouse'] += len(rows) - len(known)
+        for _, mid, qos in pending:
+            self.client.ack(mid, qos)
+            
+            
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, buffered = self._buffered_rows, running = self._running)
+
+
+ingest_subscriber = IngestSubscriber()
+
+
+if __name__ == '__main__':
+    from app import create_app
+    from config import Config
+    # The instance the app uses, not this __main__ module's copy of it
+    from mqtt_ingest import ingest_subscriber
+    
+    class IngestConfig(Config):
+        # Keeps create_app from starting a subscriber of its own, the control sweep and retention
+        BACKGROUND_JOBS = False
+    
+    ingest_subscriber.app = create_app(IngestConfig)
+    ingest_subscriber.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("Stopping ingest subscriber...")
+    finally:
+        ingest_subscriber.stop()
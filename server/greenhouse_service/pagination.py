@@ -0,0 +1,147 @@
+from flask import current_app
+from database import db
+from archive import read_rows
+import base64
+import binascii
+import datetime
+
+
+def parse_iso_timestamp(value):
+    """
+    Parses an ISO 8601 string into the naive local time the tables store. A value with a UTC
+    offset is converted to local time rather than having its offset dropped.
+    
+    Raises:
+        TypeError: If value is not a string.
+        ValueError: If value is not ISO 8601.
+    """
+    timestamp = datetime.datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo = None)
+    return timestamp
+
+
+def parse_timestamp(value, name):
+    """Parses an optional ISO 8601 query parameter, raising ValueError with the parameter name."""
+    if value is None:
+        return None
+    try:
+        return parse_iso_timestamp(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO 8601 timestamp")
+
+
+def is_greenhouse_id(value):
+    """Tells whether a JSON value can be a greenhouse id; booleans, strings, lists and objects cannot."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_greenhouse_ids(value):
+    """Parses an optional comma separated list of greenhouse ids; None when empty."""
+    if not value:
+        return None
+    try:
+        return sorted({int(item) for item in value.split(',') if item.strip()})
+    except ValueError:
+        raise ValueError("'greenhouse_ids' must be a comma separated list of integers")
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return parse_iso_timestamp(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("'cursor' is not valid")
+
+
+def parse_limit(value):
+    max_page_size = current_app.config['MAX_PAGE_SIZE']
+    if value is None:
+        return current_app.config['DEFAULT_PAGE_SIZE']
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if limit < 1 or limit > max_page_size:
+        raise ValueError(f"'limit' must be between 1 and {max_page_size}")
+    return limit
+
+
+def parse_fields(model, value):
+    """
+    Resolves a comma separated 'fields' parameter against model.SERIALIZE_FIELDS.
+    
+    Fields are given by column name; the response keeps the keys used by model.serialize().
+    Returns the selected (key, column name) pairs, all of them when no fields are requested.
+    """
+    if not value:
+        return list(model.SERIALIZE_FIELDS.items())
+    
+    columns = {column: key for key, column in model.SERIALIZE_FIELDS.items()}
+    selected = []
+    for column in value.split(','):
+        column = column.strip()
+        if column not in columns:
+            raise ValueError(f"Unknown field '{column}'")
+        selected.append((columns[column], column))
+    return selected
+
+
+def history_page(model, greenhouse_id, args):
+    """
+    Returns one page of a greenhouse's history, newest first, using (timestamp, id) keyset pagination.
+    
+    Supported query arguments are 'limit', 'cursor' (the 'next_cursor' of the previous page),
+    'since' and 'until' (ISO 8601, inclusive) and 'fields'. Only the requested columns are
+    selected, so the cost of a page does not depend on how much history exists.
+    
+    With 'archive=true', a page that runs past the rows still in the database continues into
+    the compressed archive written by the retention job.
+    
+    Raises:
+        ValueError: If one of the query arguments is invalid.
+    """
+    limit = parse_limit(args.get('limit'))
+    fields = parse_fields(model, args.get('fields'))
+    since = parse_timestamp(args.get('since'), 'since')
+    until = parse_timestamp(args.get('until'), 'until')
+    
+    columns = [getattr(model, column) for _, column in fields] + [model.timestamp, model.id]
+    query = db.select(*columns).where(model.greenhouse_id == greenhouse_id)
+    
+    if since is not None:
+        query = query.where(model.timestamp >= since)
+    if until is not None:
+        query = query.where(model.timestamp <= until)
+    before = None
+    if args.get('cursor'):
+        before = decode_cursor(args['cursor'])
+        query = query.where(db.or_(
+            model.timestamp < before[0],
+            db.and_(model.timestamp == before[0], model.id < before[1])
+        ))
+    
+    query = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1)
+    keys = [key for key, _ in fields]
+    rows = [(row[-2], row[-1], dict(zip(keys, row))) for row in db.session.execute(query)]
+    
+    if args.get('archive', '').lower() in ('1', 'true') and len(rows) <= limit:
+        if rows:
+            before = rows[-1][:2]
+        for row in read_rows(model.__tablename__, greenhouse_id, since, until, before, limit + 1 - len(rows)):
+            rows.append((row['timestamp'], row['id'], {key: row[column] for key, column in fields}))
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+        
+    return {
+        'data': [item for _, _, item in rows],
+        'next_cursor': next_cursor
+    }
@@ -0,0 +1,153 @@
+"""
+Monthly time-range partitions for the history tables on Postgres.
+
+Migration 4 turns readings and actuator_status into tables partitioned by RANGE (timestamp),
+with one partition per month (<table>_YYYY_MM) and a <table>_default partition that catches
+rows outside of them. ensure_partitions() creates the partitions for the coming months and
+runs at startup and with every retention run; drop_expired_partitions() drops months that
+lie entirely before the retention cutoff once their rows have been archived. Both are
+no-ops on SQLite.
+"""
+from flask import current_app
+from database import db
+import datetime
+
+
+PARTITIONED_TABLES = ('readings', 'actuator_status')
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1)
+
+
+def next_month(month):
+    return datetime.datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_{month:%Y_%m}"
+
+
+def is_partitioned(connection, table):
+    return connection.execute(
+        db.text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    ).first() is not None
+
+
+def _partitions(connection, table):
+    return set(connection.execute(db.text(
+        "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": table}).scalars())
+
+
+def _create_partition(connection, table, month):
+    name = partition_name(table, month)
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+    stray = connection.execute(
+        db.text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE timestamp >= :start AND timestamp < :end)"),
+        {"start": month, "end": next_month(month)}
+    ).scalar()
+
+    if not stray:
+        connection.exec_driver_sql(f"CREATE TABLE {name} PARTITION OF {table} {bounds}")
+        return
+
+    # The default partition already holds rows of this month: move them into the new table before attaching it
+    connection.exec_driver_sql(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    connection.execute(db.text(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": month, "end": next_month(month)})
+    connection.exec_driver_sql(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}")
+
+
+def ensure_partitions(connection, since = None, months_ahead = None):
+    """
+    Creates the missing monthly partitions from since (default: this month) to months_ahead
+    months from now. Returns the names of the partitions created.
+    """
+    if connection.dialect.name != 'postgresql':
+        return []
+    if months_ahead is None:
+        months_ahead = current_app.config['PARTITION_MONTHS_AHEAD']
+
+    now = datetime.datetime.now()
+    last = month_start(now)
+    for _ in range(months_ahead):
+        last = next_month(last)
+
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(connection, table):
+            continue
+        existing = _partitions(connection, table)
+        month = month_start(min(since or now, now))
+        while month <= last:
+            if partition_name(table, month) not in existing:
+                _create_partition(connection, table, month)
+                created.append(partition_name(table, month))
+            month = next_month(month)
+    return created
+
+
+def drop_expired_partitions(connection, cutoff):
+    """Drops the empty monthly partitions that end at or before cutoff. Returns their names."""
+    if connection.dialect.name != 'postgresql':
+        return []
+
+    dropped = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(connection, table):
+            continue
+        for name in sorted(_partitions(connection, table)):
+            try:
+                month = datetime.datetime.strptime(name[len(table) + 1:], '%Y_%m')
+            except ValueError:
+                continue # The default partition
+            if next_month(month) > cutoff:
+                continue
+            if connection.exec_driver_sql(f"SELECT EXISTS (SELECT 1 FROM {name})").scalar():
+                continue
+            connection.exec_driver_sql(f"DROP TABLE {name}")
+            dropped.append(name)
+    return dropped
+
+
+def partition_history_tables(connection):
+    """Converts readings and actuator_status into monthly partitioned tables, keeping their rows, ids and indexes."""
+    if connection.dialect.name != 'postgresql':
+        return
+
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(connection, table):
+            continue
+        old = f"{table}_unpartitioned"
+        connection.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {old}")
+        connection.exec_driver_sql(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS ix_{table}_greenhouse_id_timestamp")
+
+        # The partition key has to be part of the primary key
+        connection.exec_driver_sql(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)")
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, timestamp)")
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD FOREIGN KEY (greenhouse_id) REFERENCES greenhouse (id)")
+        connection.exec_driver_sql(f"CREATE INDEX ix_{table}_greenhouse_id_timestamp ON {table} (greenhouse_id, timestamp DESC, id DESC)")
+        connection.exec_driver_sql(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    oldest = {
+        table: connection.exec_driver_sql(f"SELECT MIN(timestamp) FROM {table}_unpartitioned").scalar()
+        for table in PARTITIONED_TABLES if _exists(connection, f"{table}_unpartitioned")
+    }
+    ensure_partitions(connection, since = min([value for value in oldest.values() if value], default = None))
+
+    for table in oldest:
+        old = f"{table}_unpartitioned"
+        sequence = connection.exec_driver_sql(f"SELECT pg_get_serial_sequence('{old}', 'id')").scalar()
+        connection.exec_driver_sql(f"INSERT INTO {table} SELECT * FROM {old}")
+        if sequence:
+            connection.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        connection.exec_driver_sql(f"DROP TABLE {old}")
+
+
+def _exists(connection, table):
+    return connection.execute(db.text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar()
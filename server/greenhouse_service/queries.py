@@ -0,0 +1,90 @@
+from database import db
+from models import Greenhouse, Readings, ActuatorStatus, READING_FIELDS, decode_state
+from rules import TARGET_FIELDS
+
+
+def latest_rows(model, greenhouse_ids = None):
+    """
+    Returns {greenhouse_id: newest row of model} for the given greenhouses (all when None).
+    
+    Runs as a single query: a correlated subquery picks the newest id per greenhouse with an
+    ORDER BY ... LIMIT 1, so the cost depends on the number of greenhouses, not on history length.
+    """
+    newest_id = (
+        db.select(model.id)
+        .where(model.greenhouse_id == Greenhouse.id)
+        .order_by(model.timestamp.desc(), model.id.desc())
+        .limit(1)
+        .correlate(Greenhouse)
+        .scalar_subquery()
+    )
+    newest_ids = db.select(newest_id).select_from(Greenhouse)
+    if greenhouse_ids is not None:
+        newest_ids = newest_ids.where(Greenhouse.id.in_(greenhouse_ids))
+    
+    rows = db.session.execute(db.select(model).where(model.id.in_(newest_ids))).scalars()
+    return {row.greenhouse_id: row for row in rows}
+
+
+def _newest_id(model):
+    """Correlated subquery for the id of a greenhouse's newest row of model, on an alias so it can be joined against model itself."""
+    newest = db.aliased(model)
+    return (
+        db.select(newest.id)
+        .where(newest.greenhouse_id == Greenhouse.id)
+        .order_by(newest.timestamp.desc(), newest.id.desc())
+        .limit(1)
+        .correlate(Greenhouse)
+        .scalar_subquery()
+    )
+
+
+# Response key -> column of the overview query, for the targets and the newest reading
+_OVERVIEW_TARGETS = dict(zip(('target_temp', 'target_humidity', 'target_soil_moisture_pct', 'target_light', 'target_CO2', 'target_wind_speed'), TARGET_FIELDS))
+_OVERVIEW_READING = {key: column for key, column in Readings.SERIALIZE_FIELDS.items() if column != 'greenhouse_id'}
+
+
+def fleet_overview(greenhouse_ids = None):
+    """
+    Returns, for the given greenhouses (all when None) in id order, their targets, newest
+    reading, newest actuator status and the deviation of each reading from its target.
+    
+    Runs as a single query: every greenhouse is joined to its newest reading and status by
+    the same ORDER BY ... LIMIT 1 index lookups latest_rows uses, and the deviations are
+    computed in SQL, so the cost grows with the number of greenhouses only.
+    """
+    deviations = [
+        (getattr(Readings, field) - getattr(Greenhouse, target)).label(f"deviation_{field}")
+        for field, target in zip(READING_FIELDS, TARGET_FIELDS)
+    ]
+    query = (
+        db.select(
+            Greenhouse.id, Greenhouse.name, Greenhouse.location, *[getattr(Greenhouse, target) for target in TARGET_FIELDS],
+            *[getattr(Readings, column).label(f"reading_{column}") for column in _OVERVIEW_READING.values()],
+            ActuatorStatus.id.label('status_id'), ActuatorStatus.timestamp.label('status_timestamp'), ActuatorStatus.state,
+            *deviations
+        )
+        .select_from(Greenhouse)
+        .outerjoin(Readings, Readings.id == _newest_id(Readings))
+        .outerjoin(ActuatorStatus, ActuatorStatus.id == _newest_id(ActuatorStatus))
+        .order_by(Greenhouse.id)
+    )
+    if greenhouse_ids is not None:
+        query = query.where(Greenhouse.id.in_(greenhouse_ids))
+    
+    overview = []
+    for row in db.session.execute(query).mappings():
+        item = {'id': row['id'], 'name': row['name'], 'location': row['location']}
+        item.update({key: row[target] for key, target in _OVERVIEW_TARGETS.items()})
+        
+        item['latest_reading'] = None
+        item['deviation'] = None
+        if row['reading_id'] is not None:
+            item['latest_reading'] = {key: row[f"reading_{column}"] for key, column in _OVERVIEW_READING.items()}
+            item['deviation'] = {key: row[f"deviation_{column}"] for key, column in _OVERVIEW_READING.items() if column in READING_FIELDS}
+            
+        item['latest_actuator_status'] = None
+        if row['status_id'] is not None:
+            item['latest_actuator_status'] = dict({'id': row['status_id'], 'timestamp': row['status_timestamp']}, **decode_state(row['state']))
+        overview.append(item)
+    return overview
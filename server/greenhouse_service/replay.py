@@ -0,0 +1,264 @@
+"""
+What-if replay of the control rules over stored readings.
+
+replay() loads a greenhouse's readings for a time range as NumPy arrays and runs the same
+rules the live control path uses (rules.CompiledRules) over all of them at once, once with
+the stored setpoints and once with candidate ones. Nothing is published or written.
+
+The live path's state is reproduced without a Python loop over readings: a rule's hysteresis
+latch is set where the reading is past the margin, released where it is back inside the
+hysteresis band and carried forward in between, which is a forward fill. Minimum dwell
+(CONTROL_MIN_DWELL / CONTROL_ACTUATOR_DWELL) is then applied per actuator, stepping only
+from one switch to the next. Unlike the live path every reading is evaluated, including
+those the control dispatcher would coalesce under load.
+
+For every actuator the report gives the duty cycle (share of the time it is ON, each
+reading's state lasting until the next reading), the ON time and the number of switches;
+'commands' counts the readings at which at least one actuator switches, i.e. the commands
+publish-on-change would send (heartbeats not included). Run from the command line with:
+
+    python replay.py 1 --since 2025-08-01 --target target_temp=23.5 --target target_humidity=65
+"""
+from flask import current_app
+from models import Greenhouse, Readings, READING_FIELDS, ACTUATOR_FIELDS
+from database import db, init_db
+from rules import TARGET_FIELDS, compile_rules, validate_rules
+import bisect
+import datetime
+import sys
+import numpy as np
+
+
+# Target names used by the greenhouse endpoints where they differ from TARGET_FIELDS
+TARGET_ALIASES = {'target_CO2': 'target_co_two'}
+
+
+def _epoch_seconds(column):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.func.extract('epoch', column)
+    return (db.func.julianday(column) - 2440587.5) * 86400.0
+
+
+def load_history(greenhouse_id, since, until):
+    """
+    Returns (times, readings) for the readings of a greenhouse in [since, until]: times in
+    seconds since the epoch and an (N, len(READING_FIELDS)) float array, NaN where missing.
+
+    Raises:
+        ValueError: If the range holds more than REPLAY_MAX_ROWS readings.
+    """
+    max_rows = current_app.config['REPLAY_MAX_ROWS']
+    query = (
+        db.select(_epoch_seconds(Readings.timestamp), *[getattr(Readings, field) for field in READING_FIELDS])
+        .where(Readings.greenhouse_id == greenhouse_id, Readings.timestamp >= since, Readings.timestamp <= until)
+        .order_by(Readings.timestamp, Readings.id)
+        .limit(max_rows + 1)
+    )
+    # Straight from the DBAPI cursor: the columns need no result processing, and building
+    # Row objects for a month of readings would cost more than the replay itself
+    result = db.session.connection().execute(query)
+    try:
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    if len(rows) > max_rows:
+        raise ValueError(f"The range holds more than {max_rows} readings, narrow it")
+
+    values = np.array(rows, dtype = float).reshape(len(rows), len(READING_FIELDS) + 1)
+    # julianday() arithmetic is off by up to some 20 microseconds; milliseconds are plenty here
+    values[:, 0] = np.round(values[:, 0], 3)
+    return values[:, 0], values[:, 1:]
+
+
+def _forward_fill(value, known):
+    """value where known, else the last known value before it (False before the first)."""
+    positions = np.where(known, np.arange(len(known))[:, None], -1)
+    np.maximum.accumulate(positions, axis = 0, out = positions)
+    return np.where(positions >= 0, np.take_along_axis(value, np.maximum(positions, 0), axis = 0), False)
+
+
+def fired_rules(compiled, readings, targets):
+    """
+    Which rules fire at every reading, with hysteresis carried over from reading to reading
+    as rules.decide_held does live. targets is one row of TARGET_FIELDS values.
+    Returns (above, below), two (N, rules) bool arrays.
+    """
+    values = readings[:, compiled.sensors]
+    bounds = np.asarray(targets, dtype = float)[compiled.targets]
+    upper = bounds + compiled.margins
+    lower = bounds - compiled.margins
+
+    # Past the margin: fires. Outside the hysteresis band: released. In between: as before.
+    above_set = values > upper
+    above_known = above_set | ~(values > upper - compiled.hysteresis)
+    below_set = values < lower
+    below_known = below_set | ~(values < lower + compiled.hysteresis)
+    return _forward_fill(above_set, above_known), _forward_fill(below_set, below_known)
+
+
+def apply_dwell(times, desired, min_dwell):
+    """
+    Holds each actuator's state for at least min_dwell seconds after a switch, like
+    command_state does. desired is an (N, actuators) bool array; the first switch is free.
+    """
+    if not len(times) or not np.any(min_dwell > 0):
+        return desired
+
+    count = len(times)
+    time_list = times.tolist()
+    states = np.empty_like(desired)
+    for actuator in range(desired.shape[1]):
+        column = desired[:, actuator]
+        dwell = min_dwell[actuator]
+        if dwell <= 0:
+            states[:, actuator] = column
+            continue
+
+        # Indices where the desired state changes. After a switch the actuator agrees with
+        # the desired state, so the next switch is the next change if it comes after the dwell
+        # time, else the first reading after the dwell time at which the two disagree
+        edges = (np.flatnonzero(column[1:] != column[:-1]) + 1).tolist()
+        flips = []
+        edge = 0
+        while edge < len(edges):
+            position = edges[edge]
+            flips.append(position)
+            release = bisect.bisect_left(time_list, time_list[position] + dwell)
+            edge = bisect.bisect_right(edges, position, edge)
+            if edge < len(edges) and edges[edge] < release:
+                if release >= count:
+                    break
+                # The changes the actuator sat out cancel in pairs; an odd count leaves it behind
+                passed = bisect.bisect_right(edges, release, edge)
+                if (passed - edge) % 2:
+                    edges[passed - 1] = release
+                    edge = passed - 1
+                else:
+                    edge = passed
+        switched = np.zeros(count, dtype = bool)
+        switched[flips] = True
+        states[:, actuator] = column[0] ^ np.logical_xor.accumulate(switched)
+    return states
+
+
+def summarize(times, states):
+    """Per-actuator duty cycle, ON seconds and switch count, plus the number of commands."""
+    durations = np.diff(times, append = times[-1]) if len(times) else times
+    total = float(durations.sum())
+    switched = np.diff(states, axis = 0) if len(states) else states
+    report = {}
+    for index, actuator in enumerate(ACTUATOR_FIELDS):
+        on_seconds = float(durations[states[:, index]].sum())
+        report[actuator] = {
+            'duty_cycle': round(on_seconds / total, 4) if total else None,
+            'on_seconds': round(on_seconds, 1),
+            'switches': int(switched[:, index].sum())
+        }
+    commands = int(switched.any(axis = 1).sum()) + (1 if len(states) else 0)
+    return {'actuators': report, 'commands': commands}
+
+
+def simulate(times, readings, targets, rules = None, min_dwell = None):
+    """Runs the rules over loaded history; targets is one row of TARGET_FIELDS values."""
+    compiled = compile_rules(rules)
+    states = compiled.apply(*fired_rules(compiled, readings, targets))
+    if min_dwell is not None:
+        states = apply_dwell(times, states, min_dwell)
+    return summarize(times, states)
+
+
+def configured_dwell():
+    config = current_app.config
+    return np.array([config['CONTROL_ACTUATOR_DWELL'].get(actuator, config['CONTROL_MIN_DWELL']) for actuator in ACTUATOR_FIELDS], dtype = float)
+
+
+def replay(greenhouse_id, since = None, until = None, targets = None, control_rules = None, dwell = True):
+    """
+    Replays a greenhouse's history from since (default: 30 days before until) to until
+    (default: now) with its stored setpoints and with targets (a dict of TARGET_FIELDS values
+    replacing them, keyed by column or by TARGET_ALIASES name) and control_rules (replacing
+    the stored rules when given).
+
+    Returns None if the greenhouse does not exist.
+
+    Raises:
+        ValueError: If a target or the rules are invalid, or the range holds too many readings.
+    """
+    greenhouse = db.session.get(Greenhouse, greenhouse_id)
+    if greenhouse is None:
+        return None
+
+    targets = {TARGET_ALIASES.get(field, field): value for field, value in (targets or {}).items()}
+    unknown = set(targets) - set(TARGET_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown target '{sorted(unknown)[0]}', expected one of {', '.join(TARGET_FIELDS)}")
+    for field, value in targets.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"'{field}' must be a number")
+    if control_rules is not None:
+        validate_rules(control_rules)
+
+    until = until or datetime.datetime.now()
+    since = since or until - datetime.timedelta(days = 30)
+    if since > until:
+        raise ValueError("'since' must not be after 'until'")
+
+    times, readings = load_history(greenhouse_id, since, until)
+    current = [getattr(greenhouse, field) for field in TARGET_FIELDS]
+    candidate = [targets.get(field, value) for field, value in zip(TARGET_FIELDS, current)]
+    min_dwell = configured_dwell() if dwell else None
+
+    return {
+        'greenhouse_id': greenhouse_id,
+        'since': since,
+        'until': until,
+        'readings': len(times),
+        'targets': dict(zip(TARGET_FIELDS, candidate)),
+        'dwell': dwell,
+        'current': simulate(times, readings, current, greenhouse.control_rules, min_dwell),
+        'candidate': simulate(times, readings, candidate, control_rules if control_rules is not None else greenhouse.control_rules, min_dwell)
+    }
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    from config import Config
+    from pagination import parse_iso_timestamp
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description = "Replay a greenhouse's history with candidate setpoints.")
+    parser.add_argument("greenhouse_id", type = int)
+    parser.add_argument("--since", type = parse_iso_timestamp, help = "ISO 8601, default 30 days before --until")
+    parser.add_argument("--until", type = parse_iso_timestamp, help = "ISO 8601, default now")
+    parser.add_argument("--target", action = "append", default = [], metavar = "FIELD=VALUE", help = "Candidate setpoint, repeatable")
+    parser.add_argument("--rules", help = "JSON file with candidate control rules")
+    parser.add_argument("--no-dwell", action = "store_true", help = "Ignore the minimum dwell times")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+
+    try:
+        targets = {}
+        for item in args.target:
+            field, _, value = item.partition('=')
+            targets[field] = float(value)
+        control_rules = None
+        if args.rules:
+            with open(args.rules) as file:
+                control_rules = json.load(file)
+
+        with app.app_context():
+            started = time.perf_counter()
+            result = replay(args.greenhouse_id, args.since, args.until, targets, control_rules, not args.no_dwell)
+            if result is None:
+                print(f"Greenhouse {args.greenhouse_id} not found", file=sys.stderr)
+                sys.exit(1)
+            result['seconds'] = round(time.perf_counter() - started, 3)
+            print(json.dumps(result, indent = 2, default = str))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
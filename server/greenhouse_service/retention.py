@@ -0,0 +1,124 @@
+"""
+Retention policy for the time-series tables.
+
+Raw readings and actuator statuses older than RETENTION_RAW_DAYS are moved to the
+compressed archive (see archive.py) and deleted in chunks of RETENTION_CHUNK_SIZE rows,
+each in its own short transaction. Rollups are expired per bucket size according to
+RETENTION_ROLLUP_DAYS, so with the defaults only hourly and daily rollups outlive the raw
+data. On Postgres, monthly partitions that were emptied this way are dropped and the partitions
+for the coming months are created. Afterwards the database is vacuumed. Run once with:
+
+    python retention.py
+
+or set RETENTION_INTERVAL to run it periodically in the background.
+"""
+from flask import current_app
+from models import Readings, ActuatorStatus, ReadingRollup
+from database import db, init_db
+from archive import write_segments
+from partitions import ensure_partitions, drop_expired_partitions
+import datetime
+import sys 
+import threading
+import time
+
+
+def archive_expired(model, cutoff):
+    """Archives and deletes the rows of model older than cutoff. Returns the number of rows moved."""
+    chunk_size = current_app.config['RETENTION_CHUNK_SIZE']
+    pause = current_app.config['RETENTION_CHUNK_PAUSE']
+    columns = [column.name for column in model.__table__.columns]
+    
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            db.select(*model.__table__.columns)
+            .where(model.timestamp < cutoff)
+            .order_by(model.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return moved
+        
+        write_segments(model.__tablename__, columns, rows)
+        db.session.execute(db.delete(model).where(model.id.in_([row.id for row in rows])))
+        db.session.commit()
+        moved += len(rows)
+        
+        # Let writers in between chunks
+        time.sleep(pause)
+        
+        
+def expire_rollups(now):
+    expired = 0
+    for bucket, days in current_app.config['RETENTION_ROLLUP_DAYS'].items():
+        result = db.session.execute(
+            db.delete(ReadingRollup)
+            .where(ReadingRollup.bucket == bucket, ReadingRollup.bucket_start < now - datetime.timedelta(days = days))
+        )
+        expired += result.rowcount
+    db.session.commit()
+    return expired
+
+
+def vacuum():
+    with db.engine.connect().execution_options(isolation_level = 'AUTOCOMMIT') as connection:
+        if connection.dialect.name == 'postgresql':
+            for table in (Readings.__tablename__, ActuatorStatus.__tablename__, ReadingRollup.__tablename__):
+                connection.exec_driver_sql(f"VACUUM (ANALYZE) {table}")
+        else:
+            connection.exec_driver_sql("VACUUM")
+            
+            
+def run_retention():
+    """Applies the retention policy once. Must be called inside an application context."""
+    now = datetime.datetime.now()
+    cutoff = now - datetime.timedelta(days = current_app.config['RETENTION_RAW_DAYS'])
+    
+    summary = {
+        'readings_archived': archive_expired(Readings, cutoff),
+        'actuator_statuses_archived': archive_expired(ActuatorStatus, cutoff),
+        'rollups_expired': expire_rollups(now)
+    }
+    with db.engine.begin() as connection:
+        summary['partitions_dropped'] = len(drop_expired_partitions(connection, cutoff))
+        ensure_partitions(connection)
+    if current_app.config['RETENTION_VACUUM'] and any(summary.values()):
+        vacuum()
+    return summary
+
+
+def start_retention_worker(app):
+    """Runs the retention policy every RETENTION_INTERVAL seconds on a daemon thread (0 disables it)."""
+    interval = app.config['RETENTION_INTERVAL']
+    if interval <= 0:
+        return None
+    
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    print(f"Retention run: {run_retention()}")
+            except Exception as e:
+                print(f"Retention run failed: {e}")
+                
+    thread = threading.Thread(target = run, name = "retention", daemon = True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    from flask import Flask 
+    from config import Config
+    
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+    
+    try:
+        with app.app_context():
+            print(run_retention())
+    except Exception as e:
+        print(f"Error applying retention policy: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""
+Incrementally maintained per-minute, per-hour and per-day rollups of sensor readings.
+
+record_readings() is called at ingest time, inside the same transaction as the raw insert,
+and merges the new samples into reading_rollups with an upsert. Existing history can be
+(re)built from the raw table with:
+
+    python rollups.py rebuild [--greenhouse ID] [--since ISO_TIMESTAMP]
+
+A rebuild never reaches further back than the oldest raw reading, so rollups of history
+the retention job has archived survive it. Rollups need an upsert, so they are maintained on
+SQLite and Postgres only; on any other database they are switched off with a warning.
+"""
+from models import Readings, ReadingRollup, READING_FIELDS
+from database import db, init_db
+import datetime
+import sys 
+
+
+BUCKETS = {
+    '1m': datetime.timedelta(minutes = 1),
+    '1h': datetime.timedelta(hours = 1),
+    '1d': datetime.timedelta(days = 1)
+}
+
+ROLLUP_KEY = ('greenhouse_id', 'bucket', 'bucket_start', 'metric')
+
+# Dialect name -> its INSERT ... ON CONFLICT construct, None where there is none
+_inserts = {}
+
+
+def bucket_start(timestamp, bucket):
+    if bucket == '1m':
+        return timestamp.replace(second = 0, microsecond = 0)
+    if bucket == '1h':
+        return timestamp.replace(minute = 0, second = 0, microsecond = 0)
+    return timestamp.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+
+
+def _dialect_insert():
+    """The current database's upsert-capable insert(), looked up once per dialect; None if unsupported."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in _inserts:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+            print(f"Rollups are not supported on {dialect}; reading_rollups will not be maintained")
+        _inserts[dialect] = insert
+    return _inserts[dialect]
+
+
+def _upsert_statement(insert):
+    statement = insert(ReadingRollup)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements = list(ROLLUP_KEY),
+        set_ = {
+            'count': ReadingRollup.count + excluded.count,
+            'total': ReadingRollup.total + excluded.total,
+            'minimum': db.case((excluded.minimum < ReadingRollup.minimum, excluded.minimum), else_ = ReadingRollup.minimum),
+            'maximum': db.case((excluded.maximum > ReadingRollup.maximum, excluded.maximum), else_ = ReadingRollup.maximum)
+        }
+    )
+
+
+def record_readings(rows, since = None):
+    """
+    Merges reading row dicts into the rollup tables. Does not commit.
+    
+    Samples are pre-aggregated per bucket in Python, so a batch costs one upsert row per
+    (greenhouse, bucket, metric) it touches rather than one per sample. Buckets that begin
+    before 'since' are left alone. Does nothing on databases without rollup support.
+    """
+    insert = _dialect_insert()
+    if insert is None:
+        return
+    
+    aggregates = {}
+    for row in rows:
+        for bucket in BUCKETS:
+            start = bucket_start(row['timestamp'], bucket)
+            if since is not None and start < since:
+                continue
+            for metric in READING_FIELDS:
+                value = row.get(metric)
+                if value is None:
+                    continue
+                key = (row['greenhouse_id'], bucket, start, metric)
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregates[key] = [1, value, value, value]
+                else:
+                    aggregate[0] += 1
+                    aggregate[1] += value
+                    aggregate[2] = min(aggregate[2], value)
+                    aggregate[3] = max(aggregate[3], value)
+                    
+    if aggregates:
+        db.session.execute(_upsert_statement(insert), [
+            dict(zip(ROLLUP_KEY, key), count = count, total = total, minimum = minimum, maximum = maximum)
+            for key, (count, total, minimum, maximum) in aggregates.items()
+        ])
+        
+        
+def aggregate(greenhouse_id, bucket, since, until, metrics):
+    """Returns [{bucket_start, <metric>: {min, max, avg, count}}] in ascending time order."""
+    rows = db.session.execute(
+        db.select(ReadingRollup)
+        .where(
+            ReadingRollup.greenhouse_id == greenhouse_id,
+            ReadingRollup.bucket == bucket,
+            ReadingRollup.bucket_start >= bucket_start(since, bucket),
+            ReadingRollup.bucket_start <= until,
+            ReadingRollup.metric.in_(metrics)
+        )
+        .order_by(ReadingRollup.bucket_start)
+    ).scalars()
+    
+    buckets = {}
+    for rollup in rows:
+        item = buckets.setdefault(rollup.bucket_start, {'bucket_start': rollup.bucket_start})
+        item[rollup.metric] = {
+            'min': rollup.minimum,
+            'max': rollup.maximum,
+            'avg': rollup.total / rollup.count,
+            'count': rollup.count
+        }
+    return list(buckets.values())
+
+
+def rebuild(greenhouse_id = None, since = None, chunk_size = 10000):
+    """
+    Recomputes rollups from the raw readings, from the start of the day containing 'since'.
+    
+    Only buckets that begin at or after the oldest raw reading are rebuilt. Older raw rows
+    may have been archived by the retention job, and their rollups are then the only history
+    left of them, so buckets that begin earlier are kept as they are.
+    """
+    if _dialect_insert() is None:
+        raise RuntimeError(f"Rollups are not supported on {db.session.get_bind().dialect.name}")
+    
+    oldest = db.select(db.func.min(Readings.timestamp))
+    delete = db.delete(ReadingRollup)
+    query = db.select(Readings.greenhouse_id, Readings.timestamp, *(getattr(Readings, field) for field in READING_FIELDS))
+    if greenhouse_id is not None:
+        oldest = oldest.where(Readings.greenhouse_id == greenhouse_id)
+        delete = delete.where(ReadingRollup.greenhouse_id == greenhouse_id)
+        query = query.where(Readings.greenhouse_id == greenhouse_id)
+        
+    oldest = db.session.execute(oldest).scalar()
+    if oldest is None:
+        return 0
+    if since is not None:
+        oldest = max(oldest, bucket_start(since, '1d'))
+    db.session.execute(delete.where(ReadingRollup.bucket_start >= oldest))
+    
+    keys = ('greenhouse_id', 'timestamp') + READING_FIELDS
+    count = 0
+    result = db.session.execute(query.where(Readings.timestamp >= oldest).execution_options(yield_per = chunk_size))
+    for chunk in result.partitions():
+        record_readings([dict(zip(keys, row)) for row in chunk], oldest)
+        count += len(chunk)
+    db.session.commit()
+    return count
+
+
+if __name__ == '__main__':
+    from flask import Flask 
+    from config import Config
+    from pagination import parse_iso_timestamp
+    import argparse
+    
+    parser = argparse.ArgumentParser(description = "Maintain the reading rollup tables.")
+    parser.add_argument("command", choices = ["rebuild"])
+    parser.add_argument("--greenhouse", type = int, help = "Only rebuild this greenhouse")
+    parser.add_argument("--since", type = parse_iso_timestamp, help = "Only rebuild from this ISO 8601 timestamp")
+    args = parser.parse_args()
+    
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+    
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"Rolled up {rebuild(args.greenhouse, args.since)} readings")
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print(f"Error rebuilding rollups: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,229 @@
+"""
+Declarative control rules compiled to a vectorized NumPy evaluator.
+
+A rule compares one sensor value against a greenhouse target:
+
+    {"sensor": "temp_celsius", "target": "target_temp", "margin": 2.0, "hysteresis": 1.0, "priority": 10,
+     "above": {"vents_on": "ON", ...}, "below": {"heater_on": "ON", ...}}
+
+When the reading is above target + margin the 'above' actuator states are applied, when it
+is below target - margin the 'below' states are. With a 'hysteresis' band a rule that fired
+on the previous evaluation keeps firing until the reading crosses back over
+target + margin - hysteresis (target - margin + hysteresis below), so a sensor hovering at
+the margin does not toggle the actuators. Rules are applied in ascending priority,
+so a later rule overrides the actuators an earlier one set; actuators no rule sets are OFF.
+Missing sensor values never fire a rule.
+
+Each greenhouse may store its own rule list in Greenhouse.control_rules; DEFAULT_RULES
+reproduces the original hand-coded control chain.
+"""
+from models import READING_FIELDS, ACTUATOR_FIELDS
+from collections import namedtuple
+import functools
+import json
+import operator
+import numpy as np
+
+
+TARGET_FIELDS = ('target_temp', 'target_humidity', 'target_soil_moisture_pct', 'target_light', 'target_co_two', 'target_wind_speed')
+
+_reading_values = operator.itemgetter(*READING_FIELDS)
+_target_values = operator.attrgetter(*TARGET_FIELDS)
+
+DEFAULT_RULES = [
+    {"sensor": "temp_celsius", "target": "target_temp", "margin": 2.0, "hysteresis": 1.0, "priority": 10,
+     "above": {"heater_on": "OFF", "vents_on": "ON", "humidifier_pump_on": "ON", "fan_on": "ON"},
+     "below": {"heater_on": "ON", "vents_on": "OFF", "humidifier_pump_on": "OFF", "fan_on": "OFF"}},
+    {"sensor": "humidity_pct", "target": "target_humidity", "margin": 5.0, "hysteresis": 2.5, "priority": 20,
+     "above": {"humidifier_pump_on": "OFF", "fan_on": "ON", "vents_on": "ON"},
+     "below": {"humidifier_pump_on": "ON", "fan_on": "OFF", "vents_on": "OFF"}},
+    {"sensor": "soil_moisture_pct", "target": "target_soil_moisture_pct", "margin": 5.0, "hysteresis": 2.5, "priority": 30,
+     "above": {"irrigation_pump_on": "OFF"},
+     "below": {"irrigation_pump_on": "ON"}},
+    {"sensor": "light_lux", "target": "target_light", "margin": 100.0, "hysteresis": 50.0, "priority": 40,
+     "above": {"lights_on": "OFF"},
+     "below": {"lights_on": "ON"}},
+    {"sensor": "co_two", "target": "target_co_two", "margin": 50.0, "hysteresis": 25.0, "priority": 50,
+     "above": {"vents_on": "ON", "fan_on": "ON", "lights_on": "OFF"},
+     "below": {"vents_on": "OFF", "fan_on": "OFF", "lights_on": "ON"}},
+    {"sensor": "wind_speed", "target": "target_wind_speed", "margin": 0.5, "hysteresis": 0.25, "priority": 60,
+     "above": {"fan_on": "ON"},
+     "below": {"fan_on": "OFF"}}
+]
+
+
+def validate_rules(rules):
+    """
+    Checks a rule list supplied through the API.
+    
+    Raises:
+        ValueError: If the rules are malformed.
+    """
+    if not isinstance(rules, list):
+        raise ValueError("'control_rules' must be a list of rules")
+    
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {index} must be an object")
+        if rule.get('sensor') not in READING_FIELDS:
+            raise ValueError(f"Rule {index}: 'sensor' must be one of {', '.join(READING_FIELDS)}")
+        if rule.get('target') not in TARGET_FIELDS:
+            raise ValueError(f"Rule {index}: 'target' must be one of {', '.join(TARGET_FIELDS)}")
+        for key in ('margin', 'hysteresis', 'priority'):
+            value = rule.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"Rule {index}: '{key}' must be a non-negative number")
+        if rule.get('hysteresis', 0) > rule.get('margin', 0):
+            raise ValueError(f"Rule {index}: 'hysteresis' must not exceed 'margin'")
+        for side in ('above', 'below'):
+            actions = rule.get(side, {})
+            if not isinstance(actions, dict):
+                raise ValueError(f"Rule {index}: '{side}' must be an object")
+            for actuator, state in actions.items():
+                if actuator not in ACTUATOR_FIELDS or state not in ('ON', 'OFF'):
+                    raise ValueError(f"Rule {index}: '{side}' maps actuators ({', '.join(ACTUATOR_FIELDS)}) to \"ON\" or \"OFF\"")
+                
+                
+class CompiledRules:
+    """A rule list flattened into arrays and per-actuator actions, in application order."""
+    
+    def __init__(self, rules):
+        rules = sorted(rules, key = lambda rule: rule.get('priority', 0))
+        self.sensors = np.array([READING_FIELDS.index(rule['sensor']) for rule in rules], dtype = np.intp)
+        self.targets = np.array([TARGET_FIELDS.index(rule['target']) for rule in rules], dtype = np.intp)
+        self.margins = np.array([rule.get('margin', 0.0) for rule in rules], dtype = float)
+        self.hysteresis = np.array([rule.get('hysteresis', 0.0) for rule in rules], dtype = float)
+        
+        # (rule index, side, actuator index, state) in the order they are applied
+        self.actions = [
+            (index, side, ACTUATOR_FIELDS.index(actuator), state == 'ON')
+            for index, rule in enumerate(rules)
+            for side in ('above', 'below')
+            for actuator, state in rule.get(side, {}).items()
+        ]
+        
+        
+    def fire(self, readings, targets, held = None):
+        """
+        Tells which rules fire for N (reading, targets) pairs.
+        
+        readings is an (N, len(READING_FIELDS)) float array with NaN for missing values and
+        targets an (N, len(TARGET_FIELDS)) array. held is None or the (above, below) pair this
+        method returned for the previous readings; rules that fired then only release past
+        their hysteresis band. Returns (above, below), two (N, rules) bool arrays.
+        """
+        values = readings[:, self.sensors]
+        bounds = targets[:, self.targets]
+        above = values > bounds + self.margins
+        below = values < bounds - self.margins
+        if held is not None:
+            above |= held[0] & (values > bounds + self.margins - self.hysteresis)
+            below |= held[1] & (values < bounds - self.margins + self.hysteresis)
+        return above, below
+    
+    
+    def apply(self, above, below):
+        """Turns the fired rules into an (N, len(ACTUATOR_FIELDS)) bool array, True meaning ON."""
+        fired = {'above': above, 'below': below}
+        states = np.zeros((above.shape[0], len(ACTUATOR_FIELDS)), dtype = bool)
+        for index, side, actuator, state in self.actions:
+            states[fired[side][:, index], actuator] = state
+        return states
+    
+    
+    def evaluate(self, readings, targets, held = None):
+        """Decides actuator states for N (reading, targets) pairs at once; see fire() for the arguments."""
+        return self.apply(*self.fire(readings, targets, held))
+
+
+@functools.lru_cache(maxsize = 256)
+def _compile(key):
+    return CompiledRules(json.loads(key))
+
+
+def compile_rules(rules):
+    """Returns the CompiledRules for a rule list (DEFAULT_RULES when None), cached by content."""
+    return _compile(json.dumps(rules if rules is not None else DEFAULT_RULES, sort_keys = True))
+
+
+# What a greenhouse's rules fired on its last decision, passed back in as held for hysteresis
+Fired = namedtuple('Fired', ['rules', 'above', 'below'])
+
+
+def _prepare(items):
+    """Returns (readings, targets, groups) for decide: groups lists (rules, bool mask of items or None for all)."""
+    readings = np.array([_reading_values(reading) for reading, _ in items], dtype = float)
+    
+    # Items usually share Targets objects (one per greenhouse), so convert each only once
+    positions = {}
+    unique = []
+    index = []
+    for _, target in items:
+        position = positions.get(id(target))
+        if position is None:
+            position = positions[id(target)] = len(unique)
+            unique.append(target)
+        index.append(position)
+    index = np.array(index, dtype = np.intp)
+    targets = np.array([_target_values(target) for target in unique], dtype = float)[index]
+    
+    groups = {}
+    for position, target in enumerate(unique):
+        groups.setdefault(id(target.control_rules), (target.control_rules, []))[1].append(position)
+    if len(groups) == 1:
+        return readings, targets, [(unique[0].control_rules, None)]
+    return readings, targets, [(rules, np.isin(index, positions)) for rules, positions in groups.values()]
+
+
+def decide(items):
+    """
+    Evaluates control for many greenhouses in one vectorized pass per distinct rule set.
+    
+    items is a list of (reading, targets) pairs, where reading is a row dict holding all
+    READING_FIELDS (None for missing values) and targets exposes TARGET_FIELDS and
+    control_rules as attributes. Returns an (N, len(ACTUATOR_FIELDS)) bool array in the
+    order of items.
+    """
+    readings, targets, groups = _prepare(items)
+    if groups[0][1] is None:
+        return compile_rules(groups[0][0]).evaluate(readings, targets)
+    
+    states = np.zeros((len(items), len(ACTUATOR_FIELDS)), dtype = bool)
+    for rules, selected in groups:
+        states[selected] = compile_rules(rules).evaluate(readings[selected], targets[selected])
+    return states
+
+
+def decide_held(items, held):
+    """
+    Like decide, with hysteresis: held lists, in the order of items, the Fired of each item's
+    previous decision or None. Returns (states, fired), fired holding one Fired per item to
+    pass back as held next time. A held Fired from another rule set is ignored.
+    """
+    readings, targets, groups = _prepare(items)
+    states = np.zeros((len(items), len(ACTUATOR_FIELDS)), dtype = bool)
+    fired = [None] * len(items)
+    for rules, selected in groups:
+        compiled = compile_rules(rules)
+        rows = np.arange(len(items)) if selected is None else np.flatnonzero(selected)
+        
+        above = np.zeros((len(rows), len(compiled.margins)), dtype = bool)
+        below = np.zeros_like(above)
+        for row, item in enumerate(rows):
+            previous = held[item]
+            if previous is not None and previous.rules is compiled:
+                above[row], below[row] = previous.above, previous.below
+                
+        above, below = compiled.fire(readings[rows], targets[rows], (above, below))
+        states[rows] = compiled.apply(above, below)
+        for row, item in enumerate(rows):
+            fired[item] = Fired(compiled, above[row], below[row])
+    return states, fired
+
+
+def command_message(greenhouse_id, states):
+    """Formats one row of actuator states as the MQTT command message."""
+    message = {"greenhouse_id": greenhouse_id}
+    for actuator, state in zip(ACTUATOR_FIELDS, states):
+        message[actuator] = "ON" if state else "OFF"
+    return message
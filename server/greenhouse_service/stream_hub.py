@@ -0,0 +1,165 @@
+from collections import deque
+from change_feed import change_feed
+import itertools
+import threading
+import time
+
+
+class Subscription:
+    """
+    One stream client: a bounded queue of pre-encoded events.
+
+    When the client falls behind, the oldest events are dropped instead of blocking the
+    publisher; the client is told how many it missed with a 'lagged' event.
+    """
+
+    def __init__(self, greenhouse_ids, kinds, queue_size):
+        self.greenhouse_ids = greenhouse_ids
+        self.kinds = kinds
+        self.events = deque(maxlen = queue_size)
+        self.dropped = 0
+        self.reported = 0
+        self.condition = threading.Condition()
+
+
+    def push(self, event):
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+
+    def get(self, timeout):
+        """Returns the next event (bytes), or None if nothing arrived within timeout seconds."""
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            if self.dropped > self.reported:
+                missed, self.reported = self.dropped - self.reported, self.dropped
+                return f'event: lagged\ndata: {{"dropped": {missed}}}\n\n'.encode()
+            return self.events.popleft() if self.events else None
+
+
+class StreamHub:
+    """
+    Per-process fan-out of new readings, actuator statuses and control commands to Server-Sent
+    Events clients.
+
+    The write paths publish after their commit. Each event is encoded once and appended to
+    the queue of every subscriber following that greenhouse, so publishing costs a lock and
+    a deque append per subscriber and never waits for a client. Rows written by other worker
+    processes arrive with their change_feed notice, and commands are taken from the command
+    topic (see command_state), so clients get every event whichever worker they are
+    connected to, as long as the broker is reachable.
+
+    Every client holds a request thread for as long as it is connected; STREAM_MAX_SUBSCRIBERS
+    is per process and defaults to half of GUNICORN_THREADS, leaving the rest for requests.
+    """
+
+    def __init__(self, queue_size = 256, heartbeat = 15.0, max_subscribers = 4):
+        self.json = None
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._subscriptions = set()
+        self._by_greenhouse = {}
+        self._everything = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._counters = {'published': 0, 'delivered': 0}
+
+
+    def init_app(self, app):
+        self.queue_size = app.config['STREAM_QUEUE_SIZE']
+        self.heartbeat = app.config['STREAM_HEARTBEAT']
+        self.max_subscribers = app.config['STREAM_MAX_SUBSCRIBERS']
+        self.json = app.json
+        change_feed.listen(self.on_change)
+
+
+    def subscribe(self, greenhouse_ids = None, kinds = None):
+        """
+        Registers a subscriber for the given greenhouses (all when None) and event kinds (all when None).
+        Returns None when STREAM_MAX_SUBSCRIBERS clients are already connected.
+        """
+        subscription = Subscription(greenhouse_ids, kinds, self.queue_size)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                return None
+            self._subscriptions.add(subscription)
+            if greenhouse_ids is None:
+                self._everything.add(subscription)
+            for greenhouse_id in greenhouse_ids or ():
+                self._by_greenhouse.setdefault(greenhouse_id, set()).add(subscription)
+        return subscription
+
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            self._everything.discard(subscription)
+            for greenhouse_id in subscription.greenhouse_ids or ():
+                subscribers = self._by_greenhouse.get(greenhouse_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_greenhouse[greenhouse_id]
+
+
+    def has_subscribers(self, greenhouse_id):
+        return bool(self._everything) or greenhouse_id in self._by_greenhouse
+
+
+    def publish(self, kind, greenhouse_id, body):
+        """Sends body (JSON bytes) as a 'kind' event to the subscribers of greenhouse_id."""
+        with self._lock:
+            subscribers = [
+                subscription for subscription in self._everything | self._by_greenhouse.get(greenhouse_id, set())
+                if subscription.kinds is None or kind in subscription.kinds
+            ]
+            if not subscribers:
+                return
+            event = f"id: {next(self._ids)}\nevent: {kind}\ndata: ".encode() + body + b"\n\n"
+            self._counters['published'] += 1
+            self._counters['delivered'] += len(subscribers)
+
+        for subscription in subscribers:
+            subscription.push(event)
+
+
+    def publish_data(self, kind, greenhouse_id, data):
+        """Like publish, for a dict; it is only encoded if someone follows the greenhouse."""
+        if self.has_subscribers(greenhouse_id):
+            self.publish(kind, greenhouse_id, self.json.dumps(data).encode())
+
+
+    def on_change(self, kind, greenhouse_ids, events):
+        """change_feed listener: passes rows written by other processes on to this process's clients."""
+        for greenhouse_id, data in events:
+            self.publish_data(kind, greenhouse_id, data)
+
+
+    def events(self, subscription):
+        """Yields the SSE byte stream for subscription, with a comment line as keep-alive, until the client disconnects."""
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                event = subscription.get(self.heartbeat)
+                yield event if event is not None else f": keep-alive {int(time.time())}\n\n".encode()
+        finally:
+            self.unsubscribe(subscription)
+
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscriptions)
+            return dict(
+                self._counters,
+                subscribers = len(subscribers),
+                queued = sum(len(subscription.events) for subscription in subscribers),
+                dropped = sum(subscription.dropped for subscription in subscribers)
+            )
+
+
+stream_hub = StreamHub()
@@ -0,0 +1,102 @@
+from collections import OrderedDict, namedtuple
+from models import Greenhouse
+from change_feed import change_feed
+import threading
+import time
+
+
+# Immutable copy of a greenhouse's setpoints, safe to share between requests and threads
+Targets = namedtuple('Targets', [
+    'id', 'target_temp', 'target_humidity', 'target_soil_moisture_pct',
+    'target_light', 'target_co_two', 'target_wind_speed', 'control_rules'
+])
+
+
+def targets_from(greenhouse):
+    return Targets(*(getattr(greenhouse, field) for field in Targets._fields))
+
+
+class TargetCache:
+    """
+    Bounded LRU cache of greenhouse target setpoints for the control path.
+    
+    Entries are invalidated explicitly when a greenhouse is updated or deleted in this process,
+    and by the change_feed notices ('targets', or None) other worker processes send for theirs.
+    An entry older than TARGET_CACHE_TTL seconds is reloaded in any case, which bounds how long
+    a stale setpoint can be used if a notice is lost while the broker is unreachable.
+    """
+    
+    def __init__(self, max_size = 1024, ttl = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        
+    def init_app(self, app):
+        self.max_size = app.config['TARGET_CACHE_SIZE']
+        self.ttl = app.config['TARGET_CACHE_TTL']
+        change_feed.listen(self.on_change)
+        
+        
+    def on_change(self, kind, greenhouse_ids, events):
+        """change_feed listener: drops the targets of greenhouses updated or deleted by other processes."""
+        if greenhouse_ids is None:
+            self.clear()
+        elif kind in (None, 'targets'):
+            for greenhouse_id in greenhouse_ids:
+                self.invalidate(greenhouse_id)
+                
+                
+    def _lookup(self, greenhouse_id, now):
+        entry = self._entries.get(greenhouse_id)
+        if entry is None or now - entry[1] > self.ttl:
+            return None
+        self._entries.move_to_end(greenhouse_id)
+        return entry[0]
+    
+    
+    def _store(self, targets, now):
+        self._entries[targets.id] = (targets, now)
+        self._entries.move_to_end(targets.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last = False)
+            
+            
+    def get(self, greenhouse_id):
+        """Returns the Targets of a greenhouse, or None if it does not exist."""
+        return self.get_many([greenhouse_id]).get(greenhouse_id)
+    
+    
+    def get_many(self, greenhouse_ids):
+        """Returns {greenhouse_id: Targets} for the existing greenhouses, loading all misses in one query."""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for greenhouse_id in greenhouse_ids:
+                targets = self._lookup(greenhouse_id, now)
+                if targets is not None:
+                    found[greenhouse_id] = targets
+                    
+        missing = [greenhouse_id for greenhouse_id in greenhouse_ids if greenhouse_id not in found]
+        if missing:
+            loaded = [targets_from(greenhouse) for greenhouse in Greenhouse.query.filter(Greenhouse.id.in_(missing)).all()]
+            with self._lock:
+                for targets in loaded:
+                    self._store(targets, now)
+                    found[targets.id] = targets
+                    
+        return found
+    
+    
+    def invalidate(self, greenhouse_id):
+        with self._lock:
+            self._entries.pop(greenhouse_id, None)
+            
+            
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+target_cache = TargetCache()
@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'simulations'))
+
+import socket
+import pytest
+from config import Config
+from app import create_app
+from database import db
+from models import Greenhouse
+from target_cache import target_cache
+from latest_state import latest_state
+from command_state import command_state
+from mqtt_bridge import mqtt_bridge
+from write_behind import write_behind
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope = 'session')
+def broker_port():
+    """Port of an in-process stub MQTT broker (simulations/stub_broker.py)."""
+    from stub_broker import StubBroker
+    port = closed_port()
+    StubBroker('127.0.0.1', port).start_in_thread()
+    return port
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Builds apps on a throw-away SQLite database, without background jobs and with the MQTT broker unreachable."""
+    apps = []
+
+    def make(**overrides):
+        settings = dict(SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(tmp_path / "greenhouse.db"), SQLALCHEMY_ENGINE_OPTIONS = {},
+                        BACKGROUND_JOBS = False, METRICS_ENABLED = False, CONTROL_WORKERS = 0, ARCHIVE_DIR = str(tmp_path / "archive"),
+                        MQTT_BROKER_HOST = '127.0.0.1', MQTT_BROKER_PORT = closed_port())
+        settings.update(overrides)
+        app = create_app(type('TestConfig', (Config,), settings))
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app
+
+    yield make
+
+    write_behind.stop()
+    mqtt_bridge.stop()
+    for cache in (target_cache, latest_state):
+        cache.clear()
+    for app in apps:
+        with app.app_context():
+            for greenhouse_id in db.session.scalars(db.select(Greenhouse.id)):
+                command_state.forget(greenhouse_id)
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def greenhouse_id(app):
+    with app.app_context():
+        greenhouse = Greenhouse("test", "bench", 25.0, 60.0, 40.0, 500.0, 400.0, 1.0)
+        db.session.add(greenhouse)
+        db.session.commit()
+        return greenhouse.id
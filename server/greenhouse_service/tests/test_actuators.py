@@ -0,0 +1,48 @@
+import itertools
+from database import db
+from models import ActuatorStatus, ACTUATOR_FIELDS, encode_state, decode_state
+
+OFF = {field: "OFF" for field in ACTUATOR_FIELDS}
+
+
+def stored_count(app):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count(ActuatorStatus.id)))
+
+
+def test_every_state_survives_the_bitmask():
+    for values in itertools.product(("ON", "OFF"), repeat = len(ACTUATOR_FIELDS)):
+        states = dict(zip(ACTUATOR_FIELDS, values))
+        assert decode_state(encode_state(states)) == states
+        status = ActuatorStatus(1, *values)
+        assert status.state == encode_state(states)
+        assert {field: getattr(status, field) for field in ACTUATOR_FIELDS} == states
+
+
+def test_repeated_status_is_not_stored_again(app, client, greenhouse_id):
+    first = client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = dict(OFF, fan_on = "ON"))
+    assert first.status_code == 201
+
+    again = client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = dict(OFF, fan_on = "ON"))
+    assert again.status_code == 200
+    assert again.get_json() == first.get_json()
+    assert stored_count(app) == 1
+
+    assert client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = OFF).status_code == 201
+    assert stored_count(app) == 2
+
+
+def test_batch_reports_repeated_statuses_as_unchanged(app, client, greenhouse_id):
+    client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = OFF)
+    response = client.post("/api/v1/actuator_status/batch", json = [
+        dict(OFF, greenhouse_id = greenhouse_id),
+        dict(OFF, greenhouse_id = greenhouse_id, heater_on = "ON"),
+        dict(OFF, greenhouse_id = greenhouse_id, heater_on = "ON")
+    ])
+    assert response.status_code == 201
+    assert [result["status"] for result in response.get_json()["results"]] == ["unchanged", "accepted", "unchanged"]
+    assert stored_count(app) == 2
+
+    response = client.post("/api/v1/actuator_status/batch", json = [dict(OFF, greenhouse_id = greenhouse_id, heater_on = "ON")])
+    assert response.status_code == 200
+    assert response.get_json()["unchanged"] == 1
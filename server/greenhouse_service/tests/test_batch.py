@@ -0,0 +1,52 @@
+from database import db
+from models import Readings, ACTUATOR_FIELDS
+
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+STATUS = {field: "ON" for field in ACTUATOR_FIELDS}
+
+
+def stored_readings(app):
+    with app.app_context():
+        return db.session.execute(db.select(db.func.count(Readings.id))).scalar()
+
+
+def test_batch_is_stored(app, client, greenhouse_id):
+    response = client.post("/api/v1/readings/batch", json = {"readings": [dict(READING, greenhouse_id = greenhouse_id)] * 3})
+    assert response.status_code == 201
+    assert response.get_json()["accepted"] == 3
+    assert stored_readings(app) == 3
+
+
+def test_batch_rejects_invalid_greenhouse_ids_per_item(app, client, greenhouse_id):
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = greenhouse_id),
+        dict(READING, greenhouse_id = [greenhouse_id]),
+        dict(READING, greenhouse_id = {"id": greenhouse_id}),
+        dict(READING, greenhouse_id = True),
+        dict(READING, greenhouse_id = greenhouse_id + 1)
+    ])
+    assert response.status_code == 207
+    results = response.get_json()["results"]
+    assert [result["status"] for result in results] == ["accepted"] + ["rejected"] * 4
+    assert results[1]["error"] == "'greenhouse_id' must be an integer"
+    assert results[4]["error"] == "Greenhouse not found"
+    assert stored_readings(app) == 1
+
+
+def test_all_rejected_batch_is_a_client_error(app, client, greenhouse_id):
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = greenhouse_id, temp_celsius = "warm"),
+        dict(READING, greenhouse_id = greenhouse_id + 1)
+    ])
+    assert response.status_code == 400
+    assert response.get_json()["accepted"] == 0
+    assert stored_readings(app) == 0
+
+
+def test_actuator_batch_rejects_invalid_greenhouse_ids_per_item(client, greenhouse_id):
+    response = client.post("/api/v1/actuator_status/batch", json = [
+        dict(STATUS, greenhouse_id = greenhouse_id),
+        dict(STATUS, greenhouse_id = [greenhouse_id])
+    ])
+    assert response.status_code == 207
+    assert [result["status"] for result in response.get_json()["results"]] == ["accepted", "rejected"]
@@ -0,0 +1,77 @@
+import numpy as np
+from command_state import CommandState
+from models import ACTUATOR_FIELDS
+
+OFF = np.zeros(len(ACTUATOR_FIELDS), dtype = bool)
+HEATER = ACTUATOR_FIELDS.index('heater_on')
+FAN = ACTUATOR_FIELDS.index('fan_on')
+
+
+def switched(*indexes):
+    row = OFF.copy()
+    row[list(indexes)] = True
+    return row
+
+
+def decide(state, row, now, greenhouse_id = 1):
+    """Plans one decision and publishes what it returns, like the control path; returns the published row or None."""
+    commands = state.plan([greenhouse_id], [row], ["fired"], now = now)
+    for command_id, command in commands:
+        state.published(command_id, command, now = now)
+    return commands[0][1] if commands else None
+
+
+def test_only_changed_commands_are_published():
+    state = CommandState(heartbeat = 300.0)
+    assert (decide(state, OFF, 0.0) == OFF).all()
+    assert decide(state, OFF, 10.0) is None
+    assert (decide(state, switched(FAN), 20.0) == switched(FAN)).all()
+    assert decide(state, switched(FAN), 30.0) is None
+    stats = state.stats()
+    assert (stats['published'], stats['suppressed'], stats['heartbeats']) == (2, 2, 0)
+    assert state.held([1, 2]) == ["fired", None]
+
+
+def test_unchanged_command_is_repeated_after_the_heartbeat():
+    state = CommandState(heartbeat = 60.0)
+    decide(state, OFF, 0.0)
+    assert decide(state, OFF, 59.0) is None
+    assert (decide(state, OFF, 60.0) == OFF).all()
+    assert decide(state, OFF, 119.0) is None
+    assert state.stats()['heartbeats'] == 1
+
+
+def test_heartbeat_zero_never_repeats():
+    state = CommandState(heartbeat = 0.0)
+    decide(state, OFF, 0.0)
+    assert decide(state, OFF, 1e6) is None
+
+
+def test_actuator_keeps_its_state_for_its_minimum_dwell():
+    state = CommandState(min_dwell = 30.0)
+    state.min_dwell[HEATER] = 120.0
+    decide(state, OFF, 0.0)
+    decide(state, switched(HEATER, FAN), 10.0)
+
+    # Both switched at 10 s: the fan may switch back after 30 s, the heater only after 120 s
+    assert decide(state, OFF, 20.0) is None
+    assert (decide(state, OFF, 40.0) == switched(HEATER)).all()
+    assert decide(state, OFF, 129.0) is None
+    assert (decide(state, OFF, 130.0) == OFF).all()
+    assert state.stats()['dwell_held'] == 3
+
+
+def test_without_publish_on_change_every_decision_is_published():
+    state = CommandState(publish_on_change = False)
+    for now in (0.0, 1.0, 2.0):
+        assert (decide(state, OFF, now) == OFF).all()
+    assert state.stats()['suppressed'] == 0
+
+
+def test_commands_observed_from_other_processes_are_not_published_again():
+    state = CommandState()
+    state.observe(1, {actuator: 'ON' if actuator == 'fan_on' else 'OFF' for actuator in ACTUATOR_FIELDS}, now = 0.0)
+    assert decide(state, switched(FAN), 1.0) is None
+
+    state.forget(1)
+    assert (decide(state, switched(FAN), 2.0) == switched(FAN)).all()
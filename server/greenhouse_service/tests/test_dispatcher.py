@@ -0,0 +1,72 @@
+import threading
+import time
+import pytest
+from dispatcher import ControlDispatcher, control_dispatcher
+
+
+def reading(timestamp = 0):
+    return {'timestamp': timestamp}
+
+
+@pytest.fixture
+def dispatcher(app):
+    dispatchers = []
+
+    def make(**settings):
+        dispatcher = ControlDispatcher(**settings)
+        dispatcher.app = app
+        dispatchers.append(dispatcher)
+        return dispatcher
+
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.stop(timeout = 1.0)
+
+
+def test_block_mode_waits_once_per_submit_many(dispatcher):
+    release = threading.Event()
+    control = dispatcher(max_pending = 1, workers = 1, block_timeout = 0.2)
+    control._process = lambda items: release.wait(5)
+    control.start()
+    try:
+        assert control.submit(1, reading())
+        time.sleep(0.05)
+        assert control.submit(2, reading())
+
+        started = time.monotonic()
+        assert control.submit_many([(greenhouse_id, reading(), None) for greenhouse_id in range(3, 13)]) == 0
+        assert time.monotonic() - started < 0.5
+        assert control.stats()['dropped'] == 10
+    finally:
+        release.set()
+
+
+def test_each_greenhouse_is_decided_by_one_worker(dispatcher):
+    threads = {}
+    lock = threading.Lock()
+
+    def process(items):
+        with lock:
+            for greenhouse_id, _, _ in items:
+                threads.setdefault(greenhouse_id, set()).add(threading.current_thread().name)
+        time.sleep(0.001)
+
+    control = dispatcher(workers = 3, drain_size = 2)
+    control._process = process
+    control.start()
+    for timestamp in range(20):
+        control.submit_many([(greenhouse_id, reading(timestamp), None) for greenhouse_id in range(9)])
+    control.stop()
+
+    assert sorted(threads) == list(range(9))
+    for greenhouse_id, names in threads.items():
+        assert names == {f"control-dispatcher-{greenhouse_id % 3}"}
+
+
+def test_deleted_greenhouses_are_counted_not_processed(app):
+    before = control_dispatcher.stats()
+    with app.app_context():
+        assert control_dispatcher.submit(999, {'timestamp': 0, 'temp_celsius': 21.0})
+    after = control_dispatcher.stats()
+    assert after['unknown_greenhouse'] - before['unknown_greenhouse'] == 1
+    assert after['processed'] == before['processed']
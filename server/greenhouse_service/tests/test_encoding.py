@@ -0,0 +1,79 @@
+import datetime
+import gzip
+import json
+import brotli
+import msgpack
+import pytest
+from models import Readings
+from pagination import parse_fields
+
+START = datetime.datetime(2026, 10, 18, 10, 0)
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+DECODERS = {"br": brotli.decompress, "gzip": gzip.decompress}
+
+
+@pytest.fixture
+def history(client, greenhouse_id):
+    """Enough readings for the response to be over RESPONSE_COMPRESS_MIN_SIZE."""
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = greenhouse_id, temp_celsius = 20.0 + index / 10, timestamp = (START + datetime.timedelta(minutes = index)).isoformat())
+        for index in range(30)
+    ])
+    assert response.status_code == 201
+
+
+def get(client, greenhouse_id, headers = None, **args):
+    """Returns the decoded body and the response of a history request."""
+    response = client.get(f"/api/v1/readings/{greenhouse_id}/all", query_string = args, headers = headers or {})
+    assert response.status_code == 200, response.data
+    body = response.data
+    encoding = response.headers.get("Content-Encoding")
+    if encoding:
+        body = DECODERS[encoding](body)
+    if response.mimetype == "application/msgpack":
+        return msgpack.unpackb(body, raw = False), response
+    return json.loads(body), response
+
+
+@pytest.mark.parametrize("headers", [
+    {"Accept": "application/msgpack"},
+    {"Accept-Encoding": "gzip"},
+    {"Accept-Encoding": "br"},
+    {"Accept-Encoding": "gzip;q=0.5, br;q=1.0"},
+    {"Accept": "application/msgpack", "Accept-Encoding": "br"}
+])
+def test_negotiated_encodings_decode_to_the_plain_json_rows(client, greenhouse_id, history, headers):
+    plain, _ = get(client, greenhouse_id)
+    assert len(plain["data"]) == 30
+
+    negotiated, response = get(client, greenhouse_id, headers)
+    assert negotiated == plain
+    if "Accept-Encoding" in headers:
+        assert response.headers["Content-Encoding"] == ("gzip" if headers["Accept-Encoding"] == "gzip" else "br")
+    assert {"Accept", "Accept-Encoding"} <= set(response.vary)
+
+
+def test_small_responses_are_not_compressed(client, greenhouse_id, history):
+    _, response = get(client, greenhouse_id, {"Accept-Encoding": "gzip"}, limit = 1)
+    assert "Content-Encoding" not in response.headers
+
+
+@pytest.mark.parametrize("headers", [None, {"Accept": "application/msgpack", "Accept-Encoding": "gzip"}])
+def test_columnar_layout_holds_the_same_rows(client, greenhouse_id, history, headers):
+    plain, _ = get(client, greenhouse_id, limit = 10)
+    columnar, _ = get(client, greenhouse_id, headers, limit = 10, format = "columnar")
+
+    columns = columnar["columns"]
+    timestamps = columns.pop("timestamp")
+    # Rows are keyed by the serialized names, columns by the column names
+    names = dict((column, key) for key, column in parse_fields(Readings, None) if column != "timestamp")
+    rows = [{names[column]: value for column, value in zip(columns, values)} for values in zip(*columns.values())]
+    assert rows == [{key: value for key, value in row.items() if key != "timestamp"} for row in plain["data"]]
+    assert timestamps == [(START + datetime.timedelta(minutes = minute)).isoformat() for minute in range(29, 19, -1)]
+    assert columnar["next_cursor"] == plain["next_cursor"]
+
+
+def test_unknown_format_is_rejected(client, greenhouse_id):
+    response = client.get(f"/api/v1/readings/{greenhouse_id}/all", query_string = {"format": "csv"})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("'format' must be one of")
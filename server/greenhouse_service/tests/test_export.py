@@ -0,0 +1,98 @@
+import csv
+import datetime
+import io
+import pyarrow.parquet
+import pytest
+from models import Greenhouse, ACTUATOR_FIELDS, READING_FIELDS
+from database import db
+
+START = datetime.datetime(2026, 10, 18, 10, 0)
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+OFF = {field: "OFF" for field in ACTUATOR_FIELDS}
+
+
+@pytest.fixture
+def app(make_app):
+    """Small chunks, so every export spans several of them."""
+    return make_app(EXPORT_CHUNK_SIZE = 2)
+
+
+@pytest.fixture
+def greenhouses(app, client, greenhouse_id):
+    """Two greenhouses with five readings each, posted newest first; returns their ids."""
+    with app.app_context():
+        other = Greenhouse("other", "bench", 25.0, 60.0, 40.0, 500.0, 400.0, 1.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = gid, temp_celsius = gid * 10.0 + minute, timestamp = (START + datetime.timedelta(minutes = minute)).isoformat())
+        for gid in (other_id, greenhouse_id) for minute in range(4, -1, -1)
+    ])
+    assert response.status_code == 201
+    return greenhouse_id, other_id
+
+
+def export(client, table, **args):
+    response = client.get(f"/api/v1/export/{table}", query_string = args)
+    assert response.status_code == 200, response.data
+    assert response.headers["Content-Disposition"].startswith(f'attachment; filename="{table}-')
+    return response
+
+
+def read_csv(response):
+    assert response.mimetype == "text/csv"
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text = True))))
+
+
+def test_csv_export_holds_every_reading_by_greenhouse_then_time(client, greenhouses):
+    rows = read_csv(export(client, "readings"))
+    assert list(rows[0]) == ["id", "greenhouse_id", "timestamp", *READING_FIELDS]
+    expected = [(gid, START + datetime.timedelta(minutes = minute), gid * 10.0 + minute) for gid in sorted(greenhouses) for minute in range(5)]
+    assert [(int(row["greenhouse_id"]), datetime.datetime.fromisoformat(row["timestamp"]), float(row["temp_celsius"])) for row in rows] == expected
+
+
+def test_csv_export_filters_and_selects_columns(client, greenhouses):
+    greenhouse_id, _ = greenhouses
+    rows = read_csv(export(client, "readings", greenhouse_ids = str(greenhouse_id), fields = "timestamp,temp_celsius",
+                           since = (START + datetime.timedelta(minutes = 1)).isoformat(), until = (START + datetime.timedelta(minutes = 3)).isoformat()))
+    assert rows == [
+        {"timestamp": str(START + datetime.timedelta(minutes = minute)), "temp_celsius": str(greenhouse_id * 10.0 + minute)}
+        for minute in (1, 2, 3)
+    ]
+
+
+def test_parquet_export_matches_the_csv_export(client, greenhouses):
+    response = export(client, "readings", format = "parquet")
+    assert response.mimetype == "application/vnd.apache.parquet"
+    parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(response.data))
+    assert parquet_file.metadata.num_row_groups == 5
+    table = parquet_file.read()
+
+    rows = read_csv(export(client, "readings"))
+    assert table.column_names == list(rows[0])
+    assert table.column("timestamp").to_pylist() == [datetime.datetime.fromisoformat(row["timestamp"]) for row in rows]
+    assert table.column("id").to_pylist() == [int(row["id"]) for row in rows]
+    for field in READING_FIELDS:
+        assert table.column(field).to_pylist() == [float(row[field]) for row in rows]
+
+
+@pytest.mark.parametrize("format", ["csv", "parquet"])
+def test_actuator_states_are_exported_as_on_off(client, greenhouse_id, format):
+    assert client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = dict(OFF, heater_on = "ON")).status_code == 201
+    response = export(client, "actuator_status", format = format, fields = "heater_on,fan_on")
+    if format == "csv":
+        assert read_csv(response) == [{"heater_on": "ON", "fan_on": "OFF"}]
+    else:
+        assert pyarrow.parquet.read_table(io.BytesIO(response.data)).to_pylist() == [{"heater_on": "ON", "fan_on": "OFF"}]
+
+
+@pytest.mark.parametrize("table, args, error", [
+    ("greenhouse", {}, "Table must be one of"),
+    ("readings", {"format": "xlsx"}, "'format' must be one of"),
+    ("readings", {"fields": "pressure"}, "Unknown field 'pressure'")
+])
+def test_invalid_exports_are_rejected(client, table, args, error):
+    response = client.get(f"/api/v1/export/{table}", query_string = args)
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith(error)
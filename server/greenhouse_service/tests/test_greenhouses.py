@@ -0,0 +1,38 @@
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+SUMMARY_KEYS = {"id", "name", "location", "target_temp", "target_humidity", "target_soil_moisture_pct", "target_light",
+                "target_CO2", "target_wind_speed", "control_rules", "latest_reading", "latest_actuator_status"}
+
+
+def post_readings(client, greenhouse_id, count):
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = greenhouse_id, temp_celsius = float(minute), timestamp = f"2026-10-18T10:{minute:02d}:00")
+        for minute in range(count)
+    ])
+    assert response.status_code == 201
+
+
+def test_summary_carries_only_the_newest_reading_and_status(client, greenhouse_id):
+    post_readings(client, greenhouse_id, 5)
+    response = client.get(f"/api/v1/greenhouse/{greenhouse_id}")
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert set(summary) == SUMMARY_KEYS
+    assert summary["latest_reading"]["temp_celsius"] == 4.0
+    assert summary["latest_actuator_status"] is None
+
+    listed = client.get("/api/v1/greenhouse/").get_json()
+    assert listed == [summary]
+
+
+def test_include_adds_a_bounded_page_of_history(client, greenhouse_id):
+    post_readings(client, greenhouse_id, 5)
+    summary = client.get(f"/api/v1/greenhouse/{greenhouse_id}", query_string = {"include": "readings", "limit": 2, "fields": "temp_celsius"}).get_json()
+    assert set(summary) == SUMMARY_KEYS | {"Readings"}
+    assert summary["Readings"]["data"] == [{"temp_celsius": 4.0}, {"temp_celsius": 3.0}]
+    assert summary["Readings"]["next_cursor"] is not None
+
+
+def test_unknown_include_is_rejected(client, greenhouse_id):
+    response = client.get(f"/api/v1/greenhouse/{greenhouse_id}", query_string = {"include": "history"})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Unknown include 'history'"
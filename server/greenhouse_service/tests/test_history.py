@@ -0,0 +1,57 @@
+import datetime
+import pytest
+
+START = datetime.datetime(2026, 10, 18, 10, 0)
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+
+
+@pytest.fixture
+def history(client, greenhouse_id):
+    """Six readings a minute apart, the last two sharing a timestamp; returns their temperatures, newest first."""
+    minutes = [0, 1, 2, 3, 4, 4]
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = greenhouse_id, temp_celsius = float(index), timestamp = (START + datetime.timedelta(minutes = minute)).isoformat())
+        for index, minute in enumerate(minutes)
+    ])
+    assert response.status_code == 201
+    return [5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
+
+
+def page(client, greenhouse_id, **args):
+    response = client.get(f"/api/v1/readings/{greenhouse_id}/all", query_string = args)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_cursor_walks_every_row_once_newest_first(client, greenhouse_id, history):
+    temps, cursor = [], None
+    while True:
+        result = page(client, greenhouse_id, limit = 2, **({"cursor": cursor} if cursor else {}))
+        temps += [row["temp_celsius"] for row in result["data"]]
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+    assert temps == history
+
+
+def test_fields_select_only_the_requested_columns(client, greenhouse_id, history):
+    result = page(client, greenhouse_id, fields = "temp_celsius,co_two", limit = 1)
+    assert result["data"] == [{"temp_celsius": 5.0, "CO2": 400.0}]
+
+
+def test_since_and_until_are_inclusive(client, greenhouse_id, history):
+    result = page(client, greenhouse_id, since = (START + datetime.timedelta(minutes = 1)).isoformat(),
+                  until = (START + datetime.timedelta(minutes = 3)).isoformat(), fields = "temp_celsius")
+    assert [row["temp_celsius"] for row in result["data"]] == [3.0, 2.0, 1.0]
+
+
+@pytest.mark.parametrize("args, error", [
+    ({"cursor": "not-a-cursor"}, "'cursor' is not valid"),
+    ({"limit": "0"}, "'limit' must be between 1 and"),
+    ({"fields": "pressure"}, "Unknown field 'pressure'"),
+    ({"since": "yesterday"}, "'since' must be an ISO 8601 timestamp")
+])
+def test_invalid_arguments_are_rejected(client, greenhouse_id, args, error):
+    response = client.get(f"/api/v1/readings/{greenhouse_id}/all", query_string = args)
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith(error)
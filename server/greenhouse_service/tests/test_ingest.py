@@ -0,0 +1,97 @@
+import datetime
+from database import db
+from models import Readings, ACTUATOR_FIELDS
+
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+
+
+def stored_timestamps(app):
+    with app.app_context():
+        return list(db.session.scalars(db.select(Readings.timestamp).order_by(Readings.id)))
+
+
+def test_aware_timestamp_is_stored_as_local_time(app, client, greenhouse_id):
+    aware = datetime.datetime(2026, 10, 18, 10, 0, tzinfo = datetime.timezone(datetime.timedelta(hours = 2)))
+    response = client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, timestamp = aware.isoformat()))
+    assert response.status_code == 201
+
+    assert stored_timestamps(app) == [aware.astimezone().replace(tzinfo = None)]
+
+
+def test_plain_reading_after_aware_one_is_stored(app, client, greenhouse_id):
+    client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, timestamp = "2026-10-18T10:00:00+02:00"))
+    response = client.post(f"/api/v1/readings/{greenhouse_id}", json = READING)
+    assert response.status_code == 201
+    assert len(stored_timestamps(app)) == 2
+
+    latest = client.get(f"/api/v1/readings/{greenhouse_id}/latest")
+    assert latest.status_code == 200
+
+
+def test_batch_mixing_aware_and_naive_timestamps(app, client, greenhouse_id):
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = greenhouse_id, timestamp = "2026-10-18T10:00:00+00:00"),
+        dict(READING, greenhouse_id = greenhouse_id, timestamp = "2026-10-18T10:00:01")
+    ])
+    assert response.status_code == 201
+    assert all(timestamp.tzinfo is None for timestamp in stored_timestamps(app))
+
+
+def test_invalid_timestamp_is_rejected(client, greenhouse_id):
+    response = client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, timestamp = "yesterday"))
+    assert response.status_code == 400
+
+
+def test_aware_query_parameters_are_accepted(client, greenhouse_id):
+    client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, timestamp = "2026-10-18T10:00:00"))
+    response = client.get(f"/api/v1/readings/{greenhouse_id}/all", query_string = {"since": "2026-10-18T00:00:00+00:00"})
+    assert response.status_code == 200
+
+
+def test_reading_for_unknown_greenhouse_is_not_found(app, client):
+    response = client.post("/api/v1/readings/999", json = READING)
+    assert response.status_code == 404
+    assert stored_timestamps(app) == []
+
+
+def test_failed_reading_is_a_server_error(app, client, greenhouse_id, monkeypatch):
+    import Readings_API
+
+    def fail(rows):
+        raise RuntimeError("rollup table is gone")
+    monkeypatch.setattr(Readings_API, "record_readings", fail)
+
+    response = client.post(f"/api/v1/readings/{greenhouse_id}", json = READING)
+    assert response.status_code == 500
+    assert stored_timestamps(app) == []
+
+
+def test_status_for_unknown_greenhouse_is_not_found(client):
+    status = {field: "OFF" for field in ACTUATOR_FIELDS}
+    assert client.post("/api/v1/actuator_status/999", json = status).status_code == 404
+
+
+def test_failed_commit_is_not_served_from_latest(app, client, greenhouse_id, monkeypatch):
+    assert client.post(f"/api/v1/readings/{greenhouse_id}", json = READING).status_code == 201
+    assert client.get(f"/api/v1/readings/{greenhouse_id}/latest").get_json()["temp_celsius"] == 21.0
+
+    def fail():
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db.session, "commit", fail)
+    assert client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, temp_celsius = 30.0)).status_code == 500
+    monkeypatch.undo()
+
+    assert client.get(f"/api/v1/readings/{greenhouse_id}/latest").get_json()["temp_celsius"] == 21.0
+
+
+def test_failed_status_commit_is_not_served_from_latest(app, client, greenhouse_id, monkeypatch):
+    status = {field: "OFF" for field in ACTUATOR_FIELDS}
+    assert client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = status).status_code == 201
+
+    def fail():
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db.session, "commit", fail)
+    assert client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = dict(status, fan_on = "ON")).status_code == 500
+    monkeypatch.undo()
+
+    assert client.get(f"/api/v1/actuator_status/{greenhouse_id}/latest").get_json()["fan_on"] == "OFF"
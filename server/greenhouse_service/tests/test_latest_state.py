@@ -0,0 +1,144 @@
+import datetime
+import json
+import time
+import uuid
+import paho.mqtt.client as mqtt
+import pytest
+from database import db
+from models import Greenhouse, Readings
+from change_feed import change_feed, CHANGE_TOPIC
+from mqtt_bridge import mqtt_bridge
+
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+
+
+def wait_for(condition, timeout = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def write_elsewhere(app, greenhouse_id, temp_celsius):
+    """Inserts a reading the way another worker process would: this process's snapshot is not told."""
+    with app.app_context():
+        db.session.execute(db.insert(Readings), [dict(READING, greenhouse_id = greenhouse_id, temp_celsius = temp_celsius, timestamp = datetime.datetime.now())])
+        db.session.commit()
+
+
+def add_greenhouses(app, count = 1):
+    with app.app_context():
+        greenhouses = [Greenhouse(f"test_{i}", "bench", 25.0, 60.0, 40.0, 500.0, 400.0, 1.0) for i in range(count)]
+        db.session.add_all(greenhouses)
+        db.session.commit()
+        return [greenhouse.id for greenhouse in greenhouses]
+
+
+def latest_temp(client, greenhouse_id):
+    response = client.get(f"/api/v1/readings/{greenhouse_id}/latest")
+    assert response.status_code == 200
+    return response.get_json()["temp_celsius"]
+
+
+@pytest.fixture
+def other_process(broker_port):
+    """A second MQTT client publishing change notices as another worker process would."""
+    origin = f"other-worker-{uuid.uuid4().hex[:6]}"
+    publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id = origin)
+    publisher.connect('127.0.0.1', broker_port)
+    publisher.loop_start()
+
+    def notice(sequence, greenhouse_ids, kind = 'readings'):
+        message = {"origin": origin, "sequence": sequence, "kind": kind, "greenhouse_ids": greenhouse_ids}
+        publisher.publish(CHANGE_TOPIC, json.dumps(message), qos = 1).wait_for_publish(5)
+
+    yield notice
+    publisher.loop_stop()
+    publisher.disconnect()
+
+
+@pytest.fixture
+def live_app(make_app, broker_port):
+    app = make_app(MQTT_BROKER_PORT = broker_port, LATEST_SNAPSHOT_TTL = 0.0, TARGET_CACHE_TTL = 60.0)
+    wait_for(lambda: change_feed.live_since() is not None)
+    return app
+
+
+def test_snapshot_is_reloaded_after_ttl_without_change_feed(make_app):
+    app = make_app(LATEST_SNAPSHOT_TTL = 0.0)
+    greenhouse_id, = add_greenhouses(app)
+    client = app.test_client()
+    client.post(f"/api/v1/readings/{greenhouse_id}", json = READING)
+    assert latest_temp(client, greenhouse_id) == 21.0
+
+    write_elsewhere(app, greenhouse_id, 30.0)
+    assert latest_temp(client, greenhouse_id) == 30.0
+
+
+def test_live_feed_serves_unchanged_snapshot_without_reloading(live_app, other_process):
+    greenhouse_id, = add_greenhouses(live_app)
+    client = live_app.test_client()
+    client.post(f"/api/v1/readings/{greenhouse_id}", json = READING)
+    assert latest_temp(client, greenhouse_id) == 21.0
+
+    # Far past the TTL, but nothing was announced: still the snapshot
+    write_elsewhere(live_app, greenhouse_id, 30.0)
+    time.sleep(0.05)
+    assert latest_temp(client, greenhouse_id) == 21.0
+
+    other_process(1, [greenhouse_id])
+    wait_for(lambda: latest_temp(client, greenhouse_id) == 30.0)
+
+
+def test_gap_in_notices_drops_every_snapshot(live_app, other_process):
+    first, second = add_greenhouses(live_app, 2)
+    client = live_app.test_client()
+    for greenhouse_id in (first, second):
+        client.post(f"/api/v1/readings/{greenhouse_id}", json = READING)
+        assert latest_temp(client, greenhouse_id) == 21.0
+
+    write_elsewhere(live_app, second, 30.0)
+    other_process(1, [first])
+    # Notice 2, about the second greenhouse, never arrives
+    other_process(3, [first])
+    wait_for(lambda: latest_temp(client, second) == 30.0)
+
+
+def test_notices_are_not_queued_while_the_broker_is_unreachable(app, client, greenhouse_id):
+    before = change_feed.stats()
+    assert client.post(f"/api/v1/readings/{greenhouse_id}", json = READING).status_code == 201
+    after = change_feed.stats()
+    assert (after['failed'] - before['failed'], after['sent'] - before['sent']) == (1, 0)
+    # paho keeps QoS 1 messages it could not send in its outgoing queue until reconnecting
+    assert not mqtt_bridge.get_client()._out_messages
+
+
+def test_targets_updated_by_another_process_are_reloaded(live_app, other_process):
+    from target_cache import target_cache
+    greenhouse_id, = add_greenhouses(live_app)
+    with live_app.app_context():
+        assert target_cache.get(greenhouse_id).target_temp == 25.0
+        db.session.execute(db.update(Greenhouse).where(Greenhouse.id == greenhouse_id).values(target_temp = 18.0))
+        db.session.commit()
+        assert target_cache.get(greenhouse_id).target_temp == 25.0
+
+        other_process(1, [greenhouse_id], kind = 'targets')
+        wait_for(lambda: target_cache.get(greenhouse_id).target_temp == 18.0)
+
+
+def test_target_update_is_announced(live_app, broker_port):
+    greenhouse_id, = add_greenhouses(live_app)
+    received = []
+    listener = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    listener.on_message = lambda client, userdata, msg: received.append(json.loads(msg.payload))
+    listener.connect('127.0.0.1', broker_port)
+    listener.subscribe(CHANGE_TOPIC, qos = 1)
+    listener.loop_start()
+    try:
+        time.sleep(0.2)
+        response = live_app.test_client().put(f"/api/v1/greenhouse/{greenhouse_id}", json = {"target_temp": 18.0})
+        assert response.status_code == 200
+        wait_for(lambda: any(message.get('kind') == 'targets' and message['greenhouse_ids'] == [greenhouse_id] for message in received))
+    finally:
+        listener.loop_stop()
+        listener.disconnect()
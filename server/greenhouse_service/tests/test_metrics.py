@@ -0,0 +1,67 @@
+import threading
+from metrics import Counter, Histogram
+
+
+def run_threads(target, count):
+    for _ in range(count):
+        thread = threading.Thread(target = target)
+        thread.start()
+        thread.join()
+
+
+def test_shards_of_ended_threads_are_folded_into_the_totals():
+    counter = Counter('test_total', 'Test counter', ('kind',))
+    histogram = Histogram('test_seconds', 'Test histogram', buckets = (0.1, 1.0))
+
+    def work():
+        counter.inc(1, ('a',))
+        histogram.observe(0.5)
+    run_threads(work, 50)
+    work()
+
+    assert len(counter._shards) == len(histogram._shards) == 1
+    assert 'test_total{kind="a"} 51' in counter.render()
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 0', 'test_seconds_bucket{le="1"} 51', 'test_seconds_bucket{le="+Inf"} 51',
+        'test_seconds_sum 25.5', 'test_seconds_count 51'
+    ]
+
+
+def scrape(client):
+    """Returns the /metrics samples as {'name{labels}': value} and the declared {name: type}."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    samples, types = {}, {}
+    for line in response.get_data(as_text = True).splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+        elif line and not line.startswith("#"):
+            sample, value = line.rsplit(" ", 1)
+            samples[sample] = float(value)
+    return samples, types
+
+
+def test_metrics_exposition_counts_requests_and_queries(make_app, greenhouse_id):
+    client = make_app(METRICS_ENABLED = True).test_client()
+    endpoint = 'endpoint="/api/v1/greenhouse/<int:greenhouse_id>"'
+    before, _ = scrape(client)
+    for _ in range(3):
+        assert client.get(f"/api/v1/greenhouse/{greenhouse_id}").status_code == 200
+    assert client.get("/api/v1/greenhouse/999").status_code == 404
+    after, types = scrape(client)
+
+    def increase(sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+    assert increase(f'greenhouse_http_requests_total{{method="GET",{endpoint},status="200"}}') == 3
+    assert increase(f'greenhouse_http_requests_total{{method="GET",{endpoint},status="404"}}') == 1
+    assert increase(f'greenhouse_http_request_duration_seconds_count{{method="GET",{endpoint}}}') == 4
+    assert increase(f'greenhouse_db_queries_per_request_count{{{endpoint}}}') == 4
+    assert increase(f'greenhouse_db_queries_per_request_sum{{{endpoint}}}') >= 4
+    assert increase('greenhouse_db_query_duration_seconds_count') >= 4
+
+    assert types['greenhouse_http_requests_total'] == 'counter'
+    assert types['greenhouse_http_request_duration_seconds'] == 'histogram'
+    assert types['greenhouse_control_queue_depth'] == 'gauge'
+    assert 'greenhouse_control_events_total{outcome="unknown_greenhouse"}' in after
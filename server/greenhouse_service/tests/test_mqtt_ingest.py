@@ -0,0 +1,15 @@
+import os
+import socket
+from mqtt_ingest import client_id
+
+CONFIG = {'MQTT_INGEST_CLIENT_ID': 'GreenhouseIngest', 'MQTT_INGEST_SHARE_GROUP': '', 'MQTT_INGEST_INSTANCE': ''}
+
+
+def test_client_id_is_fixed_without_share_group():
+    assert client_id(CONFIG) == 'GreenhouseIngest'
+
+
+def test_client_ids_differ_per_process_in_share_group():
+    config = dict(CONFIG, MQTT_INGEST_SHARE_GROUP = 'ingest')
+    assert client_id(config) == f"GreenhouseIngest-{socket.gethostname()}-{os.getpid()}"
+    assert client_id(dict(config, MQTT_INGEST_INSTANCE = 'node-a-0')) == 'GreenhouseIngest-node-a-0'
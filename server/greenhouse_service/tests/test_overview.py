@@ -0,0 +1,74 @@
+import pytest
+from database import db
+from models import Greenhouse, ACTUATOR_FIELDS
+
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+# Overview reading key -> target key, as in the greenhouse summary
+TARGETS = {"temp_celsius": "target_temp", "humidity_pct": "target_humidity", "soil_moisture_pct": "target_soil_moisture_pct",
+           "light_lux": "target_light", "CO2": "target_CO2", "wind speed": "target_wind_speed"}
+
+
+@pytest.fixture
+def fleet(app, client, greenhouse_id):
+    """Three greenhouses: with readings and statuses, with readings only (two sharing the newest timestamp), with neither."""
+    with app.app_context():
+        others = [Greenhouse(name, "field", 20.0, 70.0, 30.0, 800.0, 600.0, 2.0) for name in ("readings only", "empty")]
+        db.session.add_all(others)
+        db.session.commit()
+        readings_only, empty = (greenhouse.id for greenhouse in others)
+
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(READING, greenhouse_id = gid, temp_celsius = temp, timestamp = timestamp)
+        for gid, temp, timestamp in [
+            (greenhouse_id, 24.0, "2026-10-18T10:05:00"), (greenhouse_id, 22.0, "2026-10-18T10:00:00"),
+            (readings_only, 18.0, "2026-10-18T10:05:00"), (readings_only, 19.5, "2026-10-18T10:05:00"), (readings_only, 30.0, "2026-10-18T09:00:00")
+        ]
+    ])
+    assert response.status_code == 201
+    for heater in ("ON", "OFF"):
+        status = dict({field: "OFF" for field in ACTUATOR_FIELDS}, heater_on = heater)
+        assert client.post(f"/api/v1/actuator_status/{greenhouse_id}", json = status).status_code == 201
+    return [greenhouse_id, readings_only, empty]
+
+
+def latest(client, path):
+    response = client.get(path)
+    return response.get_json() if response.status_code == 200 else None
+
+
+def test_overview_matches_the_per_greenhouse_endpoints(client, fleet):
+    response = client.get("/api/v1/greenhouse/overview")
+    assert response.status_code == 200
+    overview = response.get_json()
+    assert [item["id"] for item in overview] == fleet
+
+    for item in overview:
+        gid = item["id"]
+        summary = client.get(f"/api/v1/greenhouse/{gid}").get_json()
+        reading = latest(client, f"/api/v1/readings/{gid}/latest")
+        status = latest(client, f"/api/v1/actuator_status/{gid}/latest")
+        assert summary["latest_reading"] == reading and summary["latest_actuator_status"] == status
+
+        assert {key: value for key, value in item.items() if key not in ("latest_reading", "latest_actuator_status", "deviation")} == \
+            {key: value for key, value in summary.items() if key not in ("latest_reading", "latest_actuator_status", "control_rules")}
+        if reading is None:
+            assert item["latest_reading"] is None and item["deviation"] is None
+        else:
+            assert item["latest_reading"] == {key: value for key, value in reading.items() if key != "greenhouse id"}
+            assert item["deviation"] == pytest.approx({key: reading[key] - summary[target] for key, target in TARGETS.items()})
+        if status is None:
+            assert item["latest_actuator_status"] is None
+        else:
+            assert item["latest_actuator_status"] == {key: value for key, value in status.items() if key != "greenhouse_id"}
+
+    newest = {item["id"]: item["latest_reading"] and item["latest_reading"]["temp_celsius"] for item in overview}
+    assert newest == {fleet[0]: 24.0, fleet[1]: 19.5, fleet[2]: None}
+    assert overview[0]["latest_actuator_status"]["heater_on"] == "OFF"
+
+
+def test_overview_can_be_limited_to_some_greenhouses(client, fleet):
+    response = client.get("/api/v1/greenhouse/overview", query_string = {"greenhouse_ids": f"{fleet[2]},{fleet[0]}"})
+    assert [item["id"] for item in response.get_json()] == [fleet[0], fleet[2]]
+
+    response = client.get("/api/v1/greenhouse/overview", query_string = {"greenhouse_ids": "one"})
+    assert response.status_code == 400
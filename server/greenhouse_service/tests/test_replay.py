@@ -0,0 +1,98 @@
+import datetime
+import numpy as np
+import pytest
+from command_state import CommandState
+from models import READING_FIELDS, ACTUATOR_FIELDS
+from replay import apply_dwell, configured_dwell, fired_rules, summarize
+from rules import TARGET_FIELDS, compile_rules, decide_held
+from target_cache import Targets
+
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+
+
+def replay(client, greenhouse_id, **body):
+    return client.post(f"/api/v1/greenhouse/{greenhouse_id}/replay", json = dict({"since": "2026-10-18T00:00:00", "until": "2026-10-19T00:00:00"}, **body))
+
+
+def test_replay_accepts_target_names_of_the_create_endpoint(client, greenhouse_id):
+    client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, timestamp = "2026-10-18T10:00:00"))
+    response = replay(client, greenhouse_id, target_CO2 = 900.0, target_temp = 18.0)
+    assert response.status_code == 200
+    targets = response.get_json()["targets"]
+    assert (targets["target_co_two"], targets["target_temp"]) == (900.0, 18.0)
+
+
+def test_replay_rejects_unknown_targets(client, greenhouse_id):
+    response = replay(client, greenhouse_id, target_pressure = 1.0)
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Unknown target 'target_pressure'")
+
+
+TARGETS = Targets(1, 25.0, 60.0, 40.0, 500.0, 400.0, 1.0, None)
+# Noise per sensor, about half the rule margins so the hysteresis bands are crossed often
+STEPS = {"temp_celsius": 1.0, "humidity_pct": 2.5, "soil_moisture_pct": 2.5, "light_lux": 50.0, "co_two": 25.0, "wind_speed": 0.25}
+DWELL = np.array([120.0 if actuator == "heater_on" else 30.0 for actuator in ACTUATOR_FIELDS])
+
+
+def random_history(count, seed):
+    """Readings wandering around TARGETS and drawn back to them, 5 to 60 whole seconds apart."""
+    generator = np.random.default_rng(seed)
+    times = 1.79e9 + np.cumsum(generator.integers(5, 61, count)).astype(float)
+    targets = np.array([getattr(TARGETS, field) for field in TARGET_FIELDS])
+    noise = generator.normal(0.0, [STEPS[field] for field in READING_FIELDS], (count, len(READING_FIELDS)))
+    readings = np.empty_like(noise)
+    deviation = np.zeros(len(READING_FIELDS))
+    for index, step in enumerate(noise):
+        deviation = 0.9 * deviation + step
+        readings[index] = targets + deviation
+    return times, readings
+
+
+def live_states(times, readings, min_dwell):
+    """The actuator states the live control path holds after every reading, and the commands it publishes."""
+    state = CommandState(heartbeat = 0.0)
+    state.min_dwell = min_dwell
+    current, rows, commands = None, [], 0
+    for now, values in zip(times, readings):
+        states, fired = decide_held([(dict(zip(READING_FIELDS, values)), TARGETS)], state.held([1]))
+        for greenhouse_id, row in state.plan([1], states, fired, now = now):
+            state.published(greenhouse_id, row, now = now)
+            current, commands = row, commands + 1
+        rows.append(current)
+    return np.array(rows), commands
+
+
+def replayed_states(times, readings, min_dwell):
+    compiled = compile_rules(None)
+    states = compiled.apply(*fired_rules(compiled, readings, [getattr(TARGETS, field) for field in TARGET_FIELDS]))
+    return apply_dwell(times, states, min_dwell)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("min_dwell", [np.zeros(len(ACTUATOR_FIELDS)), DWELL], ids = ["no-dwell", "dwell"])
+def test_replay_holds_the_states_of_the_live_control_path(seed, min_dwell):
+    times, readings = random_history(500, seed)
+    live, commands = live_states(times, readings, min_dwell)
+    replayed = replayed_states(times, readings, min_dwell)
+
+    assert np.diff(live, axis = 0).sum() > 50
+    np.testing.assert_array_equal(replayed, live)
+    assert summarize(times, replayed)["commands"] == commands
+
+
+def test_replay_endpoint_reports_the_live_control_path(app, client, greenhouse_id):
+    times, readings = random_history(200, 7)
+    start = datetime.datetime(2026, 10, 18)
+    response = client.post("/api/v1/readings/batch", json = [
+        dict(zip(READING_FIELDS, values), greenhouse_id = greenhouse_id, timestamp = (start + datetime.timedelta(seconds = now - times[0])).isoformat())
+        for now, values in zip(times.tolist(), readings.tolist())
+    ])
+    assert response.status_code == 201
+
+    response = replay(client, greenhouse_id)
+    assert response.status_code == 200
+    report = response.get_json()
+    with app.app_context():
+        live, _ = live_states(times, readings, configured_dwell())
+    assert report["readings"] == 200
+    assert report["current"] == summarize(times - times[0], live)
@@ -0,0 +1,63 @@
+import datetime
+import pytest
+import rollups
+from database import db
+from models import Readings, ReadingRollup
+from retention import archive_expired
+from rollups import rebuild
+
+START = datetime.datetime(2026, 10, 1)
+
+
+def post_days(client, greenhouse_id, days):
+    """Posts one reading every 6 hours for days days from START."""
+    response = client.post("/api/v1/readings/batch", json = [
+        {"greenhouse_id": greenhouse_id, "timestamp": (START + datetime.timedelta(hours = 6 * step)).isoformat(), "temp_celsius": 20.0 + step}
+        for step in range(4 * days)
+    ])
+    assert response.status_code == 201
+
+
+def daily_counts(greenhouse_id):
+    rows = db.session.execute(
+        db.select(ReadingRollup.bucket_start, ReadingRollup.count)
+        .where(ReadingRollup.greenhouse_id == greenhouse_id, ReadingRollup.bucket == '1d', ReadingRollup.metric == 'temp_celsius')
+        .order_by(ReadingRollup.bucket_start)
+    )
+    return dict(rows.all())
+
+
+def test_rebuild_matches_ingest_rollups(app, client, greenhouse_id):
+    post_days(client, greenhouse_id, 3)
+    with app.app_context():
+        before = daily_counts(greenhouse_id)
+        assert rebuild() == 12
+        assert daily_counts(greenhouse_id) == before == {START + datetime.timedelta(days = day): 4 for day in range(3)}
+
+
+def test_rebuild_after_retention_keeps_archived_history(app, client, greenhouse_id):
+    post_days(client, greenhouse_id, 3)
+    with app.app_context():
+        before = daily_counts(greenhouse_id)
+        # Archives the first day and a half, cutting the second day in two
+        assert archive_expired(Readings, START + datetime.timedelta(hours = 36)) == 6
+
+        rebuild()
+        assert daily_counts(greenhouse_id) == before
+
+        rebuild(greenhouse_id, since = START)
+        assert daily_counts(greenhouse_id) == before
+
+
+def test_ingest_skips_rollups_on_unsupported_databases(app, client, greenhouse_id, monkeypatch):
+    monkeypatch.setitem(rollups._inserts, 'sqlite', None)
+    post_days(client, greenhouse_id, 1)
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count(Readings.id))) == 4
+        assert daily_counts(greenhouse_id) == {}
+
+
+def test_rebuild_refuses_unsupported_databases(app, monkeypatch):
+    monkeypatch.setitem(rollups._inserts, 'sqlite', None)
+    with app.app_context(), pytest.raises(RuntimeError, match = "not supported on sqlite"):
+        rebuild()
@@ -0,0 +1,50 @@
+import pytest
+from benchmarks.bench_rules import legacy_decision, random_items
+from models import ACTUATOR_FIELDS, READING_FIELDS
+from rules import decide, decide_held, validate_rules
+from target_cache import Targets
+
+TARGETS = Targets(1, 25.0, 60.0, 40.0, 500.0, 400.0, 1.0, None)
+CALM = {"temp_celsius": 25.0, "humidity_pct": 60.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+HEATER = ACTUATOR_FIELDS.index("heater_on")
+
+
+def test_default_rules_match_the_original_if_chain():
+    items = random_items(2000)
+    # Values right at the margins, where > and >= would differ
+    items += [(dict(CALM, temp_celsius = temp), TARGETS) for temp in (22.999, 23.0, 27.0, 27.001)]
+    for (reading, targets), row in zip(items, decide(items)):
+        assert [legacy_decision(reading, targets)[actuator] == "ON" for actuator in ACTUATOR_FIELDS] == row.tolist()
+
+
+def test_missing_values_fire_no_rule():
+    states = decide([({field: None for field in READING_FIELDS}, TARGETS)])
+    assert not states.any()
+
+
+def test_hysteresis_holds_a_fired_rule_until_the_reading_crosses_back():
+    temps = [22.0, 23.5, 24.1, 23.5]
+    held, heater = [None], []
+    for temp in temps:
+        states, held = decide_held([(dict(CALM, temp_celsius = temp), TARGETS)], held)
+        heater.append(bool(states[0, HEATER]))
+    # Below 23 it starts; it stays on until above 24 (margin 2, hysteresis 1)
+    assert heater == [True, True, False, False]
+
+
+def test_greenhouses_can_have_their_own_rules():
+    rules = [{"sensor": "temp_celsius", "target": "target_temp", "margin": 0.5, "below": {"heater_on": "ON"}}]
+    own = TARGETS._replace(id = 2, control_rules = rules)
+    states = decide([(dict(CALM, temp_celsius = 24.0), TARGETS), (dict(CALM, temp_celsius = 24.0), own)])
+    assert states[:, HEATER].tolist() == [False, True]
+
+
+@pytest.mark.parametrize("rules, error", [
+    ({}, "'control_rules' must be a list of rules"),
+    ([{"sensor": "pressure", "target": "target_temp"}], "Rule 0: 'sensor' must be one of"),
+    ([{"sensor": "temp_celsius", "target": "target_temp", "margin": 1.0, "hysteresis": 2.0}], "Rule 0: 'hysteresis' must not exceed 'margin'"),
+    ([{"sensor": "temp_celsius", "target": "target_temp", "above": {"heater_on": "MAYBE"}}], "Rule 0: 'above' maps actuators")
+])
+def test_invalid_rules_are_rejected(rules, error):
+    with pytest.raises(ValueError, match = error):
+        validate_rules(rules)
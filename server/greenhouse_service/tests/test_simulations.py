@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+import actuator_simulation
+from actuator_simulation import ActuatorGateway, ACTUATORS
+
+
+class ApiSession:
+    """Stands in for a requests session, sending the API calls to the app's test client."""
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+
+    def post(self, url, json):
+        response = self.client.post(url.replace(self.prefix, "/api/v1/actuator_status"), json = json)
+        return SimpleNamespace(status_code = response.status_code, json = response.get_json, text = response.get_data(as_text = True))
+
+
+def test_gateway_sends_rejected_changes_again(client, greenhouse_id):
+    gateway = ActuatorGateway(batch_interval = 3600)
+    gateway.session = ApiSession(client, actuator_simulation.API_BASE_URL)
+    state = dict({actuator: "OFF" for actuator in ACTUATORS}, fan_on = "ON")
+    gateway.handle(dict(state, greenhouse_id = greenhouse_id))
+    gateway.handle(dict(state, greenhouse_id = 999))
+
+    gateway.flush()
+    assert gateway.applied == {greenhouse_id: state}
+    assert gateway.pending == {999: state}
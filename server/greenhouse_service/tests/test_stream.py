@@ -0,0 +1,93 @@
+import json
+import time
+import uuid
+import paho.mqtt.client as mqtt
+import pytest
+from database import db
+from models import Greenhouse, ACTUATOR_FIELDS
+from change_feed import change_feed, CHANGE_TOPIC
+from stream_hub import stream_hub
+
+
+def next_event(subscription, timeout = 5.0):
+    """The kind and decoded data of the next event the subscription receives."""
+    event = subscription.get(timeout)
+    assert event is not None, "no event"
+    lines = dict(line.split(': ', 1) for line in event.decode().strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+
+@pytest.fixture
+def subscription():
+    subscription = stream_hub.subscribe()
+    yield subscription
+    stream_hub.unsubscribe(subscription)
+
+
+@pytest.fixture
+def live_app(make_app, broker_port):
+    app = make_app(MQTT_BROKER_PORT = broker_port)
+    deadline = time.monotonic() + 5
+    while change_feed.live_since() is None:
+        assert time.monotonic() < deadline, "change feed did not come up"
+        time.sleep(0.01)
+    return app
+
+
+@pytest.fixture
+def publisher(broker_port):
+    origin = f"other-worker-{uuid.uuid4().hex[:6]}"
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id = origin)
+    client.origin = origin
+    client.connect('127.0.0.1', broker_port)
+    client.loop_start()
+    yield client
+    client.loop_stop()
+    client.disconnect()
+
+
+def test_rows_written_by_another_process_reach_stream_clients(live_app, publisher, subscription):
+    message = {"origin": publisher.origin, "sequence": 1, "kind": "readings", "greenhouse_ids": [7],
+               "events": [[7, {"greenhouse_id": 7, "temp_celsius": 22.5}]]}
+    publisher.publish(CHANGE_TOPIC, json.dumps(message), qos = 1).wait_for_publish(5)
+
+    assert next_event(subscription) == ("readings", {"greenhouse_id": 7, "temp_celsius": 22.5})
+
+
+def test_commands_published_by_any_process_reach_stream_clients(live_app, publisher, subscription):
+    command = dict({field: "OFF" for field in ACTUATOR_FIELDS}, greenhouse_id = 7, fan_on = "ON")
+    publisher.publish("greenhouse/7/readings", json.dumps(command)).wait_for_publish(5)
+
+    assert next_event(subscription) == ("command", command)
+
+
+def test_own_writes_are_streamed_once(live_app, subscription):
+    with live_app.app_context():
+        greenhouse = Greenhouse("test", "bench", 25.0, 60.0, 40.0, 500.0, 400.0, 1.0)
+        db.session.add(greenhouse)
+        db.session.commit()
+        greenhouse_id = greenhouse.id
+    response = live_app.test_client().post(f"/api/v1/readings/{greenhouse_id}", json = {"temp_celsius": 21.0})
+    assert response.status_code == 201
+
+    kind, data = next_event(subscription)
+    assert (kind, data["temp_celsius"]) == ("readings", 21.0)
+    # The notice comes back from the broker too, and must not be streamed a second time
+    time.sleep(0.2)
+    while (event := subscription.get(0)) is not None:
+        assert b"event: readings" not in event
+
+
+def test_stream_clients_are_capped_per_process(make_app):
+    client = make_app(STREAM_MAX_SUBSCRIBERS = 1).test_client()
+    held = stream_hub.subscribe()
+    try:
+        assert client.get("/api/v1/stream/").status_code == 503
+    finally:
+        stream_hub.unsubscribe(held)
+
+
+def test_invalid_greenhouse_ids_are_rejected(client):
+    response = client.get("/api/v1/stream/", query_string = {"greenhouse_ids": "1,two"})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "'greenhouse_ids' must be a comma separated list of integers"
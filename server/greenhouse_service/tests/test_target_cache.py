@@ -0,0 +1,41 @@
+import pytest
+from database import db
+from models import Greenhouse
+from target_cache import target_cache
+
+
+@pytest.fixture
+def app(make_app):
+    # Long enough that only an invalidation can make the cache reload
+    return make_app(TARGET_CACHE_TTL = 60.0, TARGET_CACHE_SIZE = 2)
+
+
+def test_update_is_seen_by_the_control_path_at_once(app, client, greenhouse_id):
+    with app.app_context():
+        assert target_cache.get(greenhouse_id).target_temp == 25.0
+        assert client.put(f"/api/v1/greenhouse/{greenhouse_id}", json = {"target_temp": 18.0, "target_co_two": 900.0}).status_code == 200
+        targets = target_cache.get(greenhouse_id)
+        assert (targets.target_temp, targets.target_co_two) == (18.0, 900.0)
+
+
+def test_deleted_greenhouse_leaves_the_cache(app, client, greenhouse_id):
+    with app.app_context():
+        assert target_cache.get(greenhouse_id) is not None
+        assert client.delete(f"/api/v1/greenhouse/{greenhouse_id}").status_code == 200
+        assert target_cache.get(greenhouse_id) is None
+
+
+def test_cache_keeps_the_most_recently_used_entries(app):
+    with app.app_context():
+        greenhouses = [Greenhouse(f"test_{i}", "bench", 20.0 + i, 60.0, 40.0, 500.0, 400.0, 1.0) for i in range(3)]
+        db.session.add_all(greenhouses)
+        db.session.commit()
+        first, second, third = [greenhouse.id for greenhouse in greenhouses]
+
+        target_cache.get_many([first, second])
+        target_cache.get(first)
+        target_cache.get(third)
+        # Changed behind the cache's back: only the evicted entry is read again
+        db.session.execute(db.update(Greenhouse).values(target_temp = 30.0))
+        db.session.commit()
+        assert [target_cache.get(greenhouse_id).target_temp for greenhouse_id in (first, third, second)] == [20.0, 22.0, 30.0]
@@ -0,0 +1,96 @@
+import pytest
+import write_behind as write_behind_module
+from sqlalchemy.exc import IntegrityError, OperationalError
+from database import db
+from ingest import parse_reading
+from models import Readings
+from write_behind import write_behind
+
+READING = {"temp_celsius": 21.0, "humidity_pct": 55.0, "soil_moisture_pct": 40.0, "light_lux": 500.0, "co_two": 400.0, "wind_speed": 1.0}
+REFUSED = -999.0
+
+# Flushed by the tests themselves
+ENQUEUE = dict(WRITE_BEHIND_ENABLED = True, WRITE_BEHIND_DURABILITY = 'enqueue', WRITE_BEHIND_FLUSH_INTERVAL = 60.0)
+FLUSH = dict(WRITE_BEHIND_ENABLED = True, WRITE_BEHIND_DURABILITY = 'flush', WRITE_BEHIND_FLUSH_INTERVAL = 0.01)
+
+
+def stored_temps(app):
+    with app.app_context():
+        return sorted(db.session.scalars(db.select(Readings.temp_celsius)))
+
+
+@pytest.fixture
+def refusing_database(monkeypatch):
+    """Makes the database refuse every transaction holding a reading of REFUSED degrees; counts group commits."""
+    store_readings = write_behind_module.store_readings
+    commits = []
+
+    def store(rows, targets = None):
+        commits.append(len(rows))
+        if any(row['temp_celsius'] == REFUSED for row in rows):
+            raise IntegrityError("INSERT INTO readings", {}, Exception("CHECK constraint failed"))
+        store_readings(rows, targets)
+    monkeypatch.setattr(write_behind_module, "store_readings", store)
+    return commits
+
+
+@pytest.fixture
+def app(make_app, request):
+    """The app, with write-behind in ENQUEUE mode unless the test is parametrized with other settings."""
+    return make_app(**getattr(request, 'param', ENQUEUE))
+
+
+def post(client, greenhouse_id, temp_celsius):
+    return client.post(f"/api/v1/readings/{greenhouse_id}", json = dict(READING, temp_celsius = temp_celsius)).status_code
+
+
+def test_enqueue_stores_buffered_readings_in_one_group_commit(app, client, greenhouse_id, refusing_database):
+    assert [post(client, greenhouse_id, temp) for temp in (20.0, 21.0, 22.0)] == [202] * 3
+    assert stored_temps(app) == []
+
+    write_behind.flush()
+    assert refusing_database == [3]
+    assert stored_temps(app) == [20.0, 21.0, 22.0]
+
+
+def test_refused_reading_is_dropped_without_holding_back_the_rest(app, client, greenhouse_id, refusing_database):
+    for temp in (20.0, REFUSED, 22.0):
+        assert post(client, greenhouse_id, temp) == 202
+
+    write_behind.flush()
+    assert stored_temps(app) == [20.0, 22.0]
+    stats = write_behind.stats()
+    assert (stats['refused'], stats['buffered']) == (1, 0)
+
+    assert post(client, greenhouse_id, 23.0) == 202
+    write_behind.flush()
+    assert stored_temps(app) == [20.0, 22.0, 23.0]
+
+
+def test_unavailable_database_keeps_acknowledged_readings_buffered(app, client, greenhouse_id, monkeypatch):
+    assert post(client, greenhouse_id, 20.0) == 202
+
+    def unavailable(rows, targets = None):
+        raise OperationalError("INSERT INTO readings", {}, Exception("database is locked"))
+    monkeypatch.setattr(write_behind_module, "store_readings", unavailable)
+    write_behind.flush()
+    assert write_behind.stats()['buffered'] == 1
+
+    monkeypatch.undo()
+    write_behind.flush()
+    assert stored_temps(app) == [20.0]
+
+
+@pytest.mark.parametrize('app', [FLUSH], indirect = True)
+def test_flush_answers_each_request_with_its_own_outcome(app, client, greenhouse_id, refusing_database):
+    assert post(client, greenhouse_id, 20.0) == 201
+    assert post(client, greenhouse_id, REFUSED) == 500
+    assert stored_temps(app) == [20.0]
+
+
+def test_reading_of_a_deleted_greenhouse_is_not_reported_stored(app):
+    row = parse_reading(READING, 999)
+    batch = write_behind.submit(row)
+    write_behind.flush()
+    assert batch.result(row) == (404, "Greenhouse not found")
+    assert write_behind.stats()['unknown_greenhouse'] == 1
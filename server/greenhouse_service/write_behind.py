@@ -0,0 +1,204 @@
+"""
+Write-behind buffer with group commit for single-reading POSTs.
+
+With WRITE_BEHIND_ENABLED, POST /api/v1/readings/<id> no longer commits its own
+transaction: the validated reading is appended to an in-memory batch, and a background
+thread stores the batch through ingest.store_readings (one bulk INSERT and one commit)
+once WRITE_BEHIND_BATCH_SIZE readings are buffered or WRITE_BEHIND_FLUSH_INTERVAL seconds
+have passed. WRITE_BEHIND_DURABILITY decides when the sensor gets its answer:
+
+    - 'flush': after the group commit holding its reading (201), or 500 if it failed. The
+      reading is as durable as before; many requests share one commit, so the gain grows
+      with the number of requests in flight (gunicorn threads x workers).
+    - 'enqueue': as soon as the reading is buffered (202). Fastest, but readings buffered
+      when the process dies are lost; a failed group commit is retried with the next one.
+
+A group commit the database refuses because of the rows in it (a constraint, a value out of
+range) is retried one reading at a time, and the readings it still refuses are dropped and
+logged, so one bad reading cannot hold back every later group. Readings of greenhouses
+deleted since the request was accepted are dropped as well (404 with 'flush').
+
+Every process buffers its own requests. stop() flushes what is left and runs on shutdown
+(gunicorn's worker_exit, or at interpreter exit otherwise). Once WRITE_BEHIND_MAX_PENDING
+readings are waiting, POSTs are answered 503.
+"""
+from database import db
+from ingest import store_readings
+from target_cache import target_cache
+from sqlalchemy.exc import DataError, IntegrityError
+import atexit
+import threading
+
+
+DURABILITY_MODES = ('flush', 'enqueue')
+
+# Errors caused by the rows of a transaction rather than by the database being unavailable
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+class _Batch:
+    """Readings stored by one group commit; requests waiting for it wait on done, then ask result()."""
+    __slots__ = ('rows', 'done', 'unknown', 'failed')
+
+    def __init__(self):
+        self.rows = []
+        self.done = threading.Event()
+        self.unknown = set()
+        self.failed = {}
+
+
+    def result(self, row):
+        """None once row is stored, else the (status, error) to answer its request with."""
+        if id(row) in self.unknown:
+            return 404, "Greenhouse not found"
+        if id(row) in self.failed:
+            return 500, self.failed[id(row)]
+        return None
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, batch_size = 500, flush_interval = 0.02, durability = 'flush', max_pending = 50000, ack_timeout = 5.0):
+        self.app = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.max_pending = max_pending
+        self.ack_timeout = ack_timeout
+        self._batch = _Batch()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._counters = {'enqueued': 0, 'stored': 0, 'rejected': 0, 'unknown_greenhouse': 0, 'refused': 0, 'flushes': 0, 'failed_flushes': 0}
+
+
+    def init_app(self, app):
+        config = app.config
+        if config['WRITE_BEHIND_DURABILITY'] not in DURABILITY_MODES:
+            raise ValueError(f"WRITE_BEHIND_DURABILITY must be one of {', '.join(DURABILITY_MODES)}")
+        self.app = app
+        self.batch_size = config['WRITE_BEHIND_BATCH_SIZE']
+        self.flush_interval = config['WRITE_BEHIND_FLUSH_INTERVAL']
+        self.durability = config['WRITE_BEHIND_DURABILITY']
+        self.max_pending = config['WRITE_BEHIND_MAX_PENDING']
+        self.ack_timeout = config['WRITE_BEHIND_ACK_TIMEOUT']
+        if config['WRITE_BEHIND_ENABLED']:
+            self.start()
+
+
+    @property
+    def enabled(self):
+        return self._running
+
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target = self._flush_loop, name = "write-behind", daemon = True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+
+    def stop(self):
+        """Stores what is buffered and stops the flush thread."""
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+
+    def submit(self, row):
+        """
+        Buffers a validated reading row. Returns the _Batch it will be stored with (wait on
+        its done event for durability 'flush'), or None if the buffer is full.
+        """
+        with self._lock:
+            if len(self._batch.rows) >= self.max_pending:
+                self._counters['rejected'] += 1
+                return None
+            batch = self._batch
+            batch.rows.append(row)
+            self._counters['enqueued'] += 1
+            full = len(batch.rows) >= self.batch_size
+        if full:
+            self._wake.set()
+        return batch
+
+
+    def _flush_loop(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+    def flush(self):
+        with self._lock:
+            batch, self._batch = self._batch, _Batch()
+        if not batch.rows:
+            return
+
+        unstored, error = batch.rows, None
+        with self.app.app_context():
+            try:
+                targets = target_cache.get_many({row['greenhouse_id'] for row in batch.rows})
+                # Greenhouses deleted since the request was accepted; one such row must not fail the whole group
+                unstored = [row for row in batch.rows if row['greenhouse_id'] in targets]
+                batch.unknown = {id(row) for row in batch.rows if row['greenhouse_id'] not in targets}
+                if unstored:
+                    store_readings(unstored, targets)
+                unstored = []
+            except ROW_ERRORS as e:
+                db.session.rollback()
+                print(f"Write-behind group commit of {len(unstored)} readings refused, storing them one at a time: {e}")
+                unstored, error = self._store_singly(batch, unstored, targets)
+            except Exception as e:
+                db.session.rollback()
+                error = e
+
+        with self._lock:
+            refused = len(batch.failed)
+            if error is None:
+                self._counters['flushes'] += 1
+            else:
+                print(f"Write-behind flush of {len(unstored)} readings failed: {error}")
+                self._counters['failed_flushes'] += 1
+                batch.failed.update((id(row), str(error)) for row in unstored)
+                if self.durability == 'enqueue':
+                    # Already acknowledged, so kept for the next group commit
+                    self._batch.rows[:0] = unstored
+            self._counters['stored'] += len(batch.rows) - len(batch.unknown) - refused - len(unstored)
+            self._counters['unknown_greenhouse'] += len(batch.unknown)
+            self._counters['refused'] += refused
+        batch.done.set()
+
+
+    def _store_singly(self, batch, rows, targets):
+        """
+        Stores rows in a transaction each, after their group commit was refused. Rows the
+        database still refuses are dropped, recorded in batch.failed; another error stops the
+        pass. Returns the rows left unstored by that error, and the error.
+        """
+        for index, row in enumerate(rows):
+            try:
+                store_readings([row], targets)
+            except ROW_ERRORS as e:
+                db.session.rollback()
+                print(f"Dropping reading of greenhouse {row['greenhouse_id']} at {row['timestamp']}: {e}")
+                batch.failed[id(row)] = str(e)
+            except Exception as e:
+                db.session.rollback()
+                return rows[index:], e
+        return [], None
+
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, buffered = len(self._batch.rows), durability = self.durability, running = self._running)
+
+
+write_behind = WriteBehindBuffer()
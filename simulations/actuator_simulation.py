@@ -1,16 +1,30 @@
 import paho.mqtt.client as mqtt
 import json 
 import requests 
+import argparse
+import threading
+import uuid
+from requests.adapters import HTTPAdapter
 
-mqtt_client = mqtt.Client(client_id="FlaskAPI") 
+API_BASE_URL = "http://127.0.0.1:5002/api/v1/actuator_status"
+ACTUATORS = ("vents_on", "fan_on", "lights_on", "curtains_on", "irrigation_pump_on", "humidifier_pump_on", "heater_on")
 
-TOPIC_READINGS = "greenhouse/1/readings" 
+TOPIC_ALL_READINGS = "greenhouse/+/readings"
+
+GATEWAY_BATCH_SIZE = 500 # Changed states posted per request
+GATEWAY_BATCH_INTERVAL = 1.0 # Seconds between batch posts
+HTTP_POOL_SIZE = 16
+
+# Unique per process, so the simulation never takes over the server's MQTT session
+mqtt_client = mqtt.Client(client_id=f"ActuatorSimulation-{uuid.uuid4().hex[:8]}") 
 
 
 def receive_latest_status(greenhouse_id):
-    API_URL_LATEST = f"http://127.0.0.1:5002/api/v1/actuator_status/{greenhouse_id}/latest"
+    API_URL_LATEST = f"{API_BASE_URL}/{greenhouse_id}/latest"
     try:
         response = requests.get(API_URL_LATEST)
+        if response.status_code == 404:
+            return {}
         response.raise_for_status()
         return response.json()
     
@@ -24,7 +38,7 @@ def receive_latest_status(greenhouse_id):
     
     
 def send_data(data, greenhouse_id):
-    API_URL = f"http://127.0.0.1:5002/api/v1/actuator_status/{greenhouse_id}"
+    API_URL = f"{API_BASE_URL}/{greenhouse_id}"
     try:
         response = requests.post(API_URL, json = data)
         response.raise_for_status()
@@ -33,28 +47,118 @@ def send_data(data, greenhouse_id):
         print(f"Error fetching latest data from API: {e}")
 
     
+class ActuatorGateway:
+    """
+    Drives the actuators of every greenhouse from one process.
+    
+    Subscribes to greenhouse/+/readings and keeps the last applied state of each greenhouse
+    in memory, so a command only reaches the API when it changes the state (and once per
+    greenhouse after start-up). Nothing blocks the MQTT network thread: changes are
+    coalesced per greenhouse and posted to the batch endpoint by a sender thread over a
+    pooled keep-alive session; a batch that failed on a connection error or a 5xx is retried
+    with the next one, one refused with a 4xx is dropped. Of a partly stored batch (207), only
+    the changes the API accepted are recorded as applied; the rest are sent again.
+    """
+    
+    def __init__(self, batch_size = GATEWAY_BATCH_SIZE, batch_interval = GATEWAY_BATCH_INTERVAL):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.applied = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections = HTTP_POOL_SIZE, pool_maxsize = HTTP_POOL_SIZE))
+        self.sender = threading.Thread(target = self.send_loop, daemon = True)
+        self.sender.start()
+        
+        
+    def handle(self, data):
+        greenhouse_id = data.get("greenhouse_id")
+        state = {actuator: data.get(actuator) for actuator in ACTUATORS}
+        
+        with self.lock:
+            if state == self.pending.get(greenhouse_id, self.applied.get(greenhouse_id)):
+                return
+            self.pending[greenhouse_id] = state
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.wake.set()
+            
+            
+    def send_loop(self):
+        while True:
+            self.wake.wait(self.batch_interval)
+            self.wake.clear()
+            self.flush()
+            
+            
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return
+        
+        items = list(batch.items())
+        try:
+            response = self.session.post(f"{API_BASE_URL}/batch", json = [dict(state, greenhouse_id = greenhouse_id) for greenhouse_id, state in items])
+            if response.status_code >= 500:
+                response.raise_for_status()
+            
+        except requests.exceptions.RequestException as e:
+            print(f"Error sending actuator batch to API: {e}")
+            with self.lock:
+                # Keep newer states that arrived while the batch was in flight
+                self.pending = {**batch, **self.pending}
+            return
+        
+        if response.status_code >= 400:
+            # Refused as a whole (e.g. every status rejected); retrying the same batch cannot succeed
+            print(f"Dropping {len(batch)} actuator changes refused by API ({response.status_code}): {response.text}")
+            return
+        
+        applied = batch
+        if response.status_code == 207:
+            stored = {result["index"] for result in response.json()["results"] if result["status"] in ("accepted", "unchanged")}
+            applied = {greenhouse_id: state for index, (greenhouse_id, state) in enumerate(items) if index in stored}
+            print(f"API rejected {len(batch) - len(applied)} actuator changes, sending them again")
+            
+        with self.lock:
+            self.applied.update(applied)
+            # Rejected changes go back unless a newer state arrived while the batch was in flight
+            self.pending = {**{greenhouse_id: state for greenhouse_id, state in batch.items() if greenhouse_id not in applied}, **self.pending}
+        print(f"Applied {len(applied)} actuator changes")
 
 
 def on_connect(client, userdata, flags, rc):
     """Callback for when the client receives a CONNACK response from the broker."""
     if rc == 0:
         print("Connected to MQTT Broker!")
-        client.subscribe(TOPIC_READINGS)
+        client.subscribe(userdata["topic"])
 
     else:
         print(f"Failed to connect, return code {rc}\n")
         
         
 def on_subscribe(client, userdata, mid, granted_qos):
-    print(f"Subscribed to topic: {TOPIC_READINGS} with QoS: {granted_qos}")
+    print(f"Subscribed to topic: {userdata['topic']} with QoS: {granted_qos}")
     
     
 def on_message(client, userdata, msg):
     
     """Callback for when a PUBLISH message is received from the broker."""
+    gateway = userdata.get("gateway")
+    if gateway:
+        try:
+            gateway.handle(json.loads(msg.payload.decode('utf-8')))
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON from readings: {e}")
+        return
+    
     print(f"Received message on topic '{msg.topic}': {msg.payload.decode()}")
     
-    latest_status = receive_latest_status(1)
+    greenhouse_id = userdata["greenhouse_id"]
+    latest_status = receive_latest_status(greenhouse_id)
     
         
     # You can use if to handle different topics with different logic
@@ -70,7 +174,7 @@ def on_message(client, userdata, msg):
                 del latest_status["id"]
                             
             if data != latest_status:
-                send_data(data, 1)
+                send_data(data, greenhouse_id)
                 
         except json.JSONDecodeError as e:
             print(f"Error decoding JSON from readings: {e}")
@@ -79,16 +183,28 @@ def on_message(client, userdata, msg):
         print("Received a message on an unexpected topic.")       
         
         
-mqtt_client.on_connect = on_connect
-mqtt_client.on_subscribe = on_subscribe
-mqtt_client.on_message = on_message
-mqtt_client.connect("localhost", 1883, 60)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Simulate greenhouse actuators applying MQTT commands.")
+    parser.add_argument("--greenhouse", type = int, default = 1, help = "Greenhouse ID to follow in single mode")
+    parser.add_argument("--gateway", action = "store_true", help = "Follow every greenhouse and post only state changes, in batches")
+    args = parser.parse_args()
+    
+    if args.gateway:
+        userdata = {"topic": TOPIC_ALL_READINGS, "gateway": ActuatorGateway()}
+    else:
+        userdata = {"topic": f"greenhouse/{args.greenhouse}/readings", "greenhouse_id": args.greenhouse}
+        
+    mqtt_client.user_data_set(userdata)
+    mqtt_client.on_connect = on_connect
+    mqtt_client.on_subscribe = on_subscribe
+    mqtt_client.on_message = on_message
+    mqtt_client.connect("localhost", 1883, 60)
 
-try:
-    mqtt_client.loop_forever()
+    try:
+        mqtt_client.loop_forever()
 
-except KeyboardInterrupt:
-    print("Exiting...")
+    except KeyboardInterrupt:
+        print("Exiting...")
 
-finally:
-    mqtt_client.disconnect()
+    finally:
+        mqtt_client.disconnect()
@@ -0,0 +1,327 @@
+"""
+Bulk generator of realistic sensor history, for benchmarking queries and indexes at scale.
+
+Where reading_simulation.generate_sensor_data makes one reading per call, this generates
+readings for N greenhouses x T timesteps at once with NumPy, a chunk of timesteps at a time:
+
+    - temperature, humidity, light, CO2 and wind follow the same diurnal curves and noise
+      as generate_sensor_data, with a fixed per-greenhouse offset (shading, insulation);
+    - soil moisture is stateful: it dries out at SOIL_MOISTURE_BASE_DECAY_RATE percentage
+      points per minute, faster when hot and bright, until it drops below IRRIGATION_LOW and
+      irrigation refills it to IRRIGATION_HIGH, a sawtooth per greenhouse. A manual watering
+      (SOIL_MOISTURE_RAIN_CHANCE per hour) tops it up to IRRIGATION_HIGH early. The state is
+      carried from chunk to chunk, so the series is seamless.
+
+Rows come out in time order (all greenhouses at one timestep, then the next), like live
+ingest would write them, and go to a CSV or Parquet file (same columns as the service's
+export) or straight into the readings table: executemany on SQLite, COPY on Postgres. The
+database must have the service's schema; missing greenhouses are created with default
+targets. On Postgres, rows for months without a partition land in readings_default.
+
+    python dataset_generator.py --greenhouses 1000 --days 365 --interval 60 --database-url sqlite:///../server/greenhouse_service/greenhouse.db
+    python dataset_generator.py --greenhouses 100 --days 30 --output readings.parquet
+
+Loading bypasses the service's ingest, so reading_rollups is not updated: once the load is
+done, rebuild the rollups from server/greenhouse_service against the same database
+(DATABASE_URL). A rebuild skips buckets that begin before the oldest reading, so give a
+--start at midnight to have the first hour and day rolled up too.
+
+    DATABASE_URL=postgresql://... python rollups.py rebuild
+"""
+import argparse
+import csv
+import datetime
+import io
+import sqlite3
+import sys
+import time
+import numpy as np
+from reading_simulation import (
+    UPDATE_INTERVAL, TEMP_MIN, TEMP_MAX, TEMP_PEAK_HOUR, HUMIDITY_MIN, HUMIDITY_MAX, HUMIDITY_PEAK_HOUR,
+    LIGHT_MAX, LIGHT_PEAK_HOUR, SOIL_MOISTURE_BASE_DECAY_RATE, SOIL_MOISTURE_RAIN_CHANCE
+)
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+
+COLUMNS = ('greenhouse_id', 'timestamp', 'temp_celsius', 'humidity_pct', 'soil_moisture_pct', 'light_lux', 'co_two', 'wind_speed')
+CHUNK_ROWS = 1000000 # Rows generated and written at a time
+
+IRRIGATION_LOW = 30.0 # Soil moisture percentage that starts irrigation
+IRRIGATION_HIGH = 55.0 # Soil moisture percentage irrigation refills to
+SOIL_MOISTURE_NOISE = 0.5 # Sensor noise, +/- percentage points
+
+
+def _daily_wave(hours, peak_hour):
+    """Sine over the day, +1 at peak_hour, as generate_sensor_data shapes its curves."""
+    return np.sin((hours - peak_hour) / 24 * 2 * np.pi)
+
+
+class DatasetGenerator:
+    """Yields (timestamps, columns) chunks of readings for a fleet of greenhouses."""
+
+    def __init__(self, greenhouse_ids, start, interval = UPDATE_INTERVAL, seed = None):
+        self.greenhouse_ids = np.asarray(greenhouse_ids, dtype = np.int64)
+        self.start = start
+        self.interval = interval
+        self.rng = np.random.default_rng(seed)
+
+        count = len(self.greenhouse_ids)
+        self.temp_offset = self.rng.normal(0.0, 1.0, count)
+        self.humidity_offset = self.rng.normal(0.0, 3.0, count)
+        self.light_scale = self.rng.uniform(0.7, 1.0, count)
+        self.co_two_offset = self.rng.normal(0.0, 30.0, count)
+        # How far each greenhouse's soil has dried since its last refill, carried between chunks
+        self.dried = self.rng.uniform(0.0, IRRIGATION_HIGH - IRRIGATION_LOW, count)
+        self.step = 0
+
+
+    def chunk(self, steps):
+        """Generates the next steps timesteps; returns (timestamps, {column: (steps, greenhouses) array})."""
+        rng = self.rng
+        shape = (steps, len(self.greenhouse_ids))
+        offsets = (self.step + np.arange(steps)) * self.interval
+        timestamps = np.datetime64(self.start, 'us') + (offsets * 1e6).astype('timedelta64[us]')
+        midnight = self.start.hour * 3600 + self.start.minute * 60 + self.start.second
+        hours = ((midnight + offsets) % 86400 / 3600)[:, None]
+        self.step += steps
+
+        temp_midpoint = (TEMP_MAX + TEMP_MIN) / 2
+        temp_amplitude = (TEMP_MAX - TEMP_MIN) / 2
+        temp_celsius = temp_midpoint + temp_amplitude * _daily_wave(hours, TEMP_PEAK_HOUR) + self.temp_offset + rng.uniform(-1.5, 1.5, shape)
+
+        humidity_midpoint = (HUMIDITY_MAX + HUMIDITY_MIN) / 2
+        humidity_amplitude = (HUMIDITY_MAX - HUMIDITY_MIN) / 2
+        humidity_pct = humidity_midpoint + humidity_amplitude * _daily_wave(hours, HUMIDITY_PEAK_HOUR) + self.humidity_offset + rng.uniform(-2.0, 2.0, shape)
+
+        # Between 8 PM and 6 AM only low ambient light
+        daylight = (_daily_wave(hours, LIGHT_PEAK_HOUR) + 1) / 2 * LIGHT_MAX * self.light_scale
+        night = (hours > 20) | (hours < 6)
+        light_lux = np.where(night, rng.uniform(50, 200, shape), daylight) + rng.uniform(-500, 500, shape)
+        light_lux = np.maximum(light_lux, 0.0)
+
+        co_two = 600 + 100 * _daily_wave(hours, 3) + self.co_two_offset + rng.uniform(-20, 20, shape)
+
+        wind_base = np.where((hours > 8) & (hours < 18), 5.0, 2.0)
+        wind_speed = wind_base + rng.uniform(-2.0, 3.0, shape)
+
+        soil_moisture_pct = self._soil_moisture(temp_celsius, light_lux, shape)
+
+        columns = {
+            'temp_celsius': np.round(temp_celsius, 2),
+            'humidity_pct': np.round(humidity_pct, 2),
+            'soil_moisture_pct': np.round(soil_moisture_pct + rng.uniform(-SOIL_MOISTURE_NOISE, SOIL_MOISTURE_NOISE, shape), 2),
+            'light_lux': np.round(light_lux),
+            'co_two': np.round(co_two),
+            'wind_speed': np.round(wind_speed, 2)
+        }
+        return timestamps, columns
+
+
+    def _soil_moisture(self, temp_celsius, light_lux, shape):
+        """
+        The soil moisture sawtooth, without a loop over timesteps: the soil dries by the
+        cumulative evaporation since its last refill, and irrigation refills it each time
+        that reaches the span between IRRIGATION_LOW and IRRIGATION_HIGH, so the level is
+        IRRIGATION_HIGH minus the cumulative evaporation modulo the span. A manual watering
+        restarts the count from zero.
+        """
+        span = IRRIGATION_HIGH - IRRIGATION_LOW
+        evaporation = np.clip(1 + 0.04 * (temp_celsius - (TEMP_MAX + TEMP_MIN) / 2) + 0.5 * light_lux / LIGHT_MAX, 0.2, None)
+        dried = np.cumsum(SOIL_MOISTURE_BASE_DECAY_RATE * self.interval / 60 * evaporation, axis = 0)
+
+        # Cumulative evaporation at the last watering; -dried before one, continuing the previous chunk
+        watered = self.rng.random(shape) < SOIL_MOISTURE_RAIN_CHANCE * self.interval / 3600
+        since_watering = dried - np.maximum.accumulate(np.where(watered, dried, -self.dried), axis = 0)
+
+        self.dried = since_watering[-1] % span
+        return IRRIGATION_HIGH - since_watering % span
+
+
+    def chunks(self, steps, chunk_rows = CHUNK_ROWS):
+        """Yields (timestamps, columns) for steps timesteps, about chunk_rows readings at a time."""
+        per_chunk = max(1, chunk_rows // len(self.greenhouse_ids))
+        for done in range(0, steps, per_chunk):
+            yield self.chunk(min(per_chunk, steps - done))
+
+
+def _rows(greenhouse_ids, timestamps, columns):
+    """Row tuples in time order; timestamps are formatted once per timestep, not per row."""
+    # The format SQLAlchemy stores DateTime in on SQLite, which Postgres reads as well
+    texts = [f"{value:%Y-%m-%d %H:%M:%S.%f}" for value in timestamps.astype(datetime.datetime)]
+    values = [np.tile(greenhouse_ids, len(timestamps)).tolist(), np.repeat(np.array(texts, dtype = object), len(greenhouse_ids)).tolist()]
+    values += [columns[name].ravel().tolist() for name in COLUMNS[2:]]
+    return zip(*values)
+
+
+def _arrow_table(greenhouse_ids, timestamps, columns):
+    arrays = [np.tile(greenhouse_ids, len(timestamps)), np.repeat(timestamps, len(greenhouse_ids))]
+    arrays += [columns[name].ravel() for name in COLUMNS[2:]]
+    return pyarrow.Table.from_arrays([pyarrow.array(array) for array in arrays], names = list(COLUMNS))
+
+
+def csv_chunk(greenhouse_ids, timestamps, columns):
+    """The rows of a chunk as CSV without a header, in bytes; pyarrow's writer is some five times faster than csv's."""
+    if pyarrow is not None:
+        buffer = pyarrow.BufferOutputStream()
+        pyarrow.csv.write_csv(_arrow_table(greenhouse_ids, timestamps, columns), buffer, pyarrow.csv.WriteOptions(include_header = False))
+        return buffer.getvalue().to_pybytes()
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator = '\n').writerows(_rows(greenhouse_ids, timestamps, columns))
+    return buffer.getvalue().encode()
+
+
+class CsvSink:
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write((','.join(COLUMNS) + '\n').encode())
+
+
+    def write(self, greenhouse_ids, timestamps, columns):
+        self.file.write(csv_chunk(greenhouse_ids, timestamps, columns))
+
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise RuntimeError("Parquet output needs pyarrow installed")
+        fields = [('greenhouse_id', pyarrow.int64()), ('timestamp', pyarrow.timestamp('us'))]
+        self.writer = pyarrow.parquet.ParquetWriter(path, pyarrow.schema(fields + [(name, pyarrow.float64()) for name in COLUMNS[2:]]), compression = 'zstd')
+
+
+    def write(self, greenhouse_ids, timestamps, columns):
+        self.writer.write_table(_arrow_table(greenhouse_ids, timestamps, columns))
+
+
+    def close(self):
+        self.writer.close()
+
+
+def _ensure_greenhouses(cursor, greenhouse_ids, placeholder):
+    cursor.execute("SELECT id FROM greenhouse")
+    existing = {row[0] for row in cursor.fetchall()}
+    missing = [int(greenhouse_id) for greenhouse_id in greenhouse_ids if greenhouse_id not in existing]
+    cursor.executemany(
+        f"INSERT INTO greenhouse (id, name, location, target_temp, target_humidity, target_soil_moisture_pct, target_light, target_co_two, target_wind_speed) "
+        f"VALUES ({placeholder}, {placeholder}, 'simulation', 25.0, 60.0, 40.0, 500.0, 400.0, 1.0)",
+        [(greenhouse_id, f"Simulated greenhouse {greenhouse_id}") for greenhouse_id in missing]
+    )
+    return missing
+
+
+class SqliteSink:
+    """Inserts into the readings table of a SQLite database, one transaction per chunk."""
+
+    def __init__(self, path, greenhouse_ids):
+        self.connection = sqlite3.connect(path)
+        # Only for this connection: a crash mid-load may lose the last chunks, not corrupt the file
+        self.connection.execute("PRAGMA synchronous = OFF")
+        with self.connection:
+            _ensure_greenhouses(self.connection.cursor(), greenhouse_ids, '?')
+
+
+    def write(self, greenhouse_ids, timestamps, columns):
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO readings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                _rows(greenhouse_ids, timestamps, columns)
+            )
+
+
+    def close(self):
+        self.connection.close()
+
+
+class PostgresSink:
+    """COPYs into the readings table of a Postgres database, one transaction per chunk."""
+
+    def __init__(self, url, greenhouse_ids):
+        if psycopg2 is None:
+            raise RuntimeError("Loading into Postgres needs psycopg2 installed")
+        self.connection = psycopg2.connect(url.replace('postgresql+psycopg2://', 'postgresql://'))
+        with self.connection, self.connection.cursor() as cursor:
+            if _ensure_greenhouses(cursor, greenhouse_ids, '%s'):
+                cursor.execute("SELECT setval(pg_get_serial_sequence('greenhouse', 'id'), (SELECT max(id) FROM greenhouse))")
+
+
+    def write(self, greenhouse_ids, timestamps, columns):
+        buffer = io.BytesIO(csv_chunk(greenhouse_ids, timestamps, columns))
+        with self.connection, self.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY readings ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+    def close(self):
+        self.connection.close()
+
+
+def open_sink(greenhouse_ids, output = None, database_url = None):
+    if database_url:
+        if database_url.startswith('sqlite:///'):
+            return SqliteSink(database_url[len('sqlite:///'):], greenhouse_ids)
+        if database_url.startswith(('postgresql://', 'postgresql+psycopg2://', 'postgres://')):
+            return PostgresSink(database_url, greenhouse_ids)
+        raise ValueError("--database-url must be a sqlite:/// or postgresql:// URL")
+    if output.endswith('.parquet'):
+        return ParquetSink(output)
+    if output.endswith('.csv'):
+        return CsvSink(output)
+    raise ValueError("--output must end in .csv or .parquet")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Generate realistic sensor history for many greenhouses at once.")
+    parser.add_argument("--greenhouses", type = int, default = 100, help = "Number of greenhouses, ids from --first-id on")
+    parser.add_argument("--first-id", type = int, default = 1)
+    parser.add_argument("--start", type = datetime.datetime.fromisoformat, help = "ISO 8601, default --days before now")
+    parser.add_argument("--days", type = float, default = 30)
+    parser.add_argument("--interval", type = float, default = UPDATE_INTERVAL, help = "Seconds between readings")
+    parser.add_argument("--seed", type = int, help = "Random seed, for a reproducible dataset")
+    parser.add_argument("--chunk-rows", type = int, default = CHUNK_ROWS)
+    target = parser.add_mutually_exclusive_group(required = True)
+    target.add_argument("--output", help = "File to write, .csv or .parquet")
+    target.add_argument("--database-url", help = "Database to load into, sqlite:///path or postgresql://...")
+    args = parser.parse_args()
+
+    greenhouse_ids = np.arange(args.first_id, args.first_id + args.greenhouses)
+    start = args.start or (datetime.datetime.now() - datetime.timedelta(days = args.days)).replace(microsecond = 0)
+    steps = int(args.days * 86400 / args.interval)
+    total = steps * args.greenhouses
+
+    try:
+        sink = open_sink(greenhouse_ids, args.output, args.database_url)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    generator = DatasetGenerator(greenhouse_ids, start, args.interval, args.seed)
+    started = time.perf_counter()
+    written = 0
+    try:
+        for timestamps, columns in generator.chunks(steps, args.chunk_rows):
+            sink.write(greenhouse_ids, timestamps, columns)
+            written += columns['temp_celsius'].size
+            elapsed = time.perf_counter() - started
+            print(f"{written}/{total} readings, {written / elapsed:,.0f} per second", end = "\r", flush = True)
+    except KeyboardInterrupt:
+        print("\nGeneration stopped by user.")
+    finally:
+        sink.close()
+    print(f"\nWrote {written} readings from {start} in {time.perf_counter() - started:.1f}s")
+    if args.database_url:
+        print("Run 'python rollups.py rebuild' in server/greenhouse_service to roll them up")
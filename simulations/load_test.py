@@ -0,0 +1,319 @@
+"""
+Load generator for the greenhouse service.
+
+Simulates a fleet of greenhouses against a running API with a pool of worker threads, each
+holding its own pooled HTTP session. Every worker picks operations from a weighted mix of
+sensor ingest, /latest, /all and greenhouse CRUD traffic. Readings are stamped with an
+accelerated simulated clock so a short run produces hours of history.
+
+The run ends with a JSON report of throughput and p50/p95/p99 latency per endpoint. Keys
+are sorted so two reports can be diffed directly, or compared with --baseline.
+
+    python load_test.py --greenhouses 200 --workers 32 --duration 60 --output run.json
+    python load_test.py --mix ingest=50,latest=40,all=10 --baseline run.json
+
+--stub-broker hosts a minimal MQTT broker in this process (see stub_broker.py), so the
+service and the MQTT transport can run without an external broker.
+"""
+import requests
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+import paho.mqtt.client as mqtt
+from concurrent.futures import ThreadPoolExecutor
+from reading_simulation import generate_sensor_data, MQTT_BROKER_HOST, MQTT_BROKER_PORT, TOPIC_SENSORS
+
+
+API_BASE_URL = "http://127.0.0.1:5002/api/v1"
+DEFAULT_MIX = "ingest=70,latest=20,all=8,crud=2"
+SPEEDUP = 60 # Simulated seconds per wall-clock second
+PERCENTILES = (50, 95, 99)
+OPERATIONS = ("ingest", "latest", "all", "crud")
+
+
+class SimulatedClock:
+    """Wall-clock time scaled by 'speedup' from a fixed starting point."""
+
+    def __init__(self, speedup = SPEEDUP, start = None):
+        self.speedup = speedup
+        self.start = start or datetime.datetime.now()
+        self.started = time.monotonic()
+
+
+    def now(self):
+        return self.start + datetime.timedelta(seconds = (time.monotonic() - self.started) * self.speedup)
+
+
+class LatencyRecorder:
+    """Thread-safe per-endpoint latency samples and status counts."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.statuses = {}
+        self.errors = {}
+
+
+    def record(self, endpoint, seconds, status, error = False):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+    def report(self, wall_seconds):
+        endpoints = {}
+        for endpoint, samples in self.samples.items():
+            samples = sorted(samples)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_rps": round(len(samples) / wall_seconds, 2),
+                "latency_ms": dict(
+                    {f"p{q}": round(percentile(samples, q) * 1000, 3) for q in PERCENTILES},
+                    mean = round(sum(samples) / len(samples) * 1000, 3),
+                    max = round(samples[-1] * 1000, 3)
+                ),
+                "status": self.statuses[endpoint]
+            }
+        return endpoints
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(0, min(len(sorted_samples) - 1, int(round(q / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[rank]
+
+
+def parse_mix(value):
+    """
+    Parses 'name=weight,...' into a dict of operation weights.
+
+    Raises:
+        ValueError: If an operation is unknown or a weight is not a non-negative number.
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}', expected one of {sorted(OPERATIONS)}")
+        mix[name] = float(weight)
+        if mix[name] < 0:
+            raise ValueError(f"Weight for '{name}' must not be negative")
+    if not sum(mix.values()):
+        raise ValueError("At least one operation needs a positive weight")
+    return mix
+
+
+class LoadTest:
+
+    def __init__(self, base_url, greenhouse_ids, mix, clock, batch_size = 1, page_size = 100, transport = "http", seed = None):
+        self.base_url = base_url.rstrip("/")
+        self.greenhouse_ids = list(greenhouse_ids)
+        self.names, self.weights = zip(*mix.items())
+        self.clock = clock
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.transport = transport
+        self.seed = seed
+        self.recorder = LatencyRecorder()
+        self.local = threading.local()
+        self.mqtt_client = None
+
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+
+    def call(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session().request(method, self.base_url + path, timeout = 30, **kwargs)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            response, status = None, "connection_error"
+        self.recorder.record(endpoint, time.perf_counter() - started, status, error = response is None or status >= 500)
+        return response
+
+
+    def ingest(self, rng):
+        readings = []
+        for _ in range(self.batch_size):
+            greenhouse_id = rng.choice(self.greenhouse_ids)
+            now = self.clock.now()
+            readings.append(dict(generate_sensor_data(greenhouse_id, now), timestamp = now.isoformat()))
+
+        if self.transport == "mqtt":
+            for reading in readings:
+                started = time.perf_counter()
+                info = self.mqtt_client.publish(TOPIC_SENSORS.format(greenhouse_id = reading["greenhouse_id"]), json.dumps(reading), qos = 1)
+                info.wait_for_publish(30)
+                self.recorder.record("ingest_mqtt", time.perf_counter() - started, "puback" if info.is_published() else "timeout",
+                                     error = not info.is_published())
+        elif self.batch_size > 1:
+            self.call("ingest_batch", "POST", "/readings/batch", json = readings)
+        else:
+            self.call("ingest", "POST", f"/readings/{readings[0]['greenhouse_id']}", json = readings[0])
+
+
+    def latest(self, rng):
+        self.call("latest", "GET", f"/readings/{rng.choice(self.greenhouse_ids)}/latest")
+
+
+    def all(self, rng):
+        self.call("all", "GET", f"/readings/{rng.choice(self.greenhouse_ids)}/all", params = {"limit": self.page_size})
+
+
+    def crud(self, rng):
+        response = self.call("crud_create", "POST", "/greenhouse/", json = greenhouse_payload(f"load_test_{uuid.uuid4().hex[:8]}"))
+        if response is None or response.status_code != 201:
+            return
+        greenhouse_id = response.json()["id"]
+        self.call("crud_get", "GET", f"/greenhouse/{greenhouse_id}")
+        self.call("crud_update", "PUT", f"/greenhouse/{greenhouse_id}", json = {"target_temp": round(rng.uniform(18, 28), 1)})
+        self.call("crud_delete", "DELETE", f"/greenhouse/{greenhouse_id}")
+
+
+    def worker(self, index, deadline):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        operations = [getattr(self, name) for name in self.names]
+        while time.monotonic() < deadline:
+            rng.choices(operations, self.weights)[0](rng)
+
+
+    def run(self, workers, duration):
+        if self.transport == "mqtt" and "ingest" in self.names:
+            self.mqtt_client = mqtt.Client(client_id = f"LoadTest-{uuid.uuid4().hex[:8]}")
+            self.mqtt_client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT, 60)
+            self.mqtt_client.loop_start()
+
+        started = time.monotonic()
+        simulated_start = self.clock.now()
+        try:
+            with ThreadPoolExecutor(max_workers = workers) as pool:
+                for future in [pool.submit(self.worker, index, started + duration) for index in range(workers)]:
+                    future.result()
+        finally:
+            if self.mqtt_client:
+                self.mqtt_client.loop_stop()
+                self.mqtt_client.disconnect()
+        wall_seconds = time.monotonic() - started
+
+        endpoints = self.recorder.report(wall_seconds)
+        total = sum(stats["requests"] for stats in endpoints.values())
+        return {
+            "config": {
+                "base_url": self.base_url,
+                "greenhouses": len(self.greenhouse_ids),
+                "workers": workers,
+                "duration_s": duration,
+                "mix": dict(zip(self.names, self.weights)),
+                "batch_size": self.batch_size,
+                "page_size": self.page_size,
+                "transport": self.transport,
+                "speedup": self.clock.speedup
+            },
+            "wall_seconds": round(wall_seconds, 3),
+            "simulated_seconds": round((self.clock.now() - simulated_start).total_seconds(), 1),
+            "endpoints": endpoints,
+            "total": {
+                "requests": total,
+                "errors": sum(stats["errors"] for stats in endpoints.values()),
+                "throughput_rps": round(total / wall_seconds, 2)
+            }
+        }
+
+
+def greenhouse_payload(name):
+    return {"name": name, "location": "load test", "target_temp": 24.0, "target_humidity": 60.0, "target_soil_moisture_pct": 45.0,
+            "target_light": 50000.0, "target_CO2": 600.0, "target_wind_speed": 3.0}
+
+
+def create_greenhouses(base_url, count):
+    session = requests.Session()
+    greenhouse_ids = []
+    for index in range(count):
+        response = session.post(f"{base_url}/greenhouse/", json = greenhouse_payload(f"load_test_{index}"))
+        response.raise_for_status()
+        greenhouse_ids.append(response.json()["id"])
+    return greenhouse_ids
+
+
+def delete_greenhouses(base_url, greenhouse_ids):
+    session = requests.Session()
+    for greenhouse_id in greenhouse_ids:
+        session.delete(f"{base_url}/greenhouse/{greenhouse_id}")
+
+
+def compare(report, baseline):
+    """Prints per-endpoint throughput and p95 changes against an earlier report."""
+    print(f"{'endpoint':<14}{'rps':>10}{'base rps':>10}{'p95 ms':>10}{'base p95':>10}{'change':>9}", file = sys.stderr)
+    for endpoint, stats in sorted(report["endpoints"].items()):
+        base = baseline["endpoints"].get(endpoint)
+        if not base:
+            print(f"{endpoint:<14}{stats['throughput_rps']:>10}{'-':>10}{stats['latency_ms']['p95']:>10}{'-':>10}{'-':>9}", file = sys.stderr)
+            continue
+        change = (stats["latency_ms"]["p95"] / base["latency_ms"]["p95"] - 1) * 100 if base["latency_ms"]["p95"] else 0
+        print(f"{endpoint:<14}{stats['throughput_rps']:>10}{base['throughput_rps']:>10}"
+              f"{stats['latency_ms']['p95']:>10}{base['latency_ms']['p95']:>10}{change:>+8.1f}%", file = sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Drive a fleet of simulated greenhouses against the API and report latencies.")
+    parser.add_argument("--base-url", default = API_BASE_URL)
+    parser.add_argument("--greenhouses", type = int, default = 50, help = "Greenhouses created for the run")
+    parser.add_argument("--greenhouse-ids", type = int, nargs = "+", help = "Use existing greenhouses instead of creating new ones")
+    parser.add_argument("--keep", action = "store_true", help = "Keep the greenhouses created for the run")
+    parser.add_argument("--workers", type = int, default = 16, help = "Concurrent worker threads")
+    parser.add_argument("--duration", type = float, default = 30, help = "Wall-clock seconds to run")
+    parser.add_argument("--mix", default = DEFAULT_MIX, help = "Operation weights, e.g. ingest=70,latest=20,all=8,crud=2")
+    parser.add_argument("--speedup", type = float, default = SPEEDUP, help = "Simulated seconds per wall-clock second")
+    parser.add_argument("--batch-size", type = int, default = 1, help = "Readings per ingest request; above 1 uses the batch endpoint")
+    parser.add_argument("--page-size", type = int, default = 100, help = "'limit' for /all requests")
+    parser.add_argument("--transport", choices = ["http", "mqtt"], default = "http", help = "Send ingest traffic to the API or the broker")
+    parser.add_argument("--stub-broker", action = "store_true", help = "Host a local MQTT broker stand-in for the run")
+    parser.add_argument("--seed", type = int, help = "Seed the workers' random choices")
+    parser.add_argument("--output", help = "Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help = "Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.stub_broker:
+        from stub_broker import StubBroker
+        StubBroker(MQTT_BROKER_HOST, MQTT_BROKER_PORT).start_in_thread()
+
+    base_url = args.base_url.rstrip("/")
+    greenhouse_ids = args.greenhouse_ids or create_greenhouses(base_url, args.greenhouses)
+
+    try:
+        load_test = LoadTest(base_url, greenhouse_ids, mix, SimulatedClock(args.speedup), batch_size = args.batch_size,
+                             page_size = args.page_size, transport = args.transport, seed = args.seed)
+        report = load_test.run(args.workers, args.duration)
+    finally:
+        if not args.greenhouse_ids and not args.keep:
+            delete_greenhouses(base_url, greenhouse_ids)
+
+    output = json.dumps(report, indent = 2, sort_keys = True)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            compare(report, json.load(handle))
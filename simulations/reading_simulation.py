@@ -4,11 +4,23 @@ import time
 import math 
 import json
 import random
+import argparse
+import uuid
+import paho.mqtt.client as mqtt
 
 
 
 UPDATE_INTERVAL = 5
 
+API_BATCH_URL = "http://127.0.0.1:5002/api/v1/readings/batch"
+BATCH_SIZE = 100 # Readings buffered before a batch is sent
+BATCH_MAX_DELAY = 30 # Seconds a reading may wait in the buffer
+BUFFER_LIMIT = 10000 # Readings kept while the API is unreachable
+
+MQTT_BROKER_HOST = "localhost"
+MQTT_BROKER_PORT = 1883
+TOPIC_SENSORS = "greenhouse/{greenhouse_id}/sensors"
+
 TEMP_MIN = 10.0  # Lowest temperature in Celsius
 TEMP_MAX = 25.0  # Highest temperature in Celsius
 TEMP_PEAK_HOUR = 15  # 3 PM
@@ -25,16 +37,17 @@ SOIL_MOISTURE_BASE_DECAY_RATE = 0.05
 SOIL_MOISTURE_RAIN_CHANCE = 0.02
 
 
-def generate_sensor_data(greenhouse_id):
+def generate_sensor_data(greenhouse_id, now = None):
     """
     Generates a dictionary of simulated sensor data following a daily pattern.
     
-    The pattern is based on the current time of day to simulate realistic cycles.
+    The pattern is based on the time of day to simulate realistic cycles. 'now' defaults to
+    the wall clock; the load test passes its accelerated simulated clock instead.
     
     Returns:
         dict: A dictionary containing simulated sensor readings.
     """
-    now = datetime.datetime.now()
+    now = now or datetime.datetime.now()
     hour = now.hour + now.minute / 60.0
     
     # 1. Temperature: Use a sine wave to model daily cycle, peaking at 3 PM
@@ -102,16 +115,116 @@ def send_data(data):
         print(f"Error sending data to API: {e}")
         
         
+class MqttSender:
+    """Publishes readings straight to the broker for the server's MQTT ingestion subscriber."""
+    
+    def __init__(self, host = MQTT_BROKER_HOST, port = MQTT_BROKER_PORT):
+        self.client = mqtt.Client(client_id = f"SensorSimulation-{uuid.uuid4().hex[:8]}")
+        self.client.connect(host, port, 60)
+        self.client.loop_start()
+        
+        
+    def add(self, data):
+        payload = dict(data, timestamp = datetime.datetime.now().isoformat())
+        self.client.publish(TOPIC_SENSORS.format(greenhouse_id = data["greenhouse_id"]), json.dumps(payload), qos = 1)
+        
+        
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+        
+        
+class BufferedSender:
+    """
+    Buffers sensor readings and posts them to the batch endpoint in one request.
+    
+    A batch is sent once BATCH_SIZE readings are buffered or the oldest one has waited
+    BATCH_MAX_DELAY seconds. Readings that could not be delivered (connection errors and 5xx
+    answers) stay in the buffer (up to BUFFER_LIMIT, oldest dropped first) and are retried
+    with the next flush; a batch the API refuses with a 4xx is dropped.
+    """
+    
+    def __init__(self, batch_size = BATCH_SIZE, max_delay = BATCH_MAX_DELAY, buffer_limit = BUFFER_LIMIT):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.buffer_limit = buffer_limit
+        self.buffer = []
+        self.oldest = None
+        self.session = requests.Session()
+        
+        
+    def add(self, data):
+        if "timestamp" not in data:
+            data = dict(data, timestamp = datetime.datetime.now().isoformat())
+        
+        if not self.buffer:
+            self.oldest = time.monotonic()
+        self.buffer.append(data)
+        
+        if len(self.buffer) > self.buffer_limit:
+            del self.buffer[:len(self.buffer) - self.buffer_limit]
+        
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.oldest >= self.max_delay:
+            self.flush()
+            
+            
+    def flush(self):
+        while self.buffer:
+            batch = self.buffer[:self.batch_size]
+            try:
+                response = self.session.post(API_BATCH_URL, json = batch)
+                if response.status_code >= 500:
+                    response.raise_for_status()
+                
+            except requests.exceptions.RequestException as e:
+                print(f"Error sending batch to API: {e}")
+                return
+            
+            if response.status_code >= 400:
+                # Refused as a whole (e.g. every reading rejected); sending it again would only block the buffer
+                print(f"Dropping batch of {len(batch)} readings refused by API ({response.status_code}): {response.text}")
+            else:
+                rejected = [item for item in response.json().get("results", []) if item["status"] != "accepted"]
+                if rejected:
+                    print(f"{len(rejected)} readings rejected by API: {rejected}")
+                
+            del self.buffer[:len(batch)]
+            self.oldest = time.monotonic()
+            
+            
+    def close(self):
+        self.flush()
+        self.session.close()
+        
+        
 
 if __name__ == "__main__":
-    # Example of how to use the function
+    parser = argparse.ArgumentParser(description = "Simulate greenhouse sensors posting readings to the API.")
+    parser.add_argument("--greenhouses", type = int, nargs = "+", default = [1], help = "Greenhouse IDs to simulate")
+    parser.add_argument("--batch-size", type = int, default = 1, help = "Buffer readings and send them in batches of this size")
+    parser.add_argument("--transport", choices = ["http", "mqtt"], default = "http", help = "Send readings to the API or publish them to the broker")
+    args = parser.parse_args()
+    
+    if args.transport == "mqtt":
+        sender = MqttSender()
+    else:
+        sender = BufferedSender(batch_size = args.batch_size) if args.batch_size > 1 else None
+    
     print("Generating sensor data that changes based on the time of day...")
     try:
         while True:
-            simulated_data = generate_sensor_data(1)
-            send_data(simulated_data)
-            print(f"Data point {datetime.datetime.now()}: {simulated_data}")
+            for greenhouse_id in args.greenhouses:
+                simulated_data = generate_sensor_data(greenhouse_id)
+                if sender:
+                    sender.add(simulated_data)
+                else:
+                    send_data(simulated_data)
+                print(f"Data point {datetime.datetime.now()}: {simulated_data}")
             time.sleep(UPDATE_INTERVAL) 
     
     except KeyboardInterrupt:
         print("\nSimulation stopped by user.")
+        
+    finally:
+        if sender:
+            sender.close()
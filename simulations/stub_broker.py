@@ -0,0 +1,212 @@
+"""
+Minimal in-process MQTT 3.1.1 broker, a stand-in for mosquitto in offline load tests.
+
+Supports CONNECT, PUBLISH (QoS 0 and 1), SUBSCRIBE / UNSUBSCRIBE with + and # wildcards,
+$share/<group>/ shared subscriptions, retained messages, PINGREQ and DISCONNECT. There is
+no authentication, no persistent sessions and no QoS 2; it is meant for tests only.
+
+    python stub_broker.py --port 1883
+"""
+import argparse
+import asyncio
+import itertools
+import struct
+import threading
+
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for index, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if index >= len(topic_parts) or (part != "+" and part != topic_parts[index]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value):
+    data = value.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type, flags, body):
+    return bytes([(packet_type << 4) | flags]) + encode_length(len(body)) + body
+
+
+class Session:
+    
+    def __init__(self, broker, writer):
+        self.broker = broker
+        self.writer = writer
+        self.packet_ids = itertools.cycle(range(1, 65536))
+        
+        
+    def deliver(self, topic, payload, qos, retain = False):
+        body = encode_string(topic)
+        if qos:
+            body += struct.pack("!H", next(self.packet_ids))
+        flags = (qos << 1) | (1 if retain else 0)
+        self.writer.write(packet(PUBLISH, flags, body + payload))
+
+
+class StubBroker:
+    
+    def __init__(self, host = "127.0.0.1", port = 1883):
+        self.host = host
+        self.port = port
+        self.subscriptions = {} # session -> {pattern: qos}
+        self.shared = {} # (group, pattern) -> [(session, qos)]
+        self.retained = {}
+        self.counters = {"connections": 0, "published": 0, "delivered": 0}
+        self._round_robin = itertools.count()
+        
+        
+    async def handle(self, reader, writer):
+        session = Session(self, writer)
+        self.subscriptions[session] = {}
+        self.counters["connections"] += 1
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                packet_type, flags = header[0] >> 4, header[0] & 0x0F
+                
+                if packet_type == CONNECT:
+                    writer.write(packet(CONNACK, 0, b"\x00\x00"))
+                elif packet_type == PUBLISH:
+                    self.on_publish(session, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self.on_subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.on_unsubscribe(session, body)
+                elif packet_type == PINGREQ:
+                    writer.write(packet(PINGRESP, 0, b""))
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.drop(session)
+            writer.close()
+            
+            
+    def on_publish(self, session, flags, body):
+        qos, retain = (flags >> 1) & 0x03, flags & 0x01
+        topic_length = struct.unpack("!H", body[:2])[0]
+        topic = body[2:2 + topic_length].decode()
+        offset = 2 + topic_length
+        if qos:
+            session.writer.write(packet(PUBACK, 0, body[offset:offset + 2]))
+            offset += 2
+        payload = body[offset:]
+        self.counters["published"] += 1
+        
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+                
+        for subscriber, patterns in list(self.subscriptions.items()):
+            for pattern, granted in patterns.items():
+                if not pattern.startswith("$share/") and topic_matches(pattern, topic):
+                    subscriber.deliver(topic, payload, min(qos, granted))
+                    self.counters["delivered"] += 1
+                    break
+        for (group, pattern), members in self.shared.items():
+            if members and topic_matches(pattern, topic):
+                subscriber, granted = members[next(self._round_robin) % len(members)]
+                subscriber.deliver(topic, payload, min(qos, granted))
+                self.counters["delivered"] += 1
+                
+                
+    def on_subscribe(self, session, body):
+        packet_id, offset, granted = body[:2], 2, []
+        while offset < len(body):
+            length = struct.unpack("!H", body[offset:offset + 2])[0]
+            pattern = body[offset + 2:offset + 2 + length].decode()
+            qos = min(body[offset + 2 + length] & 0x03, 1)
+            offset += 3 + length
+            
+            session_patterns = self.subscriptions[session]
+            session_patterns[pattern] = qos
+            granted.append(qos)
+            if pattern.startswith("$share/"):
+                _, group, shared_pattern = pattern.split("/", 2)
+                self.shared.setdefault((group, shared_pattern), []).append((session, qos))
+            else:
+                for topic, (payload, retained_qos) in self.retained.items():
+                    if topic_matches(pattern, topic):
+                        session.deliver(topic, payload, min(qos, retained_qos), retain = True)
+        session.writer.write(packet(SUBACK, 0, packet_id + bytes(granted)))
+        
+        
+    def on_unsubscribe(self, session, body):
+        packet_id, offset = body[:2], 2
+        while offset < len(body):
+            length = struct.unpack("!H", body[offset:offset + 2])[0]
+            pattern = body[offset + 2:offset + 2 + length].decode()
+            offset += 2 + length
+            self.subscriptions[session].pop(pattern, None)
+            for members in self.shared.values():
+                members[:] = [member for member in members if member[0] is not session]
+        session.writer.write(packet(UNSUBACK, 0, packet_id))
+        
+        
+    def drop(self, session):
+        self.subscriptions.pop(session, None)
+        for members in self.shared.values():
+            members[:] = [member for member in members if member[0] is not session]
+            
+            
+    async def serve(self, ready = None):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        if ready:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+            
+            
+    def start_in_thread(self):
+        """Runs the broker on a daemon thread and returns once it accepts connections."""
+        ready = threading.Event()
+        thread = threading.Thread(target = lambda: asyncio.run(self.serve(ready)), name = "stub-broker", daemon = True)
+        thread.start()
+        ready.wait(5)
+        return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run a minimal MQTT broker stand-in.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 1883)
+    args = parser.parse_args()
+    
+    print(f"Stub MQTT broker listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(StubBroker(args.host, args.port).serve())
+    except KeyboardInterrupt:
+        print("\nBroker stopped.")